@@ -0,0 +1,28 @@
+"""add variants to hotel_img and room_img
+
+Revision ID: 0b7d4e2c9a61
+Revises: f3c6d1a9b042
+Create Date: 2025-06-04 15:21:38.902417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7d4e2c9a61'
+down_revision: Union[str, None] = 'f3c6d1a9b042'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('hotel_img', sa.Column('variants', sa.JSON(), nullable=True))
+    op.add_column('room_img', sa.Column('variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('room_img', 'variants')
+    op.drop_column('hotel_img', 'variants')
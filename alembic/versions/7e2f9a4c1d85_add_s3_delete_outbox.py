@@ -0,0 +1,36 @@
+"""add s3_delete_outbox table
+
+Revision ID: 7e2f9a4c1d85
+Revises: 0b7d4e2c9a61
+Create Date: 2025-06-06 11:12:54.317206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2f9a4c1d85'
+down_revision: Union[str, None] = '0b7d4e2c9a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('s3_delete_outbox',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('s3_key', sa.String(length=512), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_s3_delete_outbox_next_attempt_at'), 's3_delete_outbox', ['next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_s3_delete_outbox_next_attempt_at'), table_name='s3_delete_outbox')
+    op.drop_table('s3_delete_outbox')
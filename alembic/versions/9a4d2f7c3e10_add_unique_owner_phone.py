@@ -0,0 +1,42 @@
+"""add unique constraint on owner.phone
+
+Revision ID: 9a4d2f7c3e10
+Revises: 7e2f9a4c1d85
+Create Date: 2025-06-09 15:27:41.508312
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4d2f7c3e10'
+down_revision: Union[str, None] = '7e2f9a4c1d85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # owners own hotels and Stripe accounts, so duplicates are not merged automatically
+    duplicates = op.get_bind().execute(sa.text("""
+        SELECT phone, string_agg(id::text, ', ' ORDER BY id) AS owner_ids
+        FROM owner
+        GROUP BY phone
+        HAVING COUNT(*) > 1
+        ORDER BY phone
+    """)).all()
+    if duplicates:
+        conflicts = "; ".join(f"{phone}: owners {owner_ids}" for phone, owner_ids in duplicates)
+        raise RuntimeError(
+            f"Cannot add owner_phone_key, these owners share a phone number: {conflicts}. "
+            "Change or merge them by hand and rerun the migration."
+        )
+
+    # registration now relies on this constraint instead of a pre-insert lookup
+    op.create_unique_constraint('owner_phone_key', 'owner', ['phone'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('owner_phone_key', 'owner', type_='unique')
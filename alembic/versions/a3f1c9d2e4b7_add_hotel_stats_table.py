@@ -0,0 +1,65 @@
+"""add hotel_stats table
+
+Revision ID: a3f1c9d2e4b7
+Revises: 86789b6fde6e
+Create Date: 2025-05-20 10:14:32.418903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9d2e4b7'
+down_revision: Union[str, None] = '86789b6fde6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('hotel_stats',
+    sa.Column('hotel_id', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Float(), server_default='0', nullable=False),
+    sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_avg', sa.Float(), server_default='0', nullable=False),
+    sa.Column('views_total', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('min_price', sa.Float(), nullable=True),
+    sa.Column('room_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['hotel_id'], ['hotels.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('hotel_id')
+    )
+    op.create_index('ix_hotel_stats_views_total', 'hotel_stats', ['views_total'], unique=False)
+    op.create_index('ix_hotel_stats_rating_avg', 'hotel_stats', ['rating_avg'], unique=False)
+    op.create_index('ix_hotel_stats_min_price', 'hotel_stats', ['min_price'], unique=False)
+    op.create_index(op.f('ix_rooms_hotel_id'), 'rooms', ['hotel_id'], unique=False)
+
+    op.execute("""
+        INSERT INTO hotel_stats (hotel_id, rating_sum, rating_count, rating_avg, views_total, min_price, room_count)
+        SELECT h.id,
+               COALESCE(r.rating_sum, 0),
+               COALESCE(r.rating_count, 0),
+               COALESCE(r.rating_sum / NULLIF(r.rating_count, 0), 0),
+               COALESCE(r.views_total, 0),
+               rm.min_price,
+               COALESCE(rm.room_count, 0)
+        FROM hotels h
+        LEFT JOIN (
+            SELECT hotel_id, SUM(rating) AS rating_sum, COUNT(id) AS rating_count, SUM(views) AS views_total
+            FROM ratings GROUP BY hotel_id
+        ) r ON r.hotel_id = h.id
+        LEFT JOIN (
+            SELECT hotel_id, MIN(price_per_night) AS min_price, COUNT(id) AS room_count
+            FROM rooms GROUP BY hotel_id
+        ) rm ON rm.hotel_id = h.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_rooms_hotel_id'), table_name='rooms')
+    op.drop_index('ix_hotel_stats_min_price', table_name='hotel_stats')
+    op.drop_index('ix_hotel_stats_rating_avg', table_name='hotel_stats')
+    op.drop_index('ix_hotel_stats_views_total', table_name='hotel_stats')
+    op.drop_table('hotel_stats')
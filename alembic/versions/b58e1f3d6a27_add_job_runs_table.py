@@ -0,0 +1,38 @@
+"""add job_runs table
+
+Revision ID: b58e1f3d6a27
+Revises: 9a4d2f7c3e10
+Create Date: 2025-06-12 09:41:03.772915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b58e1f3d6a27'
+down_revision: Union[str, None] = '9a4d2f7c3e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('job_runs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('job_name', sa.String(length=100), nullable=False),
+    sa.Column('host', sa.String(length=255), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=False),
+    sa.Column('duration_ms', sa.Integer(), nullable=False),
+    sa.Column('succeeded', sa.Boolean(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_runs_job_name_started_at', 'job_runs', ['job_name', 'started_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_runs_job_name_started_at', table_name='job_runs')
+    op.drop_table('job_runs')
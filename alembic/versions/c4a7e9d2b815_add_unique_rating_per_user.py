@@ -0,0 +1,60 @@
+"""add unique constraint on ratings (hotel_id, user_id)
+
+Revision ID: c4a7e9d2b815
+Revises: b58e1f3d6a27
+Create Date: 2025-06-16 10:05:22.193640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e9d2b815'
+down_revision: Union[str, None] = 'b58e1f3d6a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RANKED = """
+    SELECT id,
+           SUM(COALESCE(views, 0)) OVER (PARTITION BY hotel_id, user_id) AS total_views,
+           ROW_NUMBER() OVER (
+               PARTITION BY hotel_id, user_id ORDER BY (rating > 0) DESC, updated_at DESC NULLS LAST, id
+           ) AS rn
+    FROM ratings
+"""
+
+
+def upgrade() -> None:
+    # fold duplicate rows from concurrent view flushes into one, keeping the real rating if any
+    op.execute(f"""
+        UPDATE ratings SET views = ranked.total_views
+        FROM ({RANKED}) AS ranked
+        WHERE ratings.id = ranked.id AND ranked.rn = 1
+    """)
+    op.execute(f"""
+        DELETE FROM ratings USING ({RANKED}) AS ranked
+        WHERE ratings.id = ranked.id AND ranked.rn > 1
+    """)
+    op.execute("""
+        UPDATE hotel_stats SET
+            rating_sum = agg.rating_sum,
+            rating_count = agg.rating_count,
+            rating_avg = CASE WHEN agg.rating_count > 0 THEN agg.rating_sum / agg.rating_count ELSE 0 END,
+            views_total = agg.views_total
+        FROM (
+            SELECT hotel_stats.hotel_id,
+                   COALESCE(SUM(ratings.rating), 0) AS rating_sum,
+                   COUNT(ratings.id) AS rating_count,
+                   COALESCE(SUM(ratings.views), 0) AS views_total
+            FROM hotel_stats LEFT JOIN ratings ON ratings.hotel_id = hotel_stats.hotel_id
+            GROUP BY hotel_stats.hotel_id
+        ) AS agg
+        WHERE hotel_stats.hotel_id = agg.hotel_id
+    """)
+    op.create_unique_constraint('uq_ratings_hotel_user', 'ratings', ['hotel_id', 'user_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_ratings_hotel_user', 'ratings', type_='unique')
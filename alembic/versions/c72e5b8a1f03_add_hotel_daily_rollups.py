@@ -0,0 +1,61 @@
+"""add hotel daily rollups
+
+Revision ID: c72e5b8a1f03
+Revises: a3f1c9d2e4b7
+Create Date: 2025-05-23 18:41:07.115362
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c72e5b8a1f03'
+down_revision: Union[str, None] = 'a3f1c9d2e4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('hotel_daily_stats',
+    sa.Column('hotel_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('bookings_total', sa.Integer(), nullable=False),
+    sa.Column('bookings_confirmed', sa.Integer(), nullable=False),
+    sa.Column('bookings_completed', sa.Integer(), nullable=False),
+    sa.Column('bookings_cancelled', sa.Integer(), nullable=False),
+    sa.Column('unique_clients', sa.Integer(), nullable=False),
+    sa.Column('income_total', sa.Float(), nullable=False),
+    sa.Column('income_card', sa.Float(), nullable=False),
+    sa.Column('income_cash', sa.Float(), nullable=False),
+    sa.Column('refunds', sa.Float(), nullable=False),
+    sa.Column('paid_count', sa.Integer(), nullable=False),
+    sa.Column('paid_card_count', sa.Integer(), nullable=False),
+    sa.Column('paid_cash_count', sa.Integer(), nullable=False),
+    sa.Column('max_payment', sa.Float(), nullable=True),
+    sa.Column('min_payment', sa.Float(), nullable=True),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['hotel_id'], ['hotels.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('hotel_id', 'day')
+    )
+    op.create_table('rollup_state',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('horizon', sa.Date(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_index(op.f('ix_bookings_created_at'), 'bookings', ['created_at'], unique=False)
+    op.create_index(op.f('ix_bookings_updated_at'), 'bookings', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_payments_updated_at'), 'payments', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_payments_paid_at'), 'payments', ['paid_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_payments_paid_at'), table_name='payments')
+    op.drop_index(op.f('ix_payments_updated_at'), table_name='payments')
+    op.drop_index(op.f('ix_bookings_updated_at'), table_name='bookings')
+    op.drop_index(op.f('ix_bookings_created_at'), table_name='bookings')
+    op.drop_table('rollup_state')
+    op.drop_table('hotel_daily_stats')
@@ -0,0 +1,47 @@
+"""add per-client daily rollups and rollup dirty days
+
+Revision ID: d2f8b6a4c931
+Revises: c4a7e9d2b815
+Create Date: 2025-06-18 14:27:40.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f8b6a4c931'
+down_revision: Union[str, None] = 'c4a7e9d2b815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('hotel_daily_client_stats',
+    sa.Column('hotel_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('bookings', sa.Integer(), nullable=False),
+    sa.Column('spent', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['hotel_id'], ['hotels.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('hotel_id', 'day', 'client_id')
+    )
+    op.create_table('rollup_dirty_days',
+    sa.Column('hotel_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['hotel_id'], ['hotels.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('hotel_id', 'day')
+    )
+    op.drop_column('hotel_daily_stats', 'unique_clients')
+    # the client rollups start empty, so the next refresh has to rebuild every past day
+    op.execute("DELETE FROM rollup_state WHERE name = 'hotel_daily_stats'")
+
+
+def downgrade() -> None:
+    op.add_column('hotel_daily_stats', sa.Column('unique_clients', sa.Integer(), nullable=False, server_default='0'))
+    op.drop_table('rollup_dirty_days')
+    op.drop_table('hotel_daily_client_stats')
+    op.execute("DELETE FROM rollup_state WHERE name = 'hotel_daily_stats'")
@@ -0,0 +1,48 @@
+"""add room_nights table
+
+Revision ID: d91b4e6f2a58
+Revises: c72e5b8a1f03
+Create Date: 2025-05-27 11:32:45.906127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91b4e6f2a58'
+down_revision: Union[str, None] = 'c72e5b8a1f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('room_nights',
+    sa.Column('room_id', sa.Integer(), nullable=False),
+    sa.Column('night', sa.Date(), nullable=False),
+    sa.Column('booking_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['booking_id'], ['bookings.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('room_id', 'night')
+    )
+    op.create_index(op.f('ix_room_nights_booking_id'), 'room_nights', ['booking_id'], unique=False)
+    op.create_index(op.f('ix_bookings_room_id'), 'bookings', ['room_id'], unique=False)
+
+    op.execute("""
+        INSERT INTO room_nights (room_id, night, booking_id)
+        SELECT b.room_id, gs.night::date, b.id
+        FROM bookings b,
+             generate_series(b.date_start::date, b.date_end::date - 1, interval '1 day') AS gs(night)
+        WHERE b.room_id IS NOT NULL
+          AND b.status IN ('pending_payment', 'awaiting_confirmation', 'confirmed')
+          AND b.date_end::date > b.date_start::date
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_bookings_room_id'), table_name='bookings')
+    op.drop_index(op.f('ix_room_nights_booking_id'), table_name='room_nights')
+    op.drop_table('room_nights')
@@ -0,0 +1,26 @@
+"""add request_hash to idempotency_keys
+
+Revision ID: e7c3a1f9b462
+Revises: d2f8b6a4c931
+Create Date: 2025-06-19 09:12:54.381027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c3a1f9b462'
+down_revision: Union[str, None] = 'd2f8b6a4c931'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('idempotency_keys', sa.Column('request_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('idempotency_keys', 'request_hash')
@@ -0,0 +1,38 @@
+"""make image_url nullable for async image processing
+
+Revision ID: f3c6d1a9b042
+Revises: e5a80c3d7b19
+Create Date: 2025-06-02 09:47:12.384551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c6d1a9b042'
+down_revision: Union[str, None] = 'e5a80c3d7b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column('hotel_img', 'image_url',
+               existing_type=sa.String(length=255),
+               nullable=True)
+    op.alter_column('room_img', 'image_url',
+               existing_type=sa.String(length=255),
+               nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM room_img WHERE image_url IS NULL")
+    op.execute("DELETE FROM hotel_img WHERE image_url IS NULL")
+    op.alter_column('room_img', 'image_url',
+               existing_type=sa.String(length=255),
+               nullable=False)
+    op.alter_column('hotel_img', 'image_url',
+               existing_type=sa.String(length=255),
+               nullable=False)
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local").lower()
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL")
+HOTEL_CACHE_TTL = int(os.getenv("HOTEL_CACHE_TTL", "300"))
+LISTING_CACHE_TTL = int(os.getenv("LISTING_CACHE_TTL", "30"))
+LISTING_STALE_TTL = int(os.getenv("LISTING_STALE_TTL", "300"))
+
+
+class LocalCache:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+class RedisCache:
+    """Shared backend; values are stored as JSON so they must be JSON-serialisable."""
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: int):
+        self._client.setex(key, ttl, json.dumps(value))
+
+    def delete(self, *keys: str):
+        if keys:
+            self._client.delete(*keys)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+_stale = Counter()
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def get_cache():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if CACHE_BACKEND == "redis" and REDIS_URL:
+                    _backend = RedisCache(REDIS_URL)
+                else:
+                    _backend = LocalCache(CACHE_MAX_ENTRIES)
+    return _backend
+
+
+def _namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def cache_get(key: str) -> Optional[Any]:
+    try:
+        value = get_cache().get(key)
+    except Exception as e:
+        print(f"[cache] get failed for {key}: {e}")
+        value = None
+
+    if value is None:
+        _misses[_namespace(key)] += 1
+    else:
+        _hits[_namespace(key)] += 1
+    return value
+
+
+def cache_set(key: str, value: Any, ttl: int):
+    try:
+        get_cache().set(key, value, ttl)
+    except Exception as e:
+        print(f"[cache] set failed for {key}: {e}")
+
+
+def cache_delete(*keys: str):
+    try:
+        get_cache().delete(*keys)
+    except Exception as e:
+        print(f"[cache] delete failed for {keys}: {e}")
+
+
+async def cache_get_async(key: str) -> Optional[Any]:
+    # the shared backend does blocking network I/O, so keep it off the event loop
+    if isinstance(get_cache(), LocalCache):
+        return cache_get(key)
+    return await run_in_threadpool(cache_get, key)
+
+
+async def cache_set_async(key: str, value: Any, ttl: int):
+    if isinstance(get_cache(), LocalCache):
+        return cache_set(key, value, ttl)
+    await run_in_threadpool(cache_set, key, value, ttl)
+
+
+def cache_stats() -> dict:
+    namespaces = set(_hits) | set(_misses)
+    return {
+        "backend": type(get_cache()).__name__,
+        "namespaces": {
+            ns: {"hits": _hits[ns], "misses": _misses[ns], "stale": _stale[ns]}
+            for ns in sorted(namespaces)
+        }
+    }
+
+
+def hotel_detail_key(hotel_id: int) -> str:
+    return f"hotel:{hotel_id}"
+
+
+def invalidate_hotels(hotel_ids: Iterable[int]):
+    keys = [hotel_detail_key(hotel_id) for hotel_id in set(hotel_ids) if hotel_id]
+    if keys:
+        cache_delete(*keys)
+
+
+async def _load(key: str, loader: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int) -> Any:
+    value = await loader()
+    await cache_set_async(key, {"value": value, "fresh_until": time.time() + ttl}, ttl + stale_ttl)
+    return value
+
+
+def _start_load(key: str, loader: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int) -> asyncio.Task:
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load(key, loader, ttl, stale_ttl))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _finish_load(key, done))
+    return task
+
+
+def _finish_load(key: str, task: asyncio.Task):
+    _inflight.pop(key, None)
+    if not task.cancelled() and task.exception():
+        print(f"[cache] refresh failed for {key}: {task.exception()}")
+
+
+async def cache_get_or_load(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl: int,
+    stale_ttl: int
+) -> Any:
+    """Stale-while-revalidate read: expired entries are served while one background task refreshes them,
+    and concurrent misses for the same key share a single load."""
+    entry = await cache_get_async(key)
+    if entry is not None:
+        if entry["fresh_until"] <= time.time():
+            _stale[_namespace(key)] += 1
+            _start_load(key, loader, ttl, stale_ttl)
+        return entry["value"]
+
+    return await asyncio.shield(_start_load(key, loader, ttl, stale_ttl))
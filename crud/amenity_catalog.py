@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Amenity
+from schemas.amenities import AmenityBase
+
+AMENITY_CATALOG_TTL = int(os.getenv("AMENITY_CATALOG_TTL", "300"))
+# unknown ids trigger at most one reload per interval; in between they are rejected from the cached catalog
+AMENITY_MISS_RELOAD_SECONDS = float(os.getenv("AMENITY_MISS_RELOAD_SECONDS", "10"))
+
+_lock = threading.Lock()
+_catalog = None
+_loaded_at = 0.0
+_miss_reload_at = 0.0
+
+
+def _build(amenities: List[Amenity]) -> dict:
+    catalog = {}
+    for kind, is_hotel in (("hotel", True), ("room", False)):
+        items = [
+            AmenityBase.model_validate(a).model_dump(mode="json")
+            for a in amenities if bool(a.is_hotel) == is_hotel
+        ]
+        digest = hashlib.sha256(json.dumps(items, sort_keys=True).encode()).hexdigest()
+        catalog[kind] = {
+            "items": items,
+            "ids": {item["id"] for item in items},
+            "etag": f'"{digest[:32]}"'
+        }
+    return catalog
+
+
+def load_amenity_catalog(db: Optional[Session] = None):
+    global _catalog, _loaded_at
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        catalog = _build(db.query(Amenity).order_by(Amenity.id).all())
+    finally:
+        if own_session:
+            db.close()
+
+    with _lock:
+        _catalog = catalog
+        _loaded_at = time.monotonic()
+
+
+def _current() -> dict:
+    if _catalog is None or time.monotonic() - _loaded_at > AMENITY_CATALOG_TTL:
+        load_amenity_catalog()
+    return _catalog
+
+
+def amenity_catalog(kind: str) -> Tuple[List[dict], str]:
+    entry = _current()[kind]
+    return entry["items"], entry["etag"]
+
+
+def _claim_miss_reload() -> bool:
+    global _miss_reload_at
+    with _lock:
+        now = time.monotonic()
+        if now - max(_loaded_at, _miss_reload_at) <= AMENITY_MISS_RELOAD_SECONDS:
+            return False
+        _miss_reload_at = now
+        return True
+
+
+def validate_amenity_ids(amenity_ids: Iterable[int], kind: str = "hotel"):
+    wanted = set(amenity_ids or [])
+    unknown = wanted - _current()[kind]["ids"]
+    if unknown and _claim_miss_reload():
+        # another worker may have created it since our last load
+        load_amenity_catalog()
+        unknown = wanted - _catalog[kind]["ids"]
+    if unknown:
+        raise ValueError(f"Unknown {kind} amenity ids: {sorted(unknown)}")
@@ -0,0 +1,34 @@
+from datetime import date, datetime, timedelta
+from typing import Iterable, List
+
+from sqlalchemy import exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import Booking, BookingStatus, Room, RoomNight
+
+HOLD_STATUSES = (BookingStatus.pending_payment, BookingStatus.awaiting_confirmation, BookingStatus.confirmed)
+
+
+def booking_nights(date_start: datetime, date_end: datetime) -> List[date]:
+    first, last = date_start.date(), date_end.date()
+    return [first + timedelta(days=i) for i in range((last - first).days)]
+
+
+def reserve_nights(db: Session, booking: Booking):
+    nights = booking_nights(booking.date_start, booking.date_end)
+    try:
+        with db.begin_nested():
+            db.add_all([RoomNight(room_id=booking.room_id, night=night, booking_id=booking.id) for night in nights])
+    except IntegrityError:
+        raise ValueError("Room already booked for selected dates")
+
+
+def release_nights(db: Session, booking_ids: Iterable[int]):
+    booking_ids = list(booking_ids)
+    if booking_ids:
+        db.query(RoomNight).filter(RoomNight.booking_id.in_(booking_ids)).delete(synchronize_session=False)
+
+
+def room_is_free(check_in: date, check_out: date):
+    return ~exists().where(RoomNight.room_id == Room.id, RoomNight.night >= check_in, RoomNight.night < check_out)
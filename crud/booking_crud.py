@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+from crud.hotel_analytics import mark_rollups_dirty
 from models import Booking
 
 def create_booking(db: Session, booking_data: dict):
@@ -17,6 +18,7 @@ def get_booking_by_id(db: Session, booking_id: int):
 def delete_booking(db: Session, booking_id: int):
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if booking:
+        mark_rollups_dirty(db, [booking.id])
         db.delete(booking)
         db.commit()
         return True
@@ -0,0 +1,479 @@
+from collections import defaultdict
+from datetime import datetime, date, time, timedelta
+from typing import Optional
+
+from sqlalchemy import func, case, cast, extract, insert, select, union, union_all, literal, null, String, Float, Date
+from sqlalchemy.orm import Session
+
+from models import Hotel, Room, Booking, Payment, Client, Employee, FavoriteHotel, HotelStats, HotelDailyStats, \
+    HotelDailyClientStats, RollupDirtyDay, RollupState, BookingStatus, PaymentStatus
+
+ROLLUP_NAME = "hotel_daily_stats"
+
+
+def _window(column, since: Optional[date], until: Optional[date]):
+    filters = []
+    if since:
+        filters.append(column >= datetime.combine(since, time.min))
+    if until:
+        filters.append(column < datetime.combine(until + timedelta(days=1), time.min))
+    return filters
+
+
+def _horizon():
+    return func.coalesce(
+        select(RollupState.horizon).where(RollupState.name == ROLLUP_NAME).scalar_subquery(),
+        date(1970, 1, 1)
+    )
+
+
+def _scalar(column, source, *filters):
+    return select(column).select_from(source).where(*filters).scalar_subquery()
+
+
+def _sum(column, source, *filters):
+    return _scalar(func.coalesce(func.sum(column), 0), source, *filters)
+
+
+def _day(db: Session, column):
+    # sqlite has no DATE type to cast to; date() yields the same ISO day
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column, type_=Date)
+    return cast(column, Date)
+
+
+def _greatest(a, b):
+    # portable GREATEST/LEAST for two nullable values, ignoring NULLs like Postgres does
+    return case((a.is_(None), b), (b.is_(None), a), (a >= b, a), else_=b)
+
+
+def _least(a, b):
+    return case((a.is_(None), b), (b.is_(None), a), (a <= b, a), else_=b)
+
+
+def _hotel_ctes(db: Session, hotel_id: int, since: Optional[date], until: Optional[date]):
+    horizon = _horizon()
+    rooms = (
+        db.query(Room.id, Room.room_type)
+        .filter(Room.hotel_id == hotel_id)
+        .cte("hotel_rooms")
+    )
+    live_bookings = (
+        db.query(Booking.id, Booking.client_id, Booking.status, Booking.created_at)
+        .join(rooms, rooms.c.id == Booking.room_id)
+        .filter(Booking.created_at >= horizon, *_window(Booking.created_at, since, until))
+        .cte("live_bookings")
+    )
+    live_payments = (
+        db.query(Payment.amount, Payment.is_card, Payment.status, Payment.paid_at, Booking.client_id)
+        .join(Booking, Booking.id == Payment.booking_id)
+        .join(rooms, rooms.c.id == Booking.room_id)
+        .filter(
+            Payment.status.in_([PaymentStatus.paid, PaymentStatus.refunded]),
+            Payment.paid_at >= horizon,
+            *_window(Payment.paid_at, since, until)
+        )
+        .cte("live_payments")
+    )
+
+    def _rolled(model, name):
+        return (
+            db.query(model)
+            .filter(model.hotel_id == hotel_id, model.day < horizon)
+            .filter(*([model.day >= since] if since else []))
+            .filter(*([model.day <= until] if until else []))
+            .cte(name)
+        )
+
+    return (
+        rooms, live_bookings, live_payments,
+        _rolled(HotelDailyStats, "hotel_rollups"), _rolled(HotelDailyClientStats, "hotel_client_rollups")
+    )
+
+
+def hotel_dashboard(db: Session, hotel_id: int, since: Optional[date] = None, until: Optional[date] = None) -> dict:
+    rooms, live_bookings, live_payments, rollups, client_rollups = _hotel_ctes(db, hotel_id, since, until)
+    live_paid = live_payments.c.status == PaymentStatus.paid
+
+    # a client booking on several days is one client, so these are unioned rather than summed
+    booked_clients = union(
+        select(client_rollups.c.client_id).where(client_rollups.c.bookings > 0),
+        select(live_bookings.c.client_id)
+    ).subquery("booked_clients")
+    client_spend = union_all(
+        select(client_rollups.c.client_id, client_rollups.c.spent.label("amount")).where(client_rollups.c.spent > 0),
+        select(live_payments.c.client_id, live_payments.c.amount).where(live_paid)
+    ).subquery("client_spend")
+
+    def _bookings_with(status):
+        return (
+            _sum(rollups.c["bookings_" + status.value], rollups)
+            + _scalar(func.count(), live_bookings, live_bookings.c.status == status)
+        )
+
+    totals = db.query(
+        _scalar(func.count(), rooms).label("total_rooms"),
+        (_sum(rollups.c.bookings_total, rollups) + _scalar(func.count(), live_bookings)).label("bookings_total"),
+        _bookings_with(BookingStatus.confirmed).label("bookings_confirmed"),
+        _bookings_with(BookingStatus.completed).label("bookings_completed"),
+        _bookings_with(BookingStatus.cancelled).label("bookings_cancelled"),
+        _scalar(func.count(), booked_clients).label("unique_clients"),
+        (_sum(rollups.c.income_total, rollups) + _sum(live_payments.c.amount, live_payments, live_paid))
+        .label("income_total"),
+        (_sum(rollups.c.income_card, rollups)
+         + _sum(live_payments.c.amount, live_payments, live_paid, live_payments.c.is_card == True))
+        .label("income_card"),
+        (_sum(rollups.c.income_cash, rollups)
+         + _sum(live_payments.c.amount, live_payments, live_paid, live_payments.c.is_card == False))
+        .label("income_cash"),
+        (_sum(rollups.c.refunds, rollups)
+         + _sum(live_payments.c.amount, live_payments, live_payments.c.status == PaymentStatus.refunded))
+        .label("refunds"),
+        (_sum(rollups.c.paid_card_count, rollups)
+         + _scalar(func.count(), live_payments, live_paid, live_payments.c.is_card == True))
+        .label("paid_card_count"),
+        (_sum(rollups.c.paid_cash_count, rollups)
+         + _scalar(func.count(), live_payments, live_paid, live_payments.c.is_card == False))
+        .label("paid_cash_count"),
+        _greatest(
+            _scalar(func.max(rollups.c.max_payment), rollups),
+            _scalar(func.max(live_payments.c.amount), live_payments, live_paid)
+        ).label("max_price"),
+        _least(
+            _scalar(func.min(rollups.c.min_payment), rollups),
+            _scalar(func.min(live_payments.c.amount), live_payments, live_paid)
+        ).label("min_price"),
+        _scalar(HotelStats.rating_avg, HotelStats, HotelStats.hotel_id == hotel_id).label("rating_avg"),
+        _scalar(HotelStats.views_total, HotelStats, HotelStats.hotel_id == hotel_id).label("total_views"),
+        _scalar(func.count(), FavoriteHotel, FavoriteHotel.hotel_id == hotel_id).label("favorites"),
+        _scalar(func.sum(Employee.salary), Employee, Employee.hotel_id == hotel_id).label("salary_expenses")
+    ).one()
+
+    live_day = _day(db, live_payments.c.paid_at)
+    live_week = extract("week", live_bookings.c.created_at)
+    rollup_week = extract("week", rollups.c.day)
+    top_clients = (
+        select(
+            Client.id,
+            Client.first_name,
+            Client.last_name,
+            func.sum(client_spend.c.amount).label("spent")
+        )
+        .select_from(client_spend)
+        .join(Client, Client.id == client_spend.c.client_id)
+        .group_by(Client.id)
+        .order_by(func.sum(client_spend.c.amount).desc())
+        .limit(10)
+        .subquery("top_clients")
+    )
+    series = union_all(
+        select(
+            literal("daily").label("kind"),
+            cast(rollups.c.day, String).label("key"),
+            cast(null(), String).label("label"),
+            cast(rollups.c.income_total, Float).label("value")
+        ).where(rollups.c.paid_count > 0),
+        select(
+            literal("daily"), cast(live_day, String), cast(null(), String), cast(func.sum(live_payments.c.amount), Float)
+        ).where(live_paid).group_by(live_day),
+        select(
+            literal("weekly"), cast(rollup_week, String), cast(null(), String),
+            cast(func.sum(rollups.c.bookings_total), Float)
+        ).where(rollups.c.bookings_total > 0).group_by(rollup_week),
+        select(
+            literal("weekly"), cast(live_week, String), cast(null(), String), cast(func.count(), Float)
+        ).select_from(live_bookings).group_by(live_week),
+        select(
+            literal("room_type"), cast(rooms.c.room_type, String), cast(null(), String), cast(func.count(), Float)
+        ).group_by(rooms.c.room_type),
+        select(
+            literal("top_client"),
+            cast(top_clients.c.id, String),
+            top_clients.c.first_name + " " + top_clients.c.last_name,
+            cast(top_clients.c.spent, Float)
+        )
+    )
+    rows = db.execute(series).all()
+
+    daily_income, room_types, top = [], [], []
+    weekly = defaultdict(int)
+    for kind, key, label, value in rows:
+        if kind == "daily" and key:
+            daily_income.append({"date": key, "total": float(value)})
+        elif kind == "weekly" and key:
+            weekly[int(float(key))] += int(value)
+        elif kind == "room_type":
+            room_types.append({"type": key, "count": int(value)})
+        elif kind == "top_client":
+            top.append({"id": int(key), "name": label, "total_spent": float(value)})
+
+    daily_income.sort(key=lambda d: d["date"])
+    top.sort(key=lambda c: c["total_spent"], reverse=True)
+
+    total_rooms = totals.total_rooms
+    income_total = totals.income_total or 0
+    paid_count = (totals.paid_card_count or 0) + (totals.paid_cash_count or 0)
+    salary_expenses = totals.salary_expenses or 0
+    net_income = income_total - salary_expenses
+
+    return {
+        "general": {
+            "total_rooms": total_rooms,
+            "total_bookings": totals.bookings_total,
+            "active_bookings": totals.bookings_confirmed,
+            "completed_bookings": totals.bookings_completed,
+            "cancelled_bookings": totals.bookings_cancelled,
+            "occupancy": round(totals.bookings_confirmed / total_rooms, 2) if total_rooms else 0
+        },
+        "financials": {
+            "income_total": income_total,
+            "income_card": totals.income_card or 0,
+            "income_cash": totals.income_cash or 0,
+            "refunds": totals.refunds or 0,
+            "avg_booking_price": round(income_total / paid_count, 2) if paid_count else 0,
+            "max_booking_price": totals.max_price or 0,
+            "min_booking_price": totals.min_price or 0,
+            "salary_expenses": round(salary_expenses, 2),
+            "net_income": round(net_income, 2),
+            "income_minus_salaries": round(income_total, 2)
+        },
+        "dynamics": {
+            "daily_income": daily_income,
+            "weekly_bookings": [{"week": w, "count": c} for w, c in sorted(weekly.items())],
+            "room_type_popularity": room_types,
+            "payment_distribution": {
+                "card": totals.paid_card_count or 0,
+                "cash": totals.paid_cash_count or 0
+            }
+        },
+        "clients": {
+            "unique": totals.unique_clients,
+            "top": top
+        },
+        "engagement": {
+            "average_rating": round(totals.rating_avg or 0, 2),
+            "total_views": totals.total_views or 0,
+            "favorites": totals.favorites
+        }
+    }
+
+
+def owner_summary(db: Session, owner_id: int) -> dict:
+    horizon = _horizon()
+    hotel_ids = select(Hotel.id).where(Hotel.owner_id == owner_id).scalar_subquery()
+
+    live_bookings = (
+        select(func.count(Booking.id))
+        .join(Room, Room.id == Booking.room_id)
+        .where(Room.hotel_id.in_(hotel_ids), Booking.created_at >= horizon)
+        .scalar_subquery()
+    )
+    live_income = (
+        select(func.coalesce(func.sum(Payment.amount), 0))
+        .join(Booking, Booking.id == Payment.booking_id)
+        .join(Room, Room.id == Booking.room_id)
+        .where(Room.hotel_id.in_(hotel_ids), Payment.status == PaymentStatus.paid, Payment.paid_at >= horizon)
+        .scalar_subquery()
+    )
+
+    def rolled(column):
+        return (
+            select(func.coalesce(func.sum(column), 0))
+            .where(HotelDailyStats.hotel_id.in_(hotel_ids), HotelDailyStats.day < horizon)
+            .scalar_subquery()
+        )
+
+    booking_count, total_income = db.query(
+        rolled(HotelDailyStats.bookings_total) + live_bookings,
+        rolled(HotelDailyStats.income_total) + live_income
+    ).one()
+
+    return {
+        "total_bookings": booking_count,
+        "total_income": round(total_income or 0, 2)
+    }
+
+
+def mark_rollups_dirty(db: Session, booking_ids) -> None:
+    """Queues the rollup days these bookings and their payments were counted in.
+    Call before deleting them or moving them out of their hotel; updates are picked up through updated_at."""
+    booking_ids = list(booking_ids)
+    if not booking_ids:
+        return
+
+    booked = (
+        select(Room.hotel_id, _day(db, Booking.created_at).label("day"))
+        .join(Room, Room.id == Booking.room_id)
+        .where(Booking.id.in_(booking_ids))
+    )
+    paid = (
+        select(Room.hotel_id, _day(db, Payment.paid_at))
+        .join(Booking, Booking.id == Payment.booking_id)
+        .join(Room, Room.id == Booking.room_id)
+        .where(Booking.id.in_(booking_ids), Payment.paid_at.isnot(None))
+    )
+    days = db.execute(union(booked, paid)).all()
+    if not days:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    db.execute(
+        insert(RollupDirtyDay.__table__)
+        .values([{"hotel_id": hotel_id, "day": day} for hotel_id, day in days])
+        .on_conflict_do_nothing()
+    )
+
+
+def refresh_daily_rollups(db: Session) -> int:
+    started = datetime.utcnow()
+    today = started.date()
+    state = db.query(RollupState).filter(RollupState.name == ROLLUP_NAME).first()
+
+    booking_day = _day(db, Booking.created_at)
+    paid_day = _day(db, Payment.paid_at)
+    dirty_bookings = (
+        db.query(Room.hotel_id, booking_day)
+        .join(Room, Room.id == Booking.room_id)
+        .filter(booking_day < today)
+    )
+    dirty_payments = (
+        db.query(Room.hotel_id, paid_day)
+        .join(Booking, Booking.id == Payment.booking_id)
+        .join(Room, Room.id == Booking.room_id)
+        .filter(Payment.paid_at.isnot(None), paid_day < today)
+    )
+    if state:
+        since = datetime.combine(state.refreshed_at.date(), time.min)
+        dirty_bookings = dirty_bookings.filter(Booking.updated_at >= since)
+        dirty_payments = dirty_payments.filter(Payment.updated_at >= since)
+    # deletions leave no updated_at behind, so they are queued explicitly by mark_rollups_dirty
+    queued = db.query(RollupDirtyDay.hotel_id, RollupDirtyDay.day).filter(RollupDirtyDay.day < today)
+
+    dirty = defaultdict(set)
+    for hotel_id, day in dirty_bookings.union(dirty_payments, queued).all():
+        dirty[day].add(hotel_id)
+
+    refreshed = 0
+    for day, hotel_ids in sorted(dirty.items()):
+        start = datetime.combine(day, time.min)
+        end = start + timedelta(days=1)
+        in_day = (Booking.created_at >= start, Booking.created_at < end)
+        paid_in_day = (
+            Payment.status.in_([PaymentStatus.paid, PaymentStatus.refunded]),
+            Payment.paid_at >= start,
+            Payment.paid_at < end
+        )
+
+        booking_rows = (
+            db.query(
+                Room.hotel_id,
+                func.count(Booking.id),
+                func.count(case((Booking.status == BookingStatus.confirmed, 1))),
+                func.count(case((Booking.status == BookingStatus.completed, 1))),
+                func.count(case((Booking.status == BookingStatus.cancelled, 1)))
+            )
+            .join(Room, Room.id == Booking.room_id)
+            .filter(Room.hotel_id.in_(hotel_ids), *in_day)
+            .group_by(Room.hotel_id)
+            .all()
+        )
+
+        paid = Payment.status == PaymentStatus.paid
+        payment_rows = (
+            db.query(
+                Room.hotel_id,
+                func.sum(case((paid, Payment.amount), else_=0)),
+                func.sum(case((paid & (Payment.is_card == True), Payment.amount), else_=0)),
+                func.sum(case((paid & (Payment.is_card == False), Payment.amount), else_=0)),
+                func.sum(case((Payment.status == PaymentStatus.refunded, Payment.amount), else_=0)),
+                func.count(case((paid & (Payment.is_card == True), 1))),
+                func.count(case((paid & (Payment.is_card == False), 1))),
+                func.max(case((paid, Payment.amount))),
+                func.min(case((paid, Payment.amount)))
+            )
+            .join(Booking, Booking.id == Payment.booking_id)
+            .join(Room, Room.id == Booking.room_id)
+            .filter(Room.hotel_id.in_(hotel_ids), *paid_in_day)
+            .group_by(Room.hotel_id)
+            .all()
+        )
+
+        client_bookings = (
+            db.query(Room.hotel_id, Booking.client_id, func.count(Booking.id))
+            .join(Room, Room.id == Booking.room_id)
+            .filter(Room.hotel_id.in_(hotel_ids), *in_day)
+            .group_by(Room.hotel_id, Booking.client_id)
+            .all()
+        )
+        client_payments = (
+            db.query(Room.hotel_id, Booking.client_id, func.sum(Payment.amount))
+            .join(Booking, Booking.id == Payment.booking_id)
+            .join(Room, Room.id == Booking.room_id)
+            .filter(Room.hotel_id.in_(hotel_ids), paid, Payment.paid_at >= start, Payment.paid_at < end)
+            .group_by(Room.hotel_id, Booking.client_id)
+            .all()
+        )
+
+        for model in (HotelDailyStats, HotelDailyClientStats):
+            db.query(model).filter(
+                model.day == day,
+                model.hotel_id.in_(hotel_ids)
+            ).delete(synchronize_session=False)
+        db.query(RollupDirtyDay).filter(
+            RollupDirtyDay.day == day,
+            RollupDirtyDay.hotel_id.in_(hotel_ids)
+        ).delete(synchronize_session=False)
+
+        # plain dicts written with Core inserts: the rows just deleted may still be in the
+        # session's identity map and would conflict with new ORM objects for the same keys
+        empty = dict(
+            bookings_total=0, bookings_confirmed=0, bookings_completed=0, bookings_cancelled=0,
+            income_total=0, income_card=0, income_cash=0, refunds=0,
+            paid_count=0, paid_card_count=0, paid_cash_count=0, max_payment=None, min_payment=None
+        )
+        rows = {hotel_id: dict(empty, hotel_id=hotel_id, day=day, refreshed_at=started) for hotel_id in hotel_ids}
+        for hotel_id, total, confirmed, completed, cancelled in booking_rows:
+            rows[hotel_id].update(
+                bookings_total=total,
+                bookings_confirmed=confirmed,
+                bookings_completed=completed,
+                bookings_cancelled=cancelled
+            )
+        for hotel_id, income, card, cash, refunds, card_count, cash_count, max_payment, min_payment in payment_rows:
+            rows[hotel_id].update(
+                income_total=income or 0,
+                income_card=card or 0,
+                income_cash=cash or 0,
+                refunds=refunds or 0,
+                paid_card_count=card_count,
+                paid_cash_count=cash_count,
+                paid_count=card_count + cash_count,
+                max_payment=max_payment,
+                min_payment=min_payment
+            )
+
+        clients = {}
+        for hotel_id, client_id, count in client_bookings:
+            clients[hotel_id, client_id] = dict(hotel_id=hotel_id, day=day, client_id=client_id, bookings=count, spent=0)
+        for hotel_id, client_id, spent in client_payments:
+            row = clients.setdefault(
+                (hotel_id, client_id), dict(hotel_id=hotel_id, day=day, client_id=client_id, bookings=0, spent=0)
+            )
+            row["spent"] = spent or 0
+
+        db.execute(insert(HotelDailyStats.__table__), list(rows.values()))
+        if clients:
+            db.execute(insert(HotelDailyClientStats.__table__), list(clients.values()))
+        db.commit()
+        refreshed += len(rows)
+
+    if not state:
+        state = RollupState(name=ROLLUP_NAME)
+        db.add(state)
+    state.horizon = today
+    state.refreshed_at = started
+    db.commit()
+    return refreshed
@@ -0,0 +1,67 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from models import HotelStats, Rating, Room
+
+
+def rebuild_hotel_stats(db: Session, hotel_id: int) -> HotelStats:
+    db.flush()
+    rating_sum, rating_count, views_total = (
+        db.query(
+            func.coalesce(func.sum(Rating.rating), 0),
+            func.count(Rating.id),
+            func.coalesce(func.sum(Rating.views), 0)
+        )
+        .filter(Rating.hotel_id == hotel_id)
+        .one()
+    )
+    min_price, room_count = (
+        db.query(func.min(Room.price_per_night), func.count(Room.id))
+        .filter(Room.hotel_id == hotel_id)
+        .one()
+    )
+
+    stats = db.query(HotelStats).filter(HotelStats.hotel_id == hotel_id).first()
+    if not stats:
+        stats = HotelStats(hotel_id=hotel_id)
+        db.add(stats)
+
+    stats.rating_sum = float(rating_sum)
+    stats.rating_count = rating_count
+    stats.rating_avg = float(rating_sum) / rating_count if rating_count else 0
+    stats.views_total = int(views_total)
+    stats.min_price = min_price
+    stats.room_count = room_count
+    return stats
+
+
+def apply_rating_delta(db: Session, hotel_id: int, rating_delta: float = 0, count_delta: int = 0, views_delta: int = 0):
+    new_sum = HotelStats.rating_sum + rating_delta
+    new_count = HotelStats.rating_count + count_delta
+
+    updated = (
+        db.query(HotelStats)
+        .filter(HotelStats.hotel_id == hotel_id)
+        .update({
+            HotelStats.rating_sum: new_sum,
+            HotelStats.rating_count: new_count,
+            HotelStats.rating_avg: func.coalesce(new_sum / func.nullif(new_count, 0), 0),
+            HotelStats.views_total: HotelStats.views_total + views_delta
+        }, synchronize_session=False)
+    )
+    if not updated:
+        rebuild_hotel_stats(db, hotel_id)
+
+
+def refresh_room_stats(db: Session, hotel_id: int):
+    db.flush()
+    # lock the row first so the update below runs on a snapshot that includes
+    # every room change committed by a concurrent refresh of the same hotel
+    locked = db.query(HotelStats.hotel_id).filter(HotelStats.hotel_id == hotel_id).with_for_update().first()
+    if not locked:
+        rebuild_hotel_stats(db, hotel_id)
+        return
+
+    db.query(HotelStats).filter(HotelStats.hotel_id == hotel_id).update({
+        HotelStats.min_price: select(func.min(Room.price_per_night)).where(Room.hotel_id == hotel_id).scalar_subquery(),
+        HotelStats.room_count: select(func.count(Room.id)).where(Room.hotel_id == hotel_id).scalar_subquery()
+    }, synchronize_session=False)
@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import List, Set, Tuple
+
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm import Session
+
+from cache import invalidate_hotels
+from crud.hotel_stats import apply_rating_delta
+from models import Rating, Hotel, Client
+
+MAX_BUFFERED_VIEWS = int(os.getenv("VIEW_BUFFER_MAX_KEYS", "10000"))
+
+_pending = Counter()
+_lock = threading.Lock()
+
+
+def record_view(hotel_id: int, user_id: int) -> bool:
+    key = (hotel_id, user_id)
+    with _lock:
+        if key in _pending or len(_pending) < MAX_BUFFERED_VIEWS:
+            _pending[key] += 1
+        return len(_pending) >= MAX_BUFFERED_VIEWS
+
+
+def _drain() -> Counter:
+    global _pending
+    with _lock:
+        batch, _pending = _pending, Counter()
+    return batch
+
+
+def _requeue(batch: Counter):
+    with _lock:
+        for key, count in batch.items():
+            if key in _pending or len(_pending) < MAX_BUFFERED_VIEWS:
+                _pending[key] += count
+
+
+def insert_missing_ratings(db: Session, rows: List[dict]) -> Set[Tuple[int, int]]:
+    """INSERT ... ON CONFLICT (hotel_id, user_id) DO NOTHING; returns the pairs this call created.
+    Rows that already existed, including ones a concurrent writer just inserted, are left to the caller."""
+    if not rows:
+        return set()
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = (
+        insert(Rating.__table__)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["hotel_id", "user_id"])
+        .returning(Rating.hotel_id, Rating.user_id)
+    )
+    return {(h, u) for h, u in db.execute(statement)}
+
+
+def flush_views(db: Session) -> int:
+    batch = _drain()
+    if not batch:
+        return 0
+
+    try:
+        hotel_ids = {h for h, _ in batch}
+        user_ids = {u for _, u in batch}
+        live_hotels = {h for (h,) in db.query(Hotel.id).filter(Hotel.id.in_(hotel_ids))}
+        live_users = {u for (u,) in db.query(Client.id).filter(Client.id.in_(user_ids))}
+        batch = Counter({
+            (h, u): n for (h, u), n in batch.items()
+            if h in live_hotels and u in live_users
+        })
+        if not batch:
+            return 0
+
+        created = insert_missing_ratings(db, [
+            {"hotel_id": h, "user_id": u, "rating": 0.0, "views": n} for (h, u), n in batch.items()
+        ])
+
+        ratings = Rating.__table__
+        updates = [{"h": h, "u": u, "n": n} for (h, u), n in batch.items() if (h, u) not in created]
+        if updates:
+            db.connection().execute(
+                update(ratings)
+                .where(ratings.c.hotel_id == bindparam("h"), ratings.c.user_id == bindparam("u"))
+                .values(views=ratings.c.views + bindparam("n")),
+                updates
+            )
+
+        per_hotel = defaultdict(lambda: [0, 0])
+        for (h, u), n in batch.items():
+            per_hotel[h][0] += n
+        for h, _ in created:
+            per_hotel[h][1] += 1
+        for hotel_id, (views, created) in per_hotel.items():
+            apply_rating_delta(db, hotel_id, count_delta=created, views_delta=views)
+
+        db.commit()
+        # view counts alone may lag in cached payloads; only new rating rows move the aggregates
+        invalidate_hotels(h for h, (_, created) in per_hotel.items() if created)
+    except Exception:
+        db.rollback()
+        _requeue(batch)
+        raise
+
+    return sum(batch.values())
@@ -1,33 +1,334 @@
 # utils/images.py
-from PIL import Image
-from io import BytesIO
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
 import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from typing import Dict, Iterable, Optional, Tuple
+
+from boto3.s3.transfer import TransferConfig
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+
+from cache import invalidate_hotels
+from crud.s3_outbox import enqueue_s3_deletes
+from database import SessionLocal
+from models import Client
+from storage import S3_BUCKET, PRESIGNED_UPLOAD_EXPIRES, get_s3_client, public_url, presigned_upload, object_size
 
 MAX_WIDTH = 1920
 MAX_HEIGHT = 1080
 ALLOWED_IMAGE_TYPES = {"jpg", "jpeg", "png", "webp"}
+UPLOAD_CONTENT_TYPES = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+IMAGE_VARIANTS = (
+    ("full", (MAX_WIDTH, MAX_HEIGHT)),
+    ("card", (800, 600)),
+    ("thumb", (320, 240)),
+)
+# avatars only keep one small square-bounded rendition, stored as Client.avatar_url
+AVATAR_VARIANTS = (
+    ("full", (512, 512)),
+)
+Image.init()
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg", {"quality": 85, "optimize": True}),
+    "webp": ("WEBP", "webp", "image/webp", {"quality": 80, "method": 4}),
+}
+if "AVIF" in Image.SAVE:
+    IMAGE_FORMATS["avif"] = ("AVIF", "avif", "image/avif", {"quality": 60})
+
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", "8"))
+IMAGE_QUEUE_LIMIT = int(os.getenv("IMAGE_QUEUE_LIMIT", "16"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+IMAGE_TMP_DIR = os.getenv("IMAGE_TMP_DIR") or None
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4
+)
+
+
+class ImageQueueFull(Exception):
+    pass
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_in_flight = 0
+
+
+def _pools():
+    global _process_pool, _io_pool
+    with _pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS)
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_WORKERS, thread_name_prefix="image-io")
+        return _process_pool, _io_pool
+
 
-def process_and_upload_image(file, s3_client, bucket, region, path_prefix: str) -> str:
-    ext = file.filename.split(".")[-1].lower()
-    if ext not in ALLOWED_IMAGE_TYPES:
+def shutdown_image_pools():
+    global _process_pool, _io_pool
+    with _pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=True)
+            _process_pool = None
+        if _io_pool is not None:
+            _io_pool.shutdown(wait=True)
+            _io_pool = None
+
+
+def acquire_image_slot():
+    global _in_flight
+    with _pool_lock:
+        if _in_flight >= IMAGE_QUEUE_LIMIT:
+            raise ImageQueueFull("Too many images are being processed, try again later")
+        _in_flight += 1
+
+
+def release_image_slot():
+    global _in_flight
+    with _pool_lock:
+        _in_flight = max(0, _in_flight - 1)
+
+
+def validate_image_name(filename: str, allowed_types=ALLOWED_IMAGE_TYPES) -> str:
+    ext = filename.split(".")[-1].lower()
+    if ext not in allowed_types:
         raise ValueError("Invalid image format")
+    return ext
 
-    contents = file.file.read()
-    image = Image.open(BytesIO(contents)).convert("RGB")
-    image.thumbnail((MAX_WIDTH, MAX_HEIGHT), Image.LANCZOS)
 
-    buffer = BytesIO()
-    image.save(buffer, format="JPEG", quality=85)
-    buffer.seek(0)
+def presign_image_upload(key_prefix: str, filename: str, allowed_types=ALLOWED_IMAGE_TYPES) -> dict:
+    ext = validate_image_name(filename, allowed_types)
+    key = f"{key_prefix}/{uuid.uuid4()}.{ext}"
+    post = presigned_upload(key, UPLOAD_CONTENT_TYPES[ext], IMAGE_MAX_BYTES)
+    return {"url": post["url"], "fields": post["fields"], "key": key, "expires_in": PRESIGNED_UPLOAD_EXPIRES}
 
-    filename = f"{uuid.uuid4()}.jpg"
-    s3_key = f"{path_prefix}/{filename}"
 
-    s3_client.upload_fileobj(
-        buffer,
-        bucket,
-        s3_key,
-        ExtraArgs={"ContentType": "image/jpeg"}
-    )
+def check_uploaded_object(key: str, key_prefix: str):
+    if not key.startswith(f"{key_prefix}/") or ".." in key:
+        raise ValueError("Invalid upload key")
+    if object_size(key) is None:
+        raise ValueError("Uploaded file not found")
+
+
+# spooled uploads handed to the renderer by descriptor, keyed by their /proc path
+_borrowed: Dict[str, int] = {}
+
+
+def discard_upload(*paths: Optional[str]):
+    for path in paths:
+        if not path:
+            continue
+        fd = _borrowed.pop(path, None)
+        if fd is not None:
+            os.close(fd)
+            continue
+        with suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def _copy_upload(fileobj) -> str:
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=IMAGE_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(fileobj, out, UPLOAD_CHUNK_SIZE)
+    except Exception:
+        discard_upload(path)
+        raise
+    return path
+
+
+async def spool_upload(file) -> str:
+    """Returns a path the render workers can open for the uploaded file.
 
-    return f"https://{bucket}.s3.{region}.amazonaws.com/{s3_key}"
+    Starlette has already spooled the body, so on Linux the spooled file is shared through a
+    duplicated descriptor under /proc instead of being copied. The duplicate keeps it readable
+    after the request closes the upload, and discard_upload() releases it."""
+    spooled = file.file
+    await file.seek(0)
+    # fileno() rolls small in-memory uploads over to a real file first
+    fd = await run_in_threadpool(spooled.fileno)
+    size = file.size if file.size is not None else os.fstat(fd).st_size
+    if size > IMAGE_MAX_BYTES:
+        raise ImageTooLarge(f"Image exceeds {IMAGE_MAX_BYTES // (1024 * 1024)} MB limit")
+
+    if not os.path.isdir(f"/proc/{os.getpid()}/fd"):
+        return await run_in_threadpool(_copy_upload, spooled)
+
+    spooled.flush()
+    borrowed = os.dup(fd)
+    path = f"/proc/{os.getpid()}/fd/{borrowed}"
+    _borrowed[path] = borrowed
+    return path
+
+
+def render_image(source: str, variants=IMAGE_VARIANTS) -> Dict[Tuple[str, str], str]:
+    rendered = {}
+    target_base = os.path.join(IMAGE_TMP_DIR or tempfile.gettempdir(), f"render-{uuid.uuid4().hex}")
+    try:
+        with Image.open(source) as original:
+            if original.width * original.height > IMAGE_MAX_PIXELS:
+                raise ValueError("Image dimensions are too large")
+            # JPEGs are decoded at a reduced DCT scale instead of full resolution
+            original.draft("RGB", (MAX_WIDTH, MAX_HEIGHT))
+            image = original.convert("RGB")
+
+        for variant, size in variants:
+            image.thumbnail(size, Image.LANCZOS)
+            for fmt, (pil_format, ext, _, options) in IMAGE_FORMATS.items():
+                target = f"{target_base}.{variant}.{ext}"
+                rendered[(variant, fmt)] = target
+                image.save(target, format=pil_format, **options)
+    except Exception:
+        discard_upload(*rendered.values())
+        raise
+    return rendered
+
+
+def upload_rendered(rendered: Dict[Tuple[str, str], str], path_prefix: str):
+    s3_client = get_s3_client()
+    base_name = uuid.uuid4()
+    variants = {}
+    for (variant, fmt), path in rendered.items():
+        _, ext, content_type, _ = IMAGE_FORMATS[fmt]
+        s3_key = f"{path_prefix}/{base_name}_{variant}.{ext}"
+
+        s3_client.upload_file(
+            path,
+            S3_BUCKET,
+            s3_key,
+            ExtraArgs={"ContentType": content_type},
+            Config=S3_TRANSFER_CONFIG
+        )
+        variants.setdefault(variant, {})[fmt] = public_url(s3_key)
+
+    return variants["full"]["jpeg"], variants
+
+
+def image_urls(image) -> list:
+    urls = [image.image_url] if image.image_url else []
+    for formats in (image.variants or {}).values():
+        urls.extend(url for url in formats.values() if url not in urls)
+    return urls
+
+
+async def render_and_upload(source: str, path_prefix: str, variants=IMAGE_VARIANTS):
+    process_pool, io_pool = _pools()
+    loop = asyncio.get_running_loop()
+    rendered = {}
+    try:
+        rendered = await loop.run_in_executor(process_pool, render_image, source, variants)
+        return await loop.run_in_executor(io_pool, upload_rendered, rendered, path_prefix)
+    finally:
+        discard_upload(source, *rendered.values())
+
+
+async def process_and_upload_image(file, path_prefix: str, variants=IMAGE_VARIANTS):
+    validate_image_name(file.filename)
+    acquire_image_slot()
+    try:
+        source = await spool_upload(file)
+        return await render_and_upload(source, path_prefix, variants)
+    finally:
+        release_image_slot()
+
+
+def _store_image_url(model, image_id: int, url: Optional[str], variants: Optional[dict], discard_urls: Iterable[str] = ()):
+    db = SessionLocal()
+    try:
+        enqueue_s3_deletes(db, discard_urls)
+        image = db.query(model).filter(model.id == image_id).first()
+        if not image:
+            # the image row was deleted while processing; don't leave the upload behind
+            if url:
+                enqueue_s3_deletes(db, [u for formats in variants.values() for u in formats.values()])
+        elif url:
+            image.image_url = url
+            image.variants = variants
+        else:
+            db.delete(image)
+        hotel_id = getattr(image, "hotel_id", None)
+        db.commit()
+        if hotel_id is not None:
+            invalidate_hotels([hotel_id])
+    finally:
+        db.close()
+
+
+def _store_avatar_url(model, client_id: int, url: Optional[str], variants: Optional[dict], discard_urls: Iterable[str] = ()):
+    db = SessionLocal()
+    try:
+        discard = list(discard_urls)
+        client = db.query(model).filter(model.id == client_id).first()
+        if client and url:
+            discard.append(client.avatar_url)
+            client.avatar_url = url
+        elif url:
+            discard.extend(u for formats in variants.values() for u in formats.values())
+        enqueue_s3_deletes(db, discard)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def process_image_in_background(model, image_id: int, source: str, path_prefix: str, discard_urls: Iterable[str] = (),
+                                      variants=IMAGE_VARIANTS, store=_store_image_url):
+    url, rendered = None, None
+    try:
+        url, rendered = await render_and_upload(source, path_prefix, variants)
+    except Exception as e:
+        print(f"[images] Processing failed for {model.__tablename__} {image_id}: {e}")
+    finally:
+        release_image_slot()
+
+    _, io_pool = _pools()
+    await asyncio.get_running_loop().run_in_executor(io_pool, store, model, image_id, url, rendered, discard_urls)
+
+
+def _download_upload(key: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=IMAGE_TMP_DIR)
+    os.close(fd)
+    try:
+        get_s3_client().download_file(S3_BUCKET, key, path)
+    except Exception:
+        discard_upload(path)
+        raise
+    return path
+
+
+async def process_uploaded_image_in_background(model, image_id: int, key: str, path_prefix: str,
+                                               variants=IMAGE_VARIANTS, store=_store_image_url):
+    _, io_pool = _pools()
+    loop = asyncio.get_running_loop()
+    # the raw upload is only an intermediate; variants are rendered from it and it is then removed
+    original = [public_url(key)]
+    try:
+        source = await loop.run_in_executor(io_pool, _download_upload, key)
+    except Exception as e:
+        print(f"[images] Download failed for {model.__tablename__} {image_id}: {e}")
+        release_image_slot()
+        await loop.run_in_executor(io_pool, store, model, image_id, None, None, original)
+        return
+
+    await process_image_in_background(model, image_id, source, path_prefix, original, variants, store)
+
+
+async def process_uploaded_avatar_in_background(client_id: int, key: str):
+    await process_uploaded_image_in_background(
+        Client, client_id, key, f"avatars/{client_id}", AVATAR_VARIANTS, _store_avatar_url
+    )
@@ -0,0 +1,34 @@
+import os
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from cache import CACHE_BACKEND, cache_delete, cache_get, cache_set
+from models import Hotel
+
+# invalidate_hotel_owner only reaches other workers through the shared backend;
+# with per-process caches keep entries short-lived so they converge quickly
+HOTEL_OWNER_TTL = int(os.getenv("HOTEL_OWNER_TTL", "3600" if CACHE_BACKEND == "redis" else "60"))
+
+
+def _key(hotel_id: int) -> str:
+    return f"hotel_owner:{hotel_id}"
+
+
+def hotel_owner_id(db: Session, hotel_id: int) -> Optional[int]:
+    owner_id = cache_get(_key(hotel_id))
+    if owner_id is None:
+        row = db.query(Hotel.owner_id).filter(Hotel.id == hotel_id).first()
+        if not row:
+            return None
+        owner_id = row[0]
+        cache_set(_key(hotel_id), owner_id, HOTEL_OWNER_TTL)
+    return owner_id
+
+
+def owns_hotel(db: Session, hotel_id: int, owner_id: int) -> bool:
+    return hotel_owner_id(db, hotel_id) == owner_id
+
+
+def invalidate_hotel_owner(hotel_id: int):
+    cache_delete(_key(hotel_id))
@@ -0,0 +1,79 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+# also caps how many request threads can be waiting on a hash at once
+PASSWORD_MAX_CONCURRENCY = int(os.getenv("PASSWORD_MAX_CONCURRENCY", str(PASSWORD_WORKERS * 2)))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+# hashes made with a different rounds setting are reported as needing an update
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_MAX_CONCURRENCY)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+        return _pool
+
+
+def shutdown_password_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy("Too many authentication requests, try again later")
+    try:
+        future = _get_pool().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    # the slot is held until the work itself finishes, even if the caller stops waiting
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        raise PasswordHasherBusy("Too many authentication requests, try again later")
+
+
+def get_password_hash(password: str) -> str:
+    return _run(_hash, password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Returns (matches, new_hash); new_hash is set when the stored hash uses outdated parameters."""
+    if not hashed_password:
+        return False, None
+    return _run(_verify_and_update, plain_password, hashed_password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return verify_and_update(plain_password, hashed_password)[0]
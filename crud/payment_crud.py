@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+from crud.hotel_analytics import mark_rollups_dirty
 from models import Payment
 
 def create_payment(db: Session, payment_data: dict):
@@ -17,6 +18,7 @@ def get_payment_by_id(db: Session, payment_id: int):
 def delete_payment(db: Session, payment_id: int):
     payment = db.query(Payment).filter(Payment.id == payment_id).first()
     if payment:
+        mark_rollups_dirty(db, [payment.booking_id])
         db.delete(payment)
         db.commit()
         return True
@@ -1,29 +1,29 @@
+from typing import Optional
+
+from sqlalchemy import select, union_all, update, exists, or_, true, false, null, DateTime
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from database import is_unique_violation
 from models import Owner, Client
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
+from crud.passwords import pwd_context, get_password_hash, verify_password, verify_and_update, PasswordHasherBusy
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(Client).filter(Client.email == email).first()
-    is_owner = False
 
-    if not user:
-        user = db.query(Owner).filter(Owner.email == email).first()
-        is_owner = True
+def _identity_query(email: str):
+    # clients win when the same email is registered as both, matching the old lookup order
+    identities = union_all(
+        select(
+            Client.id, Client.first_name, Client.last_name, Client.email, Client.phone, Client.password,
+            Client.birth_date, false().label("is_owner")
+        ).where(Client.email == email),
+        select(
+            Owner.id, Owner.first_name, Owner.last_name, Owner.email, Owner.phone, Owner.password,
+            null().cast(DateTime).label("birth_date"), true().label("is_owner")
+        ).where(Owner.email == email)
+    ).subquery()
+    return select(identities).order_by(identities.c.is_owner).limit(1)
 
-    if not user or not verify_password(password, user.password):
-        return None
 
+def _profile(user, is_owner: bool) -> dict:
     return {
         "id": user.id,
         "first_name": user.first_name,
@@ -36,10 +36,51 @@ def authenticate_user(db: Session, email: str, password: str):
     }
 
 
+def get_profile(db: Session, user_id: int, is_owner: bool) -> Optional[dict]:
+    model = Owner if is_owner else Client
+    user = db.query(model).filter(model.id == user_id).first()
+    return _profile(user, is_owner) if user else None
+
+
+def authenticate_user(db: Session, email: str, password: str):
+    user = db.execute(_identity_query(email)).first()
+    if not user:
+        return None
+
+    verified, new_hash = verify_and_update(password, user.password)
+    if not verified:
+        return None
+
+    if new_hash:
+        # bcrypt cost changed since this hash was stored
+        model = Owner if user.is_owner else Client
+        db.execute(update(model).where(model.id == user.id).values(password=new_hash))
+        db.commit()
+
+    return _profile(user, user.is_owner)
+
+
+def _is_taken(db: Session, model, data: dict) -> bool:
+    # cheap indexed lookup so duplicate signups don't spend a bcrypt slot; the constraint still decides races
+    return db.query(exists().where(or_(model.email == data["email"], model.phone == data["phone"]))).scalar()
+
+
+def _insert_person(db: Session, person, conflict_message: str):
+    db.add(person)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not is_unique_violation(e):
+            raise
+        raise ValueError(conflict_message)
+    db.refresh(person)
+    return person
+
+
 def create_owner(db: Session, data: dict) -> Owner:
-    if db.query(Owner).filter((Owner.email == data["email"]) | (Owner.phone == data["phone"])).first():
+    if _is_taken(db, Owner, data):
         raise ValueError("Owner with this email or phone already exists.")
-
     owner = Owner(
         first_name=data["first_name"],
         last_name=data["last_name"],
@@ -47,16 +88,12 @@ def create_owner(db: Session, data: dict) -> Owner:
         phone=data["phone"],
         password=get_password_hash(data["password"])
     )
-    db.add(owner)
-    db.commit()
-    db.refresh(owner)
-    return owner
+    return _insert_person(db, owner, "Owner with this email or phone already exists.")
 
 
 def create_client(db: Session, data: dict) -> Client:
-    if db.query(Client).filter((Client.email == data["email"]) | (Client.phone == data["phone"])).first():
+    if _is_taken(db, Client, data):
         raise ValueError("Client with this email or phone already exists.")
-
     client = Client(
         first_name=data["first_name"],
         last_name=data["last_name"],
@@ -65,7 +102,4 @@ def create_client(db: Session, data: dict) -> Client:
         password=get_password_hash(data["password"]),
         birth_date=data["birth_date"]
     )
-    db.add(client)
-    db.commit()
-    db.refresh(client)
-    return client
+    return _insert_person(db, client, "Client with this email or phone already exists.")
@@ -0,0 +1,63 @@
+import os
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+from models import S3DeleteOutbox
+from storage import S3_BUCKET, get_s3_client, key_from_url
+
+S3_DELETE_BATCH = 1000
+S3_DELETE_MAX_ATTEMPTS = int(os.getenv("S3_DELETE_MAX_ATTEMPTS", "10"))
+
+
+def enqueue_s3_deletes(db: Session, urls: Iterable[str]):
+    keys = {key_from_url(url) for url in urls if url}
+    db.add_all([S3DeleteOutbox(s3_key=key, attempts=0) for key in keys])
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(minutes=min(2 ** attempts, 60))
+
+
+def drain_outbox(db: Session) -> int:
+    s3_client = get_s3_client()
+    deleted = 0
+    while True:
+        now = datetime.utcnow()
+        rows = (
+            db.query(S3DeleteOutbox)
+            .filter(
+                S3DeleteOutbox.next_attempt_at <= now,
+                S3DeleteOutbox.attempts < S3_DELETE_MAX_ATTEMPTS
+            )
+            .order_by(S3DeleteOutbox.id)
+            .limit(S3_DELETE_BATCH)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not rows:
+            return deleted
+
+        keys = list({row.s3_key for row in rows})
+        try:
+            result = s3_client.delete_objects(
+                Bucket=S3_BUCKET,
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True}
+            )
+            errors = {e["Key"]: f'{e.get("Code")}: {e.get("Message")}' for e in result.get("Errors", [])}
+        except Exception as e:
+            errors = {key: str(e) for key in keys}
+
+        for row in rows:
+            if row.s3_key in errors:
+                row.attempts += 1
+                row.last_error = errors[row.s3_key][:1000]
+                row.next_attempt_at = now + _backoff(row.attempts)
+            else:
+                db.delete(row)
+        db.commit()
+
+        deleted += len(keys) - len(errors)
+        if len(errors) == len(keys) or len(rows) < S3_DELETE_BATCH:
+            return deleted
@@ -2,6 +2,8 @@ import os
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 load_dotenv()
@@ -11,9 +13,67 @@ print(f"DATABASE_URL: {SQLALCHEMY_DATABASE_URL}")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError(" ERROR: DATABASE_URL not found! Check variables in Railway.")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("DATABASE_READ_URL")
+
+# every worker opens a sync and an async engine for the primary, plus the same pair for DATABASE_READ_URL
+# when set, each allowed pool_size + max_overflow connections: up to 2 * (5 + 5) = 20 per worker on the
+# primary and another 20 on the replica. Multiply by the worker count when sizing max_connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+UNIQUE_VIOLATION = "23505"
+
+
+def _engine_options(url: str, is_async: bool = False) -> dict:
+    if url.startswith("sqlite"):
+        return {} if is_async else {"connect_args": {"check_same_thread": False}}
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def _async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    # asyncpg takes "ssl" where libpq takes "sslmode"
+    return f"postgresql+asyncpg://{rest}".replace("sslmode=", "ssl=")
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL))
+read_engine = (
+    create_engine(SQLALCHEMY_READ_DATABASE_URL, **_engine_options(SQLALCHEMY_READ_DATABASE_URL))
+    if SQLALCHEMY_READ_DATABASE_URL else engine
+)
+
+async_engine = create_async_engine(
+    _async_url(SQLALCHEMY_DATABASE_URL), **_engine_options(SQLALCHEMY_DATABASE_URL, is_async=True)
+)
+async_read_engine = (
+    create_async_engine(
+        _async_url(SQLALCHEMY_READ_DATABASE_URL), **_engine_options(SQLALCHEMY_READ_DATABASE_URL, is_async=True)
+    )
+    if SQLALCHEMY_READ_DATABASE_URL else async_engine
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -23,3 +83,46 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+async def dispose_async_engines():
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+def _pool_stats(pool) -> dict:
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method:
+            stats[name] = method()
+    return stats
+
+def pool_status() -> dict:
+    status = {"primary": _pool_stats(engine.pool), "primary_async": _pool_stats(async_engine.pool)}
+    if read_engine is not engine:
+        status["replica"] = _pool_stats(read_engine.pool)
+        status["replica_async"] = _pool_stats(async_read_engine.pool)
+    return status
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    if code is not None:
+        return code == UNIQUE_VIOLATION
+    # sqlite, used by the tests, reports no SQLSTATE
+    return "UNIQUE constraint failed" in str(error.orig)
@@ -1,13 +1,21 @@
+import hmac
+import os
+from dataclasses import dataclass
+
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
 from typing import Optional
 
+from crud.ownership import hotel_owner_id
 from database import get_db
-from models import Hotel, Owner
+from models import Owner
 from utils import verify_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+# the /metrics endpoints stay hidden unless this is set, and then require it in X-Metrics-Token
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
 
 def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> Optional[dict]:
@@ -31,21 +39,26 @@ def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> Optional[
     return payload
 
 
+@dataclass(frozen=True)
+class OwnerPrincipal:
+    id: int
+
+
 def get_current_owner(
     user: Optional[dict] = Depends(get_current_user),
     db: Session = Depends(get_db)
-) -> Owner:
+) -> OwnerPrincipal:
     if not user or not user.get("is_owner"):
         raise HTTPException(
             status_code=403,
             detail="Only owners can perform this action"
         )
 
-    owner = db.query(Owner).filter(Owner.id == user["id"]).first()
-    if not owner:
+    # primary-key EXISTS only, so a deleted owner's token stops working right away
+    if not db.query(exists().where(Owner.id == user["id"])).scalar():
         raise HTTPException(status_code=404, detail="Owner not found")
 
-    return owner
+    return OwnerPrincipal(id=user["id"])
 
 
 
@@ -53,7 +66,7 @@ def is_hotel_owner(
         hotel_id: int,
         user: Optional[dict] = Depends(get_current_user),
         db: Session = Depends(get_db)
-) -> Hotel:
+) -> OwnerPrincipal:
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -61,15 +74,21 @@ def is_hotel_owner(
             headers={"WWW-Authenticate": "Bearer"}
         )
 
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id).first()
-    if not hotel:
+    owner_id = hotel_owner_id(db, hotel_id)
+    if owner_id is None:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
-    owner = db.query(Owner).filter(Owner.id == hotel.owner_id).first()
-    if not owner or owner.id != user["id"]:
+    if not user.get("is_owner") or owner_id != user["id"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to modify this hotel"
         )
 
-    return hotel
+    return OwnerPrincipal(id=user["id"])
+
+
+def require_metrics_token(token: Optional[str] = Header(None, alias="X-Metrics-Token")):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token, METRICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid metrics token")
@@ -1,17 +1,24 @@
 import os
-from datetime import datetime
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
-from database import Base, engine
+from cache import cache_stats
+from database import Base, engine, pool_status, dispose_async_engines
+from dependencies import require_metrics_token
 from routers import (
     auth, hotels, rooms, profile, amenities, stripe_webhook, payments, bookings, favorite, employees
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
-from tasks import auto_complete_bookings, cancel_stale_card_bookings
-from apscheduler.schedulers.background import BackgroundScheduler
+from crud.amenity_catalog import load_amenity_catalog
+from crud.images import shutdown_image_pools
+from crud.passwords import shutdown_password_pool
+from middleware import UploadLimitMiddleware
+from storage import STORAGE_BACKEND, LOCAL_STORAGE_DIR
+from scheduler import start_scheduler, stop_scheduler, scheduler_status
+from tasks import flush_hotel_views
 
 app = FastAPI(
     title="Hotel Booking API",
@@ -19,6 +26,7 @@ app = FastAPI(
     version="1.0.0"
 )
 app.add_middleware(ProxyHeadersMiddleware)
+app.add_middleware(UploadLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -28,6 +36,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 
@@ -50,20 +59,45 @@ routers = [
 for router in routers:
     app.include_router(router)
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(
-    auto_complete_bookings,
-    trigger="interval",
-    hours=12,
-    next_run_time=datetime.utcnow()
-)
-scheduler.add_job(
-    cancel_stale_card_bookings,
-    trigger="interval",
-    minutes=10,
-    next_run_time=datetime.utcnow()
-)
-scheduler.start()
+if STORAGE_BACKEND == "local":
+    os.makedirs(LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount("/storage", StaticFiles(directory=LOCAL_STORAGE_DIR), name="storage")
+
+@app.on_event("startup")
+def warm_amenity_catalog():
+    try:
+        load_amenity_catalog()
+    except Exception as e:
+        print(f"[startup] Amenity catalog not loaded, will retry on first use: {e}")
+
+@app.on_event("startup")
+def start_background_jobs():
+    # shared jobs only run in the worker holding the leader lock; RUN_SCHEDULER=false leaves them to `python scheduler.py serve`
+    start_scheduler()
+
+@app.on_event("shutdown")
+def shutdown_scheduler():
+    stop_scheduler()
+    flush_hotel_views()
+    shutdown_image_pools()
+    shutdown_password_pool()
+
+@app.on_event("shutdown")
+async def close_async_engines():
+    await dispose_async_engines()
+
+@app.get("/metrics/db-pool", tags=["Root"], dependencies=[Depends(require_metrics_token)])
+def db_pool_metrics():
+    return pool_status()
+
+@app.get("/metrics/cache", tags=["Root"], dependencies=[Depends(require_metrics_token)])
+def cache_metrics():
+    return cache_stats()
+
+@app.get("/metrics/scheduler", tags=["Root"], dependencies=[Depends(require_metrics_token)])
+def scheduler_metrics():
+    return scheduler_status()
+
 @app.get("/", tags=["Root"])
 async def read_root():
     return {
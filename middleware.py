@@ -0,0 +1,43 @@
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from crud.images import IMAGE_MAX_BYTES
+
+# room for the multipart boundaries, part headers and small form fields next to the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadLimitMiddleware:
+    """Rejects oversized multipart bodies before Starlette spools them to disk."""
+
+    def __init__(self, app, max_body: int = IMAGE_MAX_BYTES + MULTIPART_OVERHEAD):
+        self.app = app
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        detail = f"Upload exceeds {IMAGE_MAX_BYTES // (1024 * 1024)} MB limit"
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body:
+            response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                # chunked or lying clients: stop reading as soon as the limit is crossed
+                if received > self.max_body:
+                    raise HTTPException(413, detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,5 +1,6 @@
 import enum
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Text, DateTime, func, Enum
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Text, DateTime, Date, func, Enum, Index, \
+    JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -47,7 +48,7 @@ class Owner(Base):
     first_name = Column(String(50), nullable=False)
     last_name = Column(String(50), nullable=False)
     email = Column(String(255), unique=True, nullable=False)
-    phone = Column(String(20), nullable=False)
+    phone = Column(String(20), unique=True, nullable=False)
     stripe_account_id = Column(String(255), nullable=True)
     password = Column(String(255), nullable=False)
     hotels = relationship("Hotel", back_populates="owner")
@@ -93,6 +94,7 @@ class Hotel(Base):
     amenities = relationship("AmenityHotel", back_populates="hotel", cascade="all, delete-orphan")
     ratings = relationship("Rating", back_populates="hotel", cascade="all, delete-orphan")
     favorite_hotels = relationship("FavoriteHotel", back_populates="hotel", cascade="all, delete-orphan")
+    stats = relationship("HotelStats", back_populates="hotel", uselist=False, cascade="all, delete-orphan")
 
 
 class Amenity(Base):
@@ -124,14 +126,16 @@ class HotelImg(Base):
     __tablename__ = 'hotel_img'
     id = Column(Integer, primary_key=True, autoincrement=True)
     hotel_id = Column(Integer, ForeignKey('hotels.id'), nullable=False)
-    image_url = Column(String(255), nullable=False)
+    image_url = Column(String(255), nullable=True)
+    variants = Column(JSON, nullable=True)
     hotel = relationship("Hotel", back_populates="images")
 
 class RoomImg(Base):
     __tablename__ = 'room_img'
     id = Column(Integer, primary_key=True, autoincrement=True)
     room_id = Column(Integer, ForeignKey('rooms.id'), nullable=False)
-    image_url = Column(String(255), nullable=False)
+    image_url = Column(String(255), nullable=True)
+    variants = Column(JSON, nullable=True)
     room = relationship("Room", back_populates="images")
 
 class Room(Base):
@@ -141,7 +145,7 @@ class Room(Base):
     room_type = Column(Enum(RoomType), nullable=False)
     places = Column(Integer, nullable=False)
     price_per_night = Column(Float, nullable=False)
-    hotel_id = Column(Integer, ForeignKey('hotels.id', ondelete='CASCADE'), nullable=False)
+    hotel_id = Column(Integer, ForeignKey('hotels.id', ondelete='CASCADE'), nullable=False, index=True)
     description = Column(Text)
     hotel = relationship("Hotel", back_populates="rooms")
     images = relationship("RoomImg", back_populates="room", cascade="all, delete-orphan")
@@ -152,14 +156,14 @@ class Booking(Base):
     __tablename__ = 'bookings'
     id = Column(Integer, primary_key=True, autoincrement=True)
     client_id = Column(Integer, ForeignKey('clients.id', ondelete='CASCADE'), nullable=False)
-    room_id = Column(Integer, ForeignKey('rooms.id', ondelete="SET NULL"), nullable=True)
+    room_id = Column(Integer, ForeignKey('rooms.id', ondelete="SET NULL"), nullable=True, index=True)
     date_start = Column(DateTime, nullable=False)
     date_end = Column(DateTime, nullable=False)
     status = Column(Enum(BookingStatus), default='pending', nullable=False)
     is_archived = Column(Boolean, default=False)
     room_number_snapshot = Column(String(10), default="deleted", nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, server_default=func.now(), index=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
     client = relationship("Client", back_populates="bookings")
     room = relationship("Room", back_populates="bookings")
     payments = relationship("Payment", back_populates="booking")
@@ -175,8 +179,8 @@ class Payment(Base):
     stripe_payment_id = Column(String(255))
     description = Column(Text)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
-    paid_at = Column(DateTime)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
+    paid_at = Column(DateTime, index=True)
     booking = relationship("Booking", back_populates="payments")
     errors = relationship("PaymentError", back_populates="payment")
 
@@ -200,6 +204,11 @@ class Rating(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     client = relationship("Client", back_populates="ratings")
     hotel = relationship("Hotel", back_populates="ratings")
+
+    __table_args__ = (
+        UniqueConstraint("hotel_id", "user_id", name="uq_ratings_hotel_user"),
+    )
+
 class FavoriteHotel(Base):
     __tablename__ = "favorite_hotels"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -220,3 +229,105 @@ class SalaryHistory(Base):
     old_salary = Column(Float, nullable=False)
     new_salary = Column(Float, nullable=False)
     changed_at = Column(DateTime, server_default=func.now())
+
+class HotelStats(Base):
+    __tablename__ = "hotel_stats"
+    hotel_id = Column(Integer, ForeignKey("hotels.id", ondelete="CASCADE"), primary_key=True)
+    rating_sum = Column(Float, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_avg = Column(Float, nullable=False, default=0, server_default="0")
+    views_total = Column(Integer, nullable=False, default=0, server_default="0")
+    min_price = Column(Float)
+    room_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    hotel = relationship("Hotel", back_populates="stats")
+
+    __table_args__ = (
+        Index("ix_hotel_stats_views_total", "views_total"),
+        Index("ix_hotel_stats_rating_avg", "rating_avg"),
+        Index("ix_hotel_stats_min_price", "min_price"),
+    )
+
+class HotelDailyStats(Base):
+    __tablename__ = "hotel_daily_stats"
+    hotel_id = Column(Integer, ForeignKey("hotels.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    bookings_total = Column(Integer, nullable=False, default=0)
+    bookings_confirmed = Column(Integer, nullable=False, default=0)
+    bookings_completed = Column(Integer, nullable=False, default=0)
+    bookings_cancelled = Column(Integer, nullable=False, default=0)
+    income_total = Column(Float, nullable=False, default=0)
+    income_card = Column(Float, nullable=False, default=0)
+    income_cash = Column(Float, nullable=False, default=0)
+    refunds = Column(Float, nullable=False, default=0)
+    paid_count = Column(Integer, nullable=False, default=0)
+    paid_card_count = Column(Integer, nullable=False, default=0)
+    paid_cash_count = Column(Integer, nullable=False, default=0)
+    max_payment = Column(Float)
+    min_payment = Column(Float)
+    refreshed_at = Column(DateTime, nullable=False)
+
+class HotelDailyClientStats(Base):
+    __tablename__ = "hotel_daily_client_stats"
+    hotel_id = Column(Integer, ForeignKey("hotels.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    client_id = Column(Integer, ForeignKey("clients.id", ondelete="CASCADE"), primary_key=True)
+    bookings = Column(Integer, nullable=False, default=0)
+    spent = Column(Float, nullable=False, default=0)
+
+class RollupDirtyDay(Base):
+    __tablename__ = "rollup_dirty_days"
+    hotel_id = Column(Integer, ForeignKey("hotels.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+class RollupState(Base):
+    __tablename__ = "rollup_state"
+    name = Column(String(50), primary_key=True)
+    horizon = Column(Date, nullable=False)
+    refreshed_at = Column(DateTime, nullable=False)
+
+class RoomNight(Base):
+    __tablename__ = "room_nights"
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True)
+    night = Column(Date, primary_key=True)
+    booking_id = Column(Integer, ForeignKey("bookings.id", ondelete="CASCADE"), nullable=False, index=True)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    client_id = Column(Integer, ForeignKey("clients.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)
+    # sha256 of the request body the key was first used with
+    request_hash = Column(String(64))
+    booking_id = Column(Integer, ForeignKey("bookings.id", ondelete="CASCADE"), nullable=True)
+    response = Column(JSON)
+    created_at = Column(DateTime, server_default=func.now())
+    booking = relationship("Booking")
+
+    __table_args__ = (
+        UniqueConstraint("client_id", "key", name="uq_idempotency_keys_client_key"),
+    )
+
+class S3DeleteOutbox(Base):
+    __tablename__ = "s3_delete_outbox"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    s3_key = Column(String(512), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_name = Column(String(100), nullable=False)
+    host = Column(String(255))
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Integer, nullable=False)
+    succeeded = Column(Boolean, nullable=False)
+    error = Column(Text)
+
+    __table_args__ = (
+        Index("ix_job_runs_job_name_started_at", "job_name", "started_at"),
+    )
@@ -1,26 +1,35 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 
+from crud.amenity_catalog import amenity_catalog, load_amenity_catalog
 from database import get_db
 from models import Amenity, AmenityRoom, AmenityHotel
 
 from schemas.amenities import AmenityBase, AmenityRoomBase, AmenityHotelBase
 
 router = APIRouter(prefix="/amenities", tags=["amenities"])
+AMENITY_CACHE_MAX_AGE = 300
+
+def _catalog_response(kind: str, request: Request, response: Response):
+    items, etag = amenity_catalog(kind)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={AMENITY_CACHE_MAX_AGE}"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return items
+
 @router.get("/hotel", response_model=List[AmenityBase])
-def get_hotel_amenities(db: Session = Depends(get_db)):
-    query = db.query(Amenity).filter(Amenity.is_hotel == True)
-    amenities = query.all()
-    return amenities
+def get_hotel_amenities(request: Request, response: Response):
+    return _catalog_response("hotel", request, response)
 @router.get("/room", response_model=List[AmenityBase])
-def get_room_amenities(db: Session = Depends(get_db)):
-    query = (
-        db.query(Amenity).filter(Amenity.is_hotel == False)
-    )
-    amenities = query.all()
-    return amenities
+def get_room_amenities(request: Request, response: Response):
+    return _catalog_response("room", request, response)
 @router.post("/", response_model=AmenityBase, status_code=201)
 def create_amenities(
     amenities_data: AmenityBase,
@@ -34,4 +43,5 @@ def create_amenities(
     db.add(new_amenity)
     db.commit()
     db.refresh(new_amenity)
+    load_amenity_catalog(db)
     return new_amenity
\ No newline at end of file
@@ -16,48 +16,27 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register/client", response_model=Token, status_code=status.HTTP_201_CREATED)
 def register_client(user: ClientCreate, db: Session = Depends(get_db)):
-    existing = db.query(person_crud.Client).filter(
-        (person_crud.Client.email == user.email) | (person_crud.Client.phone == user.phone)
-    ).first()
-    if existing:
+    try:
+        new_client = person_crud.create_client(db, user.dict())
+    except ValueError:
         raise HTTPException(status_code=400, detail="Client already exists")
+    except person_crud.PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-    new_client = person_crud.create_client(db, user.dict())
-
-    token_data = {
-        "id": new_client.id,
-        "first_name": new_client.first_name,
-        "last_name": new_client.last_name,
-        "email": new_client.email,
-        "phone": new_client.phone,
-        "is_owner": False,
-        "birth_date": new_client.birth_date
-    }
-    token = create_access_token(token_data)
+    token = create_access_token({"id": new_client.id, "is_owner": False})
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.post("/register/owner", response_model=Token, status_code=status.HTTP_201_CREATED)
 def register_owner(user: OwnerCreate, db: Session = Depends(get_db)):
-    existing = db.query(person_crud.Owner).filter(
-        (person_crud.Owner.email == user.email) | (person_crud.Owner.phone == user.phone)
-    ).first()
-    if existing:
+    try:
+        new_owner = person_crud.create_owner(db, user.dict())
+    except ValueError:
         raise HTTPException(status_code=400, detail="Owner already exists")
+    except person_crud.PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-    new_owner = person_crud.create_owner(db, user.dict())
-
-    token_data = {
-        "id": new_owner.id,
-        "first_name": new_owner.first_name,
-        "last_name": new_owner.last_name,
-        "email": new_owner.email,
-        "phone": new_owner.phone,
-        "is_owner": True,
-        "birth_date": None,
-        "owner_id": new_owner.id
-    }
-    token = create_access_token(token_data)
+    token = create_access_token({"id": new_owner.id, "is_owner": True})
     return {"access_token": token, "token_type": "bearer"}
 
 
@@ -67,7 +46,10 @@ def login(
     password: Annotated[str, Body(embed=True)],
     db: Session = Depends(get_db)
 ):
-    user = person_crud.authenticate_user(db, email, password)
+    try:
+        user = person_crud.authenticate_user(db, email, password)
+    except person_crud.PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -76,12 +58,16 @@ def login(
 
 
 @router.get("/me")
-def get_current_user_info(token: Optional[str] = Depends(oauth2_scheme)):
+def get_current_user_info(token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     if not token:
         raise HTTPException(status_code=401, detail="Authorization token missing")
 
     payload = verify_access_token(token)
-    if not payload:
+    if not payload or "is_owner" not in payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    return {"user": payload}
+    user = person_crud.get_profile(db, payload["id"], payload["is_owner"])
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return {"user": user}
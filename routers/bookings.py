@@ -1,34 +1,100 @@
-from typing import List
-from sqlalchemy import func, case
+import hashlib
+import json
+from collections import defaultdict
+from typing import List, Optional
+from sqlalchemy import func, case, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import RedirectResponse
 import stripe
 import os
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, subqueryload
 from datetime import datetime
-from database import get_db
-from models import Room, Owner, Booking, Payment, Client, PaymentError, Hotel, HotelImg, PaymentStatus, BookingStatus
-from dependencies import get_current_user, get_current_owner
+from crud.availability import reserve_nights, release_nights
+from crud.hotel_analytics import mark_rollups_dirty
+from crud.ownership import owns_hotel
+from database import get_db, get_async_db, is_unique_violation
+from models import Room, Owner, Booking, Payment, Client, PaymentError, Hotel, HotelImg, PaymentStatus, BookingStatus, \
+    IdempotencyKey
+from dependencies import get_current_user, get_current_owner, OwnerPrincipal
 from schemas.booking import BookingCheckoutRequest, RefundRequest, ManualRefundRequest, BookingHistoryItem
 
 router = APIRouter(prefix="/bookings", tags=["bookings"])
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 DOMAIN = os.getenv("STRIPE_DOMAIN", "http://localhost:5173")
 PLATFORM_FEE_PERCENT = 0.1  # 10%
+def _create_stripe_session(booking: Booking, room: Room, owner: Owner, nights: int, total_price: int):
+    return stripe.checkout.Session.create(
+        payment_method_types=["card"],
+        line_items=[{
+            "price_data": {
+                "currency": "usd",
+                "product_data": {"name": f"{room.room_type.value} room"},
+                "unit_amount": total_price,
+            },
+            "quantity": 1,
+        }],
+        mode="payment",
+        success_url=(
+            f"{DOMAIN}/bookings/redirect/booking-success?"
+            f"booking_id={booking.id}"
+            f"&total_price={room.price_per_night * nights:.2f}"
+            f"&booking_date={booking.created_at.date() if booking.created_at else datetime.utcnow().date()}"
+        ),
+
+        cancel_url=f"{DOMAIN}/booking/cancel",
+        payment_intent_data={
+            "application_fee_amount": int(total_price * PLATFORM_FEE_PERCENT),
+            "transfer_data": {"destination": owner.stripe_account_id}
+        },
+        metadata={"booking_id": str(booking.id)},
+        idempotency_key=f"checkout-booking-{booking.id}"
+    )
+
+
+def _finish_card_checkout(db: Session, booking: Booking, record: Optional[IdempotencyKey]):
+    room = booking.room
+    owner = room.hotel.owner
+    nights = (booking.date_end - booking.date_start).days
+    total_price = int(room.price_per_night * nights * 100)
+
+    try:
+        session = _create_stripe_session(booking, room, owner, nights, total_price)
+    except Exception as e:
+        payment = db.query(Payment).filter(Payment.booking_id == booking.id, Payment.is_card == True).first()
+        booking.status = BookingStatus.cancelled
+        release_nights(db, [booking.id])
+        if payment:
+            payment.status = PaymentStatus.failed
+            db.add(PaymentError(
+                payment_id=payment.id,
+                error_code="checkout_session_failed",
+                error_message=str(e)
+            ))
+        if record:
+            db.delete(record)
+        db.commit()
+        raise HTTPException(502, detail="Payment provider unavailable, please retry")
+
+    response = {"checkout_url": session.url}
+    if record:
+        record.response = response
+        db.commit()
+    return response
+
+
+def _request_hash(data: BookingCheckoutRequest) -> str:
+    return hashlib.sha256(json.dumps(data.model_dump(mode="json"), sort_keys=True).encode()).hexdigest()
+
+
 @router.post("/checkout")
 def create_checkout_session(
     data: BookingCheckoutRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
-    client = db.query(Client).filter(Client.id == user["id"]).first()
-    if not client:
-        raise HTTPException(404, detail="Client not found")
-
-    room = db.query(Room).filter(Room.id == data.room_id).first()
-    if not room:
-        raise HTTPException(404, detail="Room not found")
-
     if data.date_start >= data.date_end:
         raise HTTPException(400, detail="End date must be after start date")
 
@@ -39,19 +105,44 @@ def create_checkout_session(
     if nights < 1:
         raise HTTPException(400, detail="Booking must be at least 1 night")
 
-    overlapping_booking = db.query(Booking).filter(
-        Booking.room_id == data.room_id,
-        Booking.status.in_(["pending_payment", "awaiting_confirmation", "confirmed"]),
-        Booking.date_end > data.date_start,
-        Booking.date_start < data.date_end
-    ).first()
-
-    if overlapping_booking:
-        raise HTTPException(400, detail="Room already booked for selected dates")
-
     if data.payment_method not in ["cash", "card"]:
         raise HTTPException(400, detail="Invalid payment method")
 
+    # checked before the key is stored: a non-client id would fail the key's FK and look like a replay
+    if user.get("is_owner"):
+        raise HTTPException(403, detail="Only clients can book rooms")
+    client = db.query(Client).filter(Client.id == user["id"]).first()
+    if not client:
+        raise HTTPException(404, detail="Client not found")
+
+    record = None
+    if idempotency_key:
+        request_hash = _request_hash(data)
+        record = IdempotencyKey(client_id=user["id"], key=idempotency_key, request_hash=request_hash)
+        db.add(record)
+        try:
+            db.flush()
+        except IntegrityError as e:
+            db.rollback()
+            if not is_unique_violation(e):
+                raise
+            record = db.query(IdempotencyKey).filter(
+                IdempotencyKey.client_id == user["id"],
+                IdempotencyKey.key == idempotency_key
+            ).first()
+            # keys stored before request hashes were kept have none and are trusted as before
+            if record and record.request_hash and record.request_hash != request_hash:
+                raise HTTPException(422, detail="Idempotency-Key was already used with a different request")
+            if record and record.response is not None:
+                return record.response
+            if record and record.booking and record.booking.status == BookingStatus.pending_payment:
+                return _finish_card_checkout(db, record.booking, record)
+            raise HTTPException(409, detail="Checkout with this Idempotency-Key is already in progress")
+
+    room = db.query(Room).filter(Room.id == data.room_id).with_for_update().first()
+    if not room:
+        raise HTTPException(404, detail="Room not found")
+
     total_price = int(room.price_per_night * nights * 100)
     owner = room.hotel.owner
 
@@ -68,8 +159,12 @@ def create_checkout_session(
         status=booking_status
     )
     db.add(booking)
-    db.commit()
-    db.refresh(booking)
+    db.flush()
+    try:
+        reserve_nights(db, booking)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(400, detail=str(e))
 
     if data.payment_method == "cash":
         db.add(Payment(
@@ -79,59 +174,39 @@ def create_checkout_session(
             is_card=False,
             description="Cash payment on arrival"
         ))
+        response = {"message": "Booking created, waiting for owner confirmation"}
+        if record:
+            record.booking_id = booking.id
+            record.response = response
         db.commit()
-        return {"message": "Booking created, waiting for owner confirmation"}
-
-    else:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[{
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {"name": f"{room.room_type.value} room"},
-                    "unit_amount": total_price,
-                },
-                "quantity": 1,
-            }],
-            mode="payment",
-            success_url=(
-                f"{DOMAIN}/bookings/redirect/booking-success?"
-                f"booking_id={booking.id}"
-                f"&total_price={room.price_per_night * nights:.2f}"
-                f"&booking_date={datetime.utcnow().date()}"
-            ),
-
-            cancel_url=f"{DOMAIN}/booking/cancel",
-            payment_intent_data={
-                "application_fee_amount": int(total_price * PLATFORM_FEE_PERCENT),
-                "transfer_data": {"destination": owner.stripe_account_id}
-            },
-            metadata={"booking_id": str(booking.id)}
-        )
-
-        db.add(Payment(
-            booking_id=booking.id,
-            amount=total_price / 100,
-            status="pending",
-            is_card=True,
-            description="Stripe Checkout"
-        ))
-        db.commit()
+        return response
+
+    db.add(Payment(
+        booking_id=booking.id,
+        amount=total_price / 100,
+        status="pending",
+        is_card=True,
+        description="Stripe Checkout"
+    ))
+    if record:
+        record.booking_id = booking.id
+    db.commit()
+    db.refresh(booking)
 
-        return {"checkout_url": session.url}
+    return _finish_card_checkout(db, booking, record)
 
 
 @router.post("/{booking_id}/confirm-cash")
 def confirm_cash_booking(
     booking_id: int,
     db: Session = Depends(get_db),
-    owner: Owner = Depends(get_current_owner)
+    owner: OwnerPrincipal = Depends(get_current_owner)
 ):
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
         raise HTTPException(404, "Booking not found")
 
-    if booking.room.hotel.owner_id != owner.id:
+    if not owns_hotel(db, booking.room.hotel_id, owner.id):
         raise HTTPException(403, "You can confirm only your own hotel's bookings")
 
     if booking.status != BookingStatus.awaiting_confirmation:
@@ -154,13 +229,13 @@ def confirm_cash_booking(
 def cancel_cash_booking(
     booking_id: int,
     db: Session = Depends(get_db),
-    owner: Owner = Depends(get_current_owner)
+    owner: OwnerPrincipal = Depends(get_current_owner)
 ):
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
         raise HTTPException(404, "Booking not found")
 
-    if booking.room.hotel.owner_id != owner.id:
+    if not owns_hotel(db, booking.room.hotel_id, owner.id):
         raise HTTPException(403, "You can cancel only your own hotel's bookings")
 
     if booking.status != BookingStatus.awaiting_confirmation:
@@ -173,6 +248,7 @@ def cancel_cash_booking(
 
     booking.status = BookingStatus.cancelled
     payment.status = PaymentStatus.failed
+    release_nights(db, [booking.id])
     db.commit()
 
     return {"message": "Cash booking cancelled"}
@@ -197,6 +273,7 @@ def request_refund(
     if not payment.is_card:
         booking.status = BookingStatus.cancelled
         payment.status = PaymentStatus.failed
+        release_nights(db, [booking.id])
         db.commit()
         return {"message": "Cash booking marked as cancelled"}
 
@@ -220,6 +297,7 @@ def request_refund(
         payment.status = PaymentStatus.refunded
         payment.description = f"Auto refund: {refund_pct * 100:.0f}%"
         booking.status = BookingStatus.cancelled
+        release_nights(db, [booking.id])
         db.commit()
         return {PaymentStatus.refunded: refund_amount}
     except Exception as e:
@@ -236,13 +314,13 @@ def manual_refund(
     booking_id: int,
     request: ManualRefundRequest,
     db: Session = Depends(get_db),
-    owner: Owner = Depends(get_current_owner)
+    owner: OwnerPrincipal = Depends(get_current_owner)
 ):
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
         raise HTTPException(404, "Booking not found")
 
-    if booking.room.hotel.owner_id != owner.id:
+    if not owns_hotel(db, booking.room.hotel_id, owner.id):
         raise HTTPException(403, "You can refund only your own hotel's bookings")
 
     payment = db.query(Payment).filter(Payment.booking_id == booking_id, Payment.status == PaymentStatus.paid).first()
@@ -260,6 +338,7 @@ def manual_refund(
         payment.status = PaymentStatus.refunded
         payment.description = f"Manual refund: ${request.amount}"
         booking.status = BookingStatus.cancelled
+        release_nights(db, [booking.id])
         db.commit()
         return {PaymentStatus.refunded: request.amount}
     except Exception as e:
@@ -283,11 +362,15 @@ def redirect_to_app(booking_id: int, total_price: float, booking_date: str):
 
 
 @router.get("/my", response_model=List[BookingHistoryItem])
-def get_my_bookings(
-    db: Session = Depends(get_db),
+async def get_my_bookings(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user),
     sort_by: str = Query("created_at", regex="^(created_at|status)$"),
-    order: str = Query("desc", regex="^(asc|desc)$")
+    order: str = Query("desc", regex="^(asc|desc)$"),
+    skip: int = Query(0, ge=0),
+    # without a limit the whole history is returned, as before paging was added
+    limit: Optional[int] = Query(None, ge=1, le=100)
 ):
     if sort_by == "status":
         sort_column = case(
@@ -301,33 +384,46 @@ def get_my_bookings(
         sort_column = Booking.created_at
 
     order_func = sort_column.asc() if order == "asc" else sort_column.desc()
+    visible = (Booking.client_id == user["id"], Booking.is_archived == False)
+
+    if limit is not None:
+        response.headers["X-Total-Count"] = str(await db.scalar(
+            select(func.count(Booking.id)).join(Room, Booking.room_id == Room.id).where(*visible)
+        ))
 
     bookings = (
-        db.query(
-            Booking.id.label("booking_id"),
-            Booking.room_id,
-            Room.room_type,
-            Booking.date_start,
-            Booking.date_end,
-            Hotel.name.label("hotel_name"),
-            (Room.price_per_night * func.DATE_PART('day', Booking.date_end - Booking.date_start)).label("total_price"),
-            Booking.status,
-            Booking.created_at,
-            Hotel.id.label("hotel_id")
+        await db.execute(
+            select(
+                Booking.id.label("booking_id"),
+                Booking.room_id,
+                Room.room_type,
+                Booking.date_start,
+                Booking.date_end,
+                Hotel.name.label("hotel_name"),
+                Room.price_per_night,
+                Booking.status,
+                Booking.created_at,
+                Hotel.id.label("hotel_id")
+            )
+            .join(Room, Booking.room_id == Room.id)
+            .join(Hotel, Room.hotel_id == Hotel.id)
+            .where(*visible)
+            .order_by(order_func, Booking.id.desc())
+            .offset(skip)
+            .limit(limit)
         )
-        .join(Room, Booking.room_id == Room.id)
-        .join(Hotel, Room.hotel_id == Hotel.id)
-        .filter(
-            Booking.client_id == user["id"],
-            Booking.is_archived == False
-        )
-        .order_by(order_func)
-        .all()
-    )
+    ).all()
+
+    images_by_hotel = defaultdict(list)
+    hotel_ids = {booking.hotel_id for booking in bookings}
+    if hotel_ids:
+        images = await db.execute(select(HotelImg).where(HotelImg.hotel_id.in_(hotel_ids)))
+        for image in images.scalars():
+            images_by_hotel[image.hotel_id].append(image)
 
     result = []
     for booking in bookings:
-        hotel_images = db.query(HotelImg).filter(HotelImg.hotel_id == booking.hotel_id).all()
+        hotel_images = images_by_hotel[booking.hotel_id]
         result.append({
             "booking_id": booking.booking_id,
             "room_id": booking.room_id,
@@ -335,7 +431,8 @@ def get_my_bookings(
             "date_start": booking.date_start,
             "date_end": booking.date_end,
             "hotel_name": booking.hotel_name,
-            "total_price": booking.total_price,
+            # whole nights between the dates, counted here so the query stays portable
+            "total_price": booking.price_per_night * (booking.date_end - booking.date_start).days,
             "status": booking.status,
             "created_at": booking.created_at,
             "hotel_images": hotel_images
@@ -358,6 +455,7 @@ def delete_booking(
     if booking.status != BookingStatus.cancelled:
         raise HTTPException(400, "Only cancelled bookings can be deleted")
 
+    mark_rollups_dirty(db, [booking.id])
     db.delete(booking)
     db.commit()
     return {"message": "Booking permanently deleted"}
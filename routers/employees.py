@@ -3,6 +3,7 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
+from crud.ownership import owns_hotel
 from database import get_db
 from dependencies import get_current_owner
 from models import Employee, Hotel, SalaryHistory
@@ -13,8 +14,7 @@ MAX_EMPLOYEES_PER_HOTEL = 50
 
 @router.post("/", response_model=EmployeeBase)
 def add_employee(emp: EmployeeCreate, db: Session = Depends(get_db), owner=Depends(get_current_owner)):
-    hotel = db.query(Hotel).filter_by(id=emp.hotel_id, owner_id=owner.id).first()
-    if not hotel:
+    if not owns_hotel(db, emp.hotel_id, owner.id):
         raise HTTPException(403, "Not your hotel")
     count = db.query(Employee).filter_by(hotel_id=emp.hotel_id).count()
     if count >= MAX_EMPLOYEES_PER_HOTEL:
@@ -28,7 +28,7 @@ def add_employee(emp: EmployeeCreate, db: Session = Depends(get_db), owner=Depen
 @router.put("/{id}")
 def update_employee(id: int, update: EmployeeUpdate, db: Session = Depends(get_db), owner=Depends(get_current_owner)):
     emp = db.query(Employee).get(id)
-    if not emp or emp.hotel.owner_id != owner.id:
+    if not emp or not owns_hotel(db, emp.hotel_id, owner.id):
         raise HTTPException(403, "Forbidden")
     if update.salary and update.salary != emp.salary:
         db.add(SalaryHistory(
@@ -40,8 +40,7 @@ def update_employee(id: int, update: EmployeeUpdate, db: Session = Depends(get_d
     if update.position:
         emp.position = update.position
     if update.hotel_id and update.hotel_id != emp.hotel_id:
-        new_hotel = db.query(Hotel).filter_by(id=update.hotel_id, owner_id=owner.id).first()
-        if not new_hotel:
+        if not owns_hotel(db, update.hotel_id, owner.id):
             raise HTTPException(400, "Invalid hotel")
         emp.hotel_id = update.hotel_id
     db.commit()
@@ -51,7 +50,7 @@ def update_employee(id: int, update: EmployeeUpdate, db: Session = Depends(get_d
 @router.delete("/{id}")
 def fire_employee(id: int, db: Session = Depends(get_db), owner=Depends(get_current_owner)):
     emp = db.query(Employee).get(id)
-    if not emp or emp.hotel.owner_id != owner.id:
+    if not emp or not owns_hotel(db, emp.hotel_id, owner.id):
         raise HTTPException(403, "Not yours")
     db.delete(emp)
     db.commit()
@@ -63,14 +62,13 @@ def get_all_employees(db: Session = Depends(get_db), owner=Depends(get_current_o
 
 @router.get("/hotel/{hotel_id}", response_model=List[EmployeeBase])
 def get_by_hotel(hotel_id: int, db: Session = Depends(get_db), owner=Depends(get_current_owner)):
-    hotel = db.query(Hotel).filter_by(id=hotel_id, owner_id=owner.id).first()
-    if not hotel:
+    if not owns_hotel(db, hotel_id, owner.id):
         raise HTTPException(403)
     return db.query(Employee).filter_by(hotel_id=hotel_id).all()
 
 @router.get("/{id}/salary-history", response_model=List[SalaryHistoryBase])
 def get_salary_log(id: int, db: Session = Depends(get_db), owner=Depends(get_current_owner)):
     emp = db.query(Employee).get(id)
-    if not emp or emp.hotel.owner_id != owner.id:
+    if not emp or not owns_hotel(db, emp.hotel_id, owner.id):
         raise HTTPException(403)
     return db.query(SalaryHistory).filter_by(employee_id=id).order_by(SalaryHistory.changed_at.desc()).all()
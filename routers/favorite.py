@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List
 
-from database import get_db
-from models import FavoriteHotel, Hotel, Rating
+from database import get_db, get_async_db
+from models import FavoriteHotel, Hotel, HotelStats
 from schemas.hotel import HotelWithImagesAndAddress, HotelWithStats
 from dependencies import get_current_user
 
@@ -34,25 +35,24 @@ def remove_favorite(hotel_id: int, db: Session = Depends(get_db), user: dict = D
 
 
 @router.get("/", response_model=List[HotelWithStats])
-def get_favorites(
-    db: Session = Depends(get_db),
+async def get_favorites(
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user)
 ):
     query = (
-        db.query(
+        select(
             Hotel,
-            func.coalesce(func.avg(Rating.rating), 0).label("rating"),
-            func.coalesce(func.sum(Rating.views), 0).label("views")
+            HotelStats.rating_avg.label("rating"),
+            HotelStats.views_total.label("views")
         )
         .join(FavoriteHotel, FavoriteHotel.hotel_id == Hotel.id)
-        .outerjoin(Rating, Rating.hotel_id == Hotel.id)
-        .options(joinedload(Hotel.images), joinedload(Hotel.address))
-        .filter(FavoriteHotel.client_id == user["id"])
-        .group_by(Hotel.id)
+        .join(HotelStats, HotelStats.hotel_id == Hotel.id)
+        .options(selectinload(Hotel.images), selectinload(Hotel.amenities), joinedload(Hotel.address))
+        .where(FavoriteHotel.client_id == user["id"])
     )
 
     results = []
-    for hotel, rating, views in query.all():
+    for hotel, rating, views in (await db.execute(query)).all():
         hotel_schema = HotelWithImagesAndAddress.from_orm(hotel)
         results.append(HotelWithStats(hotel=hotel_schema, rating=rating, views=views))
 
@@ -1,37 +1,37 @@
-from datetime import datetime, timedelta
-from PIL import Image
-from io import BytesIO
-from sqlalchemy import Date
-
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, Body, Query
-from sqlalchemy import func, extract, case, cast
-from sqlalchemy.orm import Session, joinedload
+import base64
+import json
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body, Query, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, case, literal, select, exists, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional
-import os, uuid, boto3
 
-from crud.images import process_and_upload_image
-from database import get_db
+from cache import HOTEL_CACHE_TTL, LISTING_CACHE_TTL, LISTING_STALE_TTL, cache_get_async, cache_set_async, cache_get_or_load, \
+    hotel_detail_key, invalidate_hotels
+from crud.amenity_catalog import validate_amenity_ids
+from crud.availability import room_is_free
+from crud.ownership import owns_hotel, invalidate_hotel_owner
+from crud.hotel_analytics import hotel_dashboard, owner_summary
+from crud.hotel_stats import apply_rating_delta
+from crud.hotel_views import record_view, insert_missing_ratings
+from crud.images import process_and_upload_image, image_urls, process_image_in_background, validate_image_name, \
+    acquire_image_slot, release_image_slot, spool_upload, discard_upload, presign_image_upload, check_uploaded_object, \
+    process_uploaded_image_in_background, ImageQueueFull, ImageTooLarge
+from crud.s3_outbox import enqueue_s3_deletes
+from database import get_db, get_read_db, get_async_db, get_async_read_db, AsyncReadSessionLocal
 from dependencies import get_current_owner, get_current_user
-from models import Hotel, HotelImg, Address, Room, Booking, Owner, Payment, AmenityHotel, Rating, BookingStatus, \
-    FavoriteHotel, Client, Employee
+from models import Hotel, HotelImg, Address, Room, Booking, AmenityHotel, Rating, HotelStats, RoomImg
 from schemas.booking import BookingItem
+from schemas.uploads import PresignUploadRequest, PresignedUpload, CompleteUploadRequest
+from tasks import flush_hotel_views
 from schemas.hotel import HotelCreate, HotelBase, HotelImgBase, HotelWithImagesAndAddress, HotelWithStats, \
     HotelSearchParams
 
 router = APIRouter(prefix="/hotels", tags=["hotels"])
 
-S3_BUCKET = os.getenv('S3_BUCKET')
-S3_REGION = os.getenv('S3_REGION')
-AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
-AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
-MAX_WIDTH = 1920
-MAX_HEIGHT = 1080
-s3_client = boto3.client(
-    's3',
-    region_name=S3_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-)
 
 # ---------------- CREATE HOTEL ----------------
 @router.post("/", response_model=HotelBase, status_code=201)
@@ -52,9 +52,11 @@ def create_hotel(
         owner_id=current_owner.id,
         address_id=address.id
     )
+    hotel.stats = HotelStats()
     db.add(hotel)
     db.commit()
     db.refresh(hotel)
+    invalidate_hotel_owner(hotel.id)
     return hotel
 # ---------------- GET MY HOTEL ----------------
 @router.get("/my", response_model=List[HotelWithImagesAndAddress])
@@ -77,7 +79,7 @@ def get_owner_hotels(
 
 # ---------------- GET ALL HOTELS ----------------
 @router.get("/", response_model=List[HotelBase])
-def get_all_hotels(db: Session = Depends(get_db)):
+def get_all_hotels(db: Session = Depends(get_read_db)):
     return db.query(Hotel).all()
 # ---------------- UPDATE HOTEL ----------------
 @router.put("/{hotel_id}", response_model=HotelBase)
@@ -95,6 +97,11 @@ def update_hotel(
     if hotel.owner_id != current_owner.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this hotel")
 
+    try:
+        validate_amenity_ids(amenity_ids, "hotel")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     hotel.name = hotel_data.name
     hotel.description = hotel_data.description
     db.query(AmenityHotel).filter(AmenityHotel.hotel_id == hotel_id).delete()
@@ -108,6 +115,7 @@ def update_hotel(
                 setattr(address, key, value)
 
     db.commit()
+    invalidate_hotels([hotel_id])
     db.refresh(hotel)
     return hotel
 # ---------------- DELETE HOTEL ----------------
@@ -124,12 +132,8 @@ def delete_hotel(
         raise HTTPException(403, "You are not the owner of this hotel")
 
     hotel_images = db.query(HotelImg).filter(HotelImg.hotel_id == hotel_id).all()
-    for image in hotel_images:
-        s3_key = image.image_url.split(f"{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")[-1]
-        try:
-            s3_client.delete_object(Bucket=S3_BUCKET, Key=s3_key)
-        except Exception:
-            pass
+    room_images = db.query(RoomImg).join(Room, Room.id == RoomImg.room_id).filter(Room.hotel_id == hotel_id).all()
+    enqueue_s3_deletes(db, [url for image in hotel_images + room_images for url in image_urls(image)])
 
     db.query(HotelImg).filter(HotelImg.hotel_id == hotel_id).delete()
 
@@ -139,6 +143,8 @@ def delete_hotel(
 
     db.delete(hotel)
     db.commit()
+    invalidate_hotels([hotel_id])
+    invalidate_hotel_owner(hotel_id)
     return {"message": "Hotel and associated data deleted successfully"}
 
 
@@ -146,30 +152,123 @@ def delete_hotel(
 @router.post("/{hotel_id}/images", response_model=HotelImgBase)
 async def upload_image(
     hotel_id: int,
+    response: Response,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    async_mode: bool = Query(False),
     db: Session = Depends(get_db),
     current_owner = Depends(get_current_owner)
 ):
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    if not owns_hotel(db, hotel_id, current_owner.id):
         raise HTTPException(404, "Hotel not found or no access")
 
+    if async_mode:
+        try:
+            validate_image_name(file.filename)
+            acquire_image_slot()
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        except ImageQueueFull as e:
+            raise HTTPException(503, str(e))
+
+        source = None
+        try:
+            source = await spool_upload(file)
+            image_db = HotelImg(hotel_id=hotel_id, image_url=None)
+            db.add(image_db)
+            db.commit()
+            invalidate_hotels([hotel_id])
+            db.refresh(image_db)
+        except ImageTooLarge as e:
+            release_image_slot()
+            raise HTTPException(413, str(e))
+        except Exception:
+            release_image_slot()
+            discard_upload(source)
+            raise
+
+        background_tasks.add_task(
+            process_image_in_background, HotelImg, image_db.id, source, f"hotels/{hotel_id}"
+        )
+        response.status_code = 202
+        return image_db
+
     try:
-        url = process_and_upload_image(file, s3_client, S3_BUCKET, S3_REGION, f"hotels/{hotel_id}")
-        image_db = HotelImg(hotel_id=hotel_id, image_url=url)
+        url, variants = await process_and_upload_image(file, f"hotels/{hotel_id}")
+        image_db = HotelImg(hotel_id=hotel_id, image_url=url, variants=variants)
         db.add(image_db)
         db.commit()
+        invalidate_hotels([hotel_id])
         db.refresh(image_db)
         return image_db
+    except ImageTooLarge as e:
+        raise HTTPException(413, str(e))
     except ValueError as e:
         raise HTTPException(400, str(e))
+    except ImageQueueFull as e:
+        raise HTTPException(503, str(e))
     except Exception as e:
         raise HTTPException(500, f"Upload failed: {str(e)}")
 
 
+# ---------------- PRESIGN HOTEL IMAGE UPLOAD ----------------
+@router.post("/{hotel_id}/images/presign", response_model=PresignedUpload)
+def presign_hotel_image_upload(
+    hotel_id: int,
+    data: PresignUploadRequest,
+    db: Session = Depends(get_db),
+    current_owner = Depends(get_current_owner)
+):
+    if not owns_hotel(db, hotel_id, current_owner.id):
+        raise HTTPException(404, "Hotel not found or no access")
+
+    try:
+        return presign_image_upload(f"uploads/hotels/{hotel_id}", data.filename)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except NotImplementedError as e:
+        raise HTTPException(501, str(e))
+
+
+# ---------------- COMPLETE HOTEL IMAGE UPLOAD ----------------
+@router.post("/{hotel_id}/images/complete", response_model=HotelImgBase, status_code=202)
+def complete_hotel_image_upload(
+    hotel_id: int,
+    data: CompleteUploadRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_owner = Depends(get_current_owner)
+):
+    if not owns_hotel(db, hotel_id, current_owner.id):
+        raise HTTPException(404, "Hotel not found or no access")
+
+    try:
+        check_uploaded_object(data.key, f"uploads/hotels/{hotel_id}")
+        acquire_image_slot()
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except ImageQueueFull as e:
+        raise HTTPException(503, str(e))
+
+    try:
+        image_db = HotelImg(hotel_id=hotel_id, image_url=None)
+        db.add(image_db)
+        db.commit()
+        invalidate_hotels([hotel_id])
+        db.refresh(image_db)
+    except Exception:
+        release_image_slot()
+        raise
+
+    background_tasks.add_task(
+        process_uploaded_image_in_background, HotelImg, image_db.id, data.key, f"hotels/{hotel_id}"
+    )
+    return image_db
+
+
 # ---------------- GET HOTEL IMAGES ----------------
 @router.get("/{hotel_id}/images", response_model=List[HotelImgBase])
-def get_images(hotel_id: int, db: Session = Depends(get_db)):
+def get_images(hotel_id: int, db: Session = Depends(get_read_db)):
     return db.query(HotelImg).filter(HotelImg.hotel_id == hotel_id).all()
 
 # ---------------- DELETE HOTEL IMAGE ----------------
@@ -178,15 +277,14 @@ def delete_image(image_id: int, db: Session = Depends(get_db), current_owner = D
     image = db.query(HotelImg).filter(HotelImg.id == image_id).first()
     if not image:
         raise HTTPException(404, "Image not found")
-    hotel = db.query(Hotel).filter(Hotel.id == image.hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    hotel_id = image.hotel_id
+    if not owns_hotel(db, hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized")
 
-    s3_key = image.image_url.split(f"{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")[-1]
-    s3_client.delete_object(Bucket=S3_BUCKET, Key=s3_key)
-
+    enqueue_s3_deletes(db, image_urls(image))
     db.delete(image)
     db.commit()
+    invalidate_hotels([hotel_id])
     return {"message": "Image deleted"}
 
 
@@ -198,8 +296,7 @@ def get_formatted_bookings(
     db: Session = Depends(get_db),
     current_owner = Depends(get_current_owner)
 ):
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    if not owns_hotel(db, hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized")
 
     bookings = (
@@ -239,278 +336,202 @@ def get_owner_summary(
     db: Session = Depends(get_db),
     current_owner = Depends(get_current_owner)
 ):
-    hotel_ids_subquery = db.query(Hotel.id).filter(Hotel.owner_id == current_owner.id).subquery()
-
-    booking_count = (
-        db.query(func.count(Booking.id))
-        .join(Room, Room.id == Booking.room_id)
-        .filter(Room.hotel_id.in_(hotel_ids_subquery))
-        .scalar()
-    )
-
-    total_income = (
-        db.query(func.sum(Payment.amount))
-        .join(Booking, Booking.id == Payment.booking_id)
-        .join(Room, Room.id == Booking.room_id)
-        .filter(Room.hotel_id.in_(hotel_ids_subquery), Payment.status == "paid")
-        .scalar()
-    ) or 0
-
-    return {
-        "total_bookings": booking_count,
-        "total_income": round(total_income, 2)
-    }
+    return owner_summary(db, current_owner.id)
 
 @router.get("/{hotel_id}/stats/full")
 def get_advanced_hotel_stats(
     hotel_id: int,
+    since: Optional[date] = Query(None),
+    until: Optional[date] = Query(None),
     db: Session = Depends(get_db),
     current_owner = Depends(get_current_owner)
 ):
-    now = datetime.utcnow()
-    week_ago = now - timedelta(days=7)
+    if since and until and since > until:
+        raise HTTPException(400, detail="since must not be after until")
 
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id, Hotel.owner_id == current_owner.id).first()
-    if not hotel:
+    if not owns_hotel(db, hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized")
 
-    total_rooms_q = db.query(func.count(Room.id)).filter(Room.hotel_id == hotel_id)
-
-    booking_stats_q = db.query(
-        func.count(Booking.id),
-        func.count(case((Booking.status == 'confirmed', 1))),
-        func.count(case((Booking.status == 'completed', 1))),
-        func.count(case((Booking.status == 'cancelled', 1)))
-    ).join(Room).filter(Room.hotel_id == hotel_id)
-
-    price_stats_q = db.query(
-        func.sum(Payment.amount),
-        func.sum(case((Payment.is_card == True, Payment.amount))),
-        func.sum(case((Payment.is_card == False, Payment.amount))),
-        func.sum(case((Payment.status == 'refunded', Payment.amount))),
-        func.avg(Payment.amount),
-        func.max(Payment.amount),
-        func.min(Payment.amount)
-    ).join(Payment.booking).join(Booking.room).filter(
-        Room.hotel_id == hotel_id, Payment.status == 'paid'
-    )
+    return hotel_dashboard(db, hotel_id, since, until)
 
-    daily_income_q = db.query(
-        cast(Payment.paid_at, Date),
-        func.sum(Payment.amount)
-    ).join(Payment.booking).join(Booking.room).filter(
-        Room.hotel_id == hotel_id, Payment.status == 'paid'
-    ).group_by(cast(Payment.paid_at, Date)).order_by(cast(Payment.paid_at, Date))
-
-    weekly_bookings_q = db.query(
-        extract("week", Booking.created_at),
-        func.count()
-    ).join(Room).filter(Room.hotel_id == hotel_id).group_by(extract("week", Booking.created_at))
-
-    room_type_q = db.query(Room.room_type, func.count()).filter(Room.hotel_id == hotel_id).group_by(Room.room_type)
-
-    payment_dist_q = db.query(Payment.is_card, func.count()).join(Payment.booking).join(Booking.room).filter(
-        Room.hotel_id == hotel_id, Payment.status == 'paid'
-    ).group_by(Payment.is_card)
-
-    unique_clients_q = db.query(func.count(func.distinct(Booking.client_id))).join(Room).filter(Room.hotel_id == hotel_id)
-
-    top_clients_q = db.query(
-        Client.id,
-        Client.first_name,
-        Client.last_name,
-        func.sum(Payment.amount)
-    ).join(Booking, Client.id == Booking.client_id).join(Payment, Payment.booking_id == Booking.id).join(Room, Booking.room_id == Room.id).filter(
-        Room.hotel_id == hotel_id, Payment.status == 'paid'
-    ).group_by(Client.id).order_by(func.sum(Payment.amount).desc()).limit(10)
-
-    rating_views_q = db.query(
-        func.avg(Rating.rating),
-        func.sum(Rating.views)
-    ).filter(Rating.hotel_id == hotel_id)
-
-    favorites_q = db.query(func.count()).filter(FavoriteHotel.hotel_id == hotel_id)
-
-    total_rooms = total_rooms_q.scalar()
-    bookings_total, bookings_confirmed, bookings_completed, bookings_cancelled = booking_stats_q.one()
-    income_total, income_card, income_cash, refunds, avg_price, max_price, min_price = price_stats_q.one()
-    daily_income = daily_income_q.all()
-    weekly_bookings = weekly_bookings_q.all()
-    room_type_stats = room_type_q.all()
-    payment_dist = payment_dist_q.all()
-    unique_clients = unique_clients_q.scalar()
-    top_clients = top_clients_q.all()
-    rating_avg, total_views = rating_views_q.one()
-    favorites = favorites_q.scalar()
-    salary_expenses_q = db.query(func.sum(Employee.salary)).filter(Employee.hotel_id == hotel_id)
-    salary_expenses = salary_expenses_q.scalar() or 0
-
-    net_income = (income_total or 0) - salary_expenses
-    return {
-        "general": {
-            "total_rooms": total_rooms,
-            "total_bookings": bookings_total,
-            "active_bookings": bookings_confirmed,
-            "completed_bookings": bookings_completed,
-            "cancelled_bookings": bookings_cancelled,
-            "occupancy": round(bookings_confirmed / total_rooms, 2) if total_rooms else 0
-        },
-        "financials": {
-            "income_total": income_total or 0,
-            "income_card": income_card or 0,
-            "income_cash": income_cash or 0,
-            "refunds": refunds or 0,
-            "avg_booking_price": round(avg_price or 0, 2),
-            "max_booking_price": max_price or 0,
-            "min_booking_price": min_price or 0,
-            "salary_expenses": round(salary_expenses, 2),
-            "net_income": round(net_income, 2),
-            "income_minus_salaries": round(income_total or 0, 2)
-        },
-        "dynamics": {
-            "daily_income": [{"date": d.isoformat(), "total": float(t)} for d, t in daily_income],
-            "weekly_bookings": [{"week": int(w), "count": int(c)} for w, c in weekly_bookings],
-            "room_type_popularity": [{"type": rt.value, "count": c} for rt, c in room_type_stats],
-            "payment_distribution": {
-                "card": next((c for i, c in payment_dist if i), 0),
-                "cash": next((c for i, c in payment_dist if not i), 0)
-            }
-        },
-        "clients": {
-            "unique": unique_clients,
-            "top": [
-                {"id": cid, "name": f"{first} {last}", "total_spent": float(spent)}
-                for cid, first, last, spent in top_clients
-            ]
-        },
-        "engagement": {
-            "average_rating": round(rating_avg or 0, 2),
-            "total_views": total_views or 0,
-            "favorites": favorites
-        }
-    }
 
 
+def _hotel_card_options():
+    return (
+        selectinload(Hotel.images),
+        selectinload(Hotel.amenities),
+        joinedload(Hotel.address)
+    )
 
-def build_base_query(db: Session, order_field, join_room=False):
+def build_base_query(rank, sort_key, descending=False, join_room=False):
     query = (
-        db.query(
+        select(
             Hotel,
-            func.coalesce(func.avg(Rating.rating), 0).label("rating"),
-            func.coalesce(func.sum(Rating.views), 0).label("views")
+            HotelStats.rating_avg.label("rating"),
+            HotelStats.views_total.label("views"),
+            (rank if rank is not None else literal(2)).label("rank"),
+            sort_key.label("sort_key")
         )
-        .join(Rating, Rating.hotel_id == Hotel.id, isouter=True)
+        .join(HotelStats, HotelStats.hotel_id == Hotel.id)
         .join(Address, Hotel.address_id == Address.id)
     )
 
     if join_room:
-        query = query.join(Room, Room.hotel_id == Hotel.id)
+        query = query.where(HotelStats.room_count > 0)
 
-    return (
-        query.options(joinedload(Hotel.images), joinedload(Hotel.address))
-        .group_by(Hotel.id)
-        .order_by(order_field)
-    )
+    # order on the bare hotel_stats column so its index can serve the sort
+    order = [sort_key.desc() if descending else sort_key.asc(), Hotel.id]
+    if rank is not None:
+        order.insert(0, rank)
+    return query.options(*_hotel_card_options()).order_by(*order)
 
-def fetch_hotels(
-    db: Session,
-    order_field,
+def _locality_rank(city: Optional[str], country: Optional[str]):
+    tiers = []
+    if city:
+        tiers.append((func.lower(Address.city) == city.strip().lower(), 0))
+    if country:
+        tiers.append((func.lower(Address.country) == country.strip().lower(), 1))
+    if not tiers:
+        return None
+    return case(*tiers, else_=2)
+
+def _after_cursor(rank, sort_key, descending: bool, cursor: str):
+    cursor_rank, cursor_key, cursor_id = _decode_cursor(cursor)
+    past_key = sort_key < cursor_key if descending else sort_key > cursor_key
+    condition = or_(past_key, and_(sort_key == cursor_key, Hotel.id > cursor_id))
+    if rank is None:
+        return condition
+    return or_(rank > cursor_rank, and_(rank == cursor_rank, condition))
+
+def _encode_cursor(rank: int, sort_key: float, hotel_id: int) -> str:
+    raw = json.dumps([rank, sort_key, hotel_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        rank, sort_key, hotel_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(rank), float(sort_key), int(hotel_id)
+    except (ValueError, TypeError):
+        raise HTTPException(400, detail="Invalid cursor")
+
+async def fetch_hotels(
+    db: AsyncSession,
+    sort_key,
     skip: int,
     limit: int,
     city: Optional[str],
     country: Optional[str],
+    cursor: Optional[str] = None,
+    descending=False,
     join_room=False
-) -> List[HotelWithStats]:
-    query = build_base_query(db, order_field, join_room)
+) -> dict:
+    rank = _locality_rank(city, country)
+    query = build_base_query(rank, sort_key, descending, join_room)
 
-    results = []
+    if cursor:
+        query = query.where(_after_cursor(rank, sort_key, descending, cursor))
 
-    if city:
-        city_hotels = (
-            query.filter(func.lower(Address.city) == city.lower())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-        results.extend(city_hotels)
-
-    if len(results) < limit and country:
-        remaining = limit - len(results)
-        country_hotels = (
-            query.filter(
-                func.lower(Address.country) == country.lower(),
-                func.lower(Address.city) != city.lower()
-            )
-            .offset(0)
-            .limit(remaining)
-            .all()
-        )
-        results.extend(country_hotels)
-
-    if len(results) < limit:
-        remaining = limit - len(results)
-        world_hotels = (
-            query.filter(func.lower(Address.country) != country.lower())
-            .offset(0)
-            .limit(remaining)
-            .all()
-        )
-        results.extend(world_hotels)
+    results = (await db.execute(query.offset(skip).limit(limit))).all()
+
+    next_cursor = None
+    if results and len(results) == limit:
+        last = results[-1]
+        next_cursor = _encode_cursor(last.rank, last.sort_key, last.Hotel.id)
 
-    return [
-        HotelWithStats(hotel=h, rating=float(r), views=int(v))
-        for h, r, v in results
+    items = [
+        HotelWithStats(hotel=h, rating=float(r), views=int(v)).model_dump(mode="json")
+        for h, r, v, _, _ in results
     ]
+    return {"items": items, "next_cursor": next_cursor}
+
+async def cached_listing(
+    name: str,
+    sort_key,
+    skip: int,
+    limit: int,
+    city: Optional[str],
+    country: Optional[str],
+    response: Response,
+    cursor: Optional[str] = None,
+    descending=False,
+    join_room=False
+):
+    city = city.strip().lower() if city and city.strip() else None
+    country = country.strip().lower() if country and country.strip() else None
+    if cursor:
+        _decode_cursor(cursor)
+
+    async def load():
+        async with AsyncReadSessionLocal() as db:
+            return await fetch_hotels(db, sort_key, skip, limit, city, country, cursor, descending, join_room)
+
+    key = "listing:" + json.dumps([name, city, country, skip, limit, cursor])
+    page = await cache_get_or_load(key, load, LISTING_CACHE_TTL, LISTING_STALE_TTL)
+
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
 
 @router.get("/trending", response_model=List[HotelWithStats])
-def get_trending_hotels(
-    skip: int = 0,
-    limit: int = 25,
+async def get_trending_hotels(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(25, ge=1, le=100),
     city: Optional[str] = None,
     country: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None
 ):
-    return fetch_hotels(
-        db=db,
-        order_field=func.sum(Rating.views).desc(),
+    return await cached_listing(
+        name="trending",
+        sort_key=HotelStats.views_total,
         skip=skip,
         limit=limit,
         city=city,
-        country=country
+        country=country,
+        response=response,
+        cursor=cursor,
+        descending=True
     )
 
 @router.get("/popular", response_model=List[HotelWithStats])
-def get_popular_hotels(
-    skip: int = 0,
-    limit: int = 25,
+async def get_popular_hotels(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(25, ge=1, le=100),
     city: Optional[str] = None,
     country: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None
 ):
-    return fetch_hotels(
-        db=db,
-        order_field=func.avg(Rating.rating).desc(),
+    return await cached_listing(
+        name="popular",
+        sort_key=HotelStats.rating_avg,
         skip=skip,
         limit=limit,
         city=city,
-        country=country
+        country=country,
+        response=response,
+        cursor=cursor,
+        descending=True
     )
 
 @router.get("/best-deals", response_model=List[HotelWithStats])
-def get_best_deals(
-    skip: int = 0,
-    limit: int = 25,
+async def get_best_deals(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(25, ge=1, le=100),
     city: Optional[str] = None,
     country: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None
 ):
-    return fetch_hotels(
-        db=db,
-        order_field=func.min(Room.price_per_night).asc(),
+    return await cached_listing(
+        name="best-deals",
+        sort_key=HotelStats.min_price,
         skip=skip,
         limit=limit,
         city=city,
         country=country,
+        response=response,
+        cursor=cursor,
         join_room=True
     )
 
@@ -528,155 +549,144 @@ def rate_hotel(
     if not hotel:
         raise HTTPException(404, detail="Hotel not found")
 
-    rating = (
-        db.query(Rating)
-        .filter(Rating.hotel_id == hotel_id, Rating.user_id == current_user["id"])
-        .first()
-    )
-
-    if rating:
-        rating.rating = value
+    created = insert_missing_ratings(db, [
+        {"hotel_id": hotel_id, "user_id": current_user["id"], "rating": value, "views": 1}
+    ])
+    if created:
+        apply_rating_delta(db, hotel_id, rating_delta=value, count_delta=1, views_delta=1)
     else:
-        rating = Rating(hotel_id=hotel_id, user_id=current_user["id"], rating=value, views=1)
-        db.add(rating)
+        rating = (
+            db.query(Rating)
+            .filter(Rating.hotel_id == hotel_id, Rating.user_id == current_user["id"])
+            .with_for_update()
+            .one()
+        )
+        apply_rating_delta(db, hotel_id, rating_delta=value - rating.rating)
+        rating.rating = value
 
     db.commit()
+    invalidate_hotels([hotel_id])
     return {"message": "Rating submitted"}
 
-def _base_stats_query(db: Session):
+def _base_stats_query():
     return (
-        db.query(
+        select(
             Hotel,
-            func.coalesce(func.avg(Rating.rating), 0).label("rating"),
-            func.coalesce(func.sum(Rating.views), 0).label("views")
+            HotelStats.rating_avg.label("rating"),
+            HotelStats.views_total.label("views")
         )
-        .outerjoin(Rating, Rating.hotel_id == Hotel.id)
+        .join(HotelStats, HotelStats.hotel_id == Hotel.id)
         .join(Address, Hotel.address_id == Address.id)
-        .join(Room, Room.hotel_id == Hotel.id)
-        .options(joinedload(Hotel.images), joinedload(Hotel.address))
-        .group_by(Hotel.id)
+        .where(HotelStats.room_count > 0)
+        .options(*_hotel_card_options())
     )
 
 # ---------------- SEARCH HOTELS ----------------
 @router.post("/search", response_model=List[HotelWithStats])
-def search_hotels(
+async def search_hotels(
     filters: HotelSearchParams,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     def normalize(text: str) -> str:
         return text.strip().lower()
 
-    query = _base_stats_query(db)
+    query = _base_stats_query()
 
     if filters.name:
-        query = query.filter(func.lower(Hotel.name).like(f"%{normalize(filters.name)}%"))
+        query = query.where(func.lower(Hotel.name).like(f"%{normalize(filters.name)}%"))
     if filters.description:
-        query = query.filter(func.lower(Hotel.description).like(f"%{normalize(filters.description)}%"))
+        query = query.where(func.lower(Hotel.description).like(f"%{normalize(filters.description)}%"))
     if filters.city:
-        query = query.filter(func.lower(Address.city).like(f"%{normalize(filters.city)}%"))
+        query = query.where(func.lower(Address.city).like(f"%{normalize(filters.city)}%"))
     if filters.state:
-        query = query.filter(func.lower(Address.state).like(f"%{normalize(filters.state)}%"))
+        query = query.where(func.lower(Address.state).like(f"%{normalize(filters.state)}%"))
     if filters.country:
-        query = query.filter(func.lower(Address.country).like(f"%{normalize(filters.country)}%"))
+        query = query.where(func.lower(Address.country).like(f"%{normalize(filters.country)}%"))
     if filters.postal_code:
-        query = query.filter(func.lower(Address.postal_code).like(f"%{normalize(filters.postal_code)}%"))
+        query = query.where(func.lower(Address.postal_code).like(f"%{normalize(filters.postal_code)}%"))
 
+    room_filters = []
     if filters.min_price is not None:
-        query = query.filter(Room.price_per_night >= filters.min_price)
+        room_filters.append(Room.price_per_night >= filters.min_price)
     if filters.max_price is not None:
-        query = query.filter(Room.price_per_night <= filters.max_price)
+        room_filters.append(Room.price_per_night <= filters.max_price)
 
     if filters.min_rating is not None:
-        query = query.having(func.avg(Rating.rating) >= filters.min_rating)
+        query = query.where(HotelStats.rating_avg >= filters.min_rating)
 
     if filters.room_type:
-        query = query.filter(Room.room_type == filters.room_type)
+        room_filters.append(Room.room_type == filters.room_type)
 
     if filters.amenity_ids:
-        query = query.join(AmenityHotel).filter(AmenityHotel.amenity_id.in_(filters.amenity_ids))
+        try:
+            # may reload the catalog from the DB, so keep it off the event loop
+            await run_in_threadpool(validate_amenity_ids, filters.amenity_ids, "hotel")
+        except ValueError as e:
+            raise HTTPException(400, detail=str(e))
+        query = query.where(
+            exists().where(AmenityHotel.hotel_id == Hotel.id, AmenityHotel.amenity_id.in_(filters.amenity_ids))
+        )
 
     if filters.check_in and filters.check_out:
         if filters.check_in >= filters.check_out:
             raise HTTPException(400, detail="check_in must be before check_out")
 
-        subq = (
-            db.query(Booking.room_id)
-            .filter(
-                Booking.status == BookingStatus.confirmed,
-                Booking.date_end > filters.check_in,
-                Booking.date_start < filters.check_out
-            )
-            .subquery()
-        )
-        query = query.filter(~Room.id.in_(subq))
+        room_filters.append(room_is_free(filters.check_in, filters.check_out))
+
+    if room_filters:
+        query = query.where(exists().where(Room.hotel_id == Hotel.id, *room_filters))
 
     sort_map = {
-        "price": func.min(Room.price_per_night),
-        "rating": func.avg(Rating.rating),
-        "views": func.sum(Rating.views)
+        "price": HotelStats.min_price,
+        "rating": HotelStats.rating_avg,
+        "views": HotelStats.views_total
     }
-    sort_field = sort_map.get(filters.sort_by, func.avg(Rating.rating))
-    query = query.order_by(sort_field.desc() if filters.sort_dir == "desc" else sort_field.asc())
+    sort_field = sort_map.get(filters.sort_by, HotelStats.rating_avg)
+    query = query.order_by(sort_field.desc() if filters.sort_dir == "desc" else sort_field.asc(), Hotel.id)
 
-    results = query.offset(filters.skip).limit(filters.limit).all()
+    results = (await db.execute(query.offset(filters.skip).limit(filters.limit))).all()
 
     return [HotelWithStats(hotel=h, rating=float(r), views=int(v)) for h, r, v in results]
 
 # ---------------- GET HOTEL BY ID ----------------
 @router.get("/{hotel_id}", response_model=HotelWithStats)
-def get_hotel(
+async def get_hotel(
     hotel_id: int,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    # misses refill the cache for HOTEL_CACHE_TTL, so they must not read a replica that lags an invalidation
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
-    hotel = (
-        db.query(Hotel)
-        .options(
-            joinedload(Hotel.images),
-            joinedload(Hotel.amenities),
-            joinedload(Hotel.address),
-            joinedload(Hotel.owner)
-        )
-        .filter(Hotel.id == hotel_id)
-        .first()
-    )
+    cache_key = hotel_detail_key(hotel_id)
+    payload = await cache_get_async(cache_key)
+    if payload is None:
+        hotel = (
+            await db.execute(
+                select(Hotel)
+                .options(*_hotel_card_options(), joinedload(Hotel.owner))
+                .where(Hotel.id == hotel_id)
+            )
+        ).scalars().first()
 
-    if not hotel:
-        raise HTTPException(404, "Hotel not found")
+        if not hotel:
+            raise HTTPException(404, "Hotel not found")
 
-    rating = (
-        db.query(func.coalesce(func.avg(Rating.rating), 0))
-        .filter(Rating.hotel_id == hotel_id)
-        .scalar()
-    )
-    views = (
-        db.query(func.coalesce(func.sum(Rating.views), 0))
-        .filter(Rating.hotel_id == hotel_id)
-        .scalar()
-    )
+        stats = await db.get(HotelStats, hotel_id)
+        rating = stats.rating_avg if stats else 0
+        views = stats.views_total if stats else 0
 
-    hotel_with_flag = HotelWithImagesAndAddress.from_orm(hotel)
-    hotel_with_flag.is_card_available = bool(hotel.owner.stripe_account_id)
+        hotel_with_flag = HotelWithImagesAndAddress.from_orm(hotel)
+        hotel_with_flag.is_card_available = bool(hotel.owner.stripe_account_id)
+
+        payload = {
+            "hotel": hotel_with_flag.model_dump(mode="json"),
+            "rating": float(rating),
+            "views": int(views)
+        }
+        await cache_set_async(cache_key, payload, HOTEL_CACHE_TTL)
 
     if not current_user.get("is_owner"):
-        user_rating = (
-            db.query(Rating)
-            .filter(Rating.hotel_id == hotel_id, Rating.user_id == current_user["id"])
-            .first()
-        )
-        if user_rating:
-            user_rating.views += 1
-        else:
-            db.add(Rating(
-                hotel_id=hotel_id,
-                user_id=current_user["id"],
-                rating=0.0,
-                views=1
-            ))
-        db.commit()
+        if record_view(hotel_id, current_user["id"]):
+            background_tasks.add_task(flush_hotel_views)
 
-    return {
-        "hotel": hotel_with_flag,
-        "rating": float(rating),
-        "views": int(views)
-    }
+    return payload
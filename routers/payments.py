@@ -2,8 +2,9 @@ import stripe
 import os
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from cache import invalidate_hotels
 from database import get_db
-from dependencies import get_current_owner, get_current_user
+from dependencies import get_current_owner, get_current_user, OwnerPrincipal
 from models import Owner
 
 router = APIRouter(prefix="/payments", tags=["payments"])
@@ -12,11 +13,15 @@ stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 DOMAIN = os.getenv("STRIPE_DOMAIN", "http://localhost:5173")
 
 @router.post("/connect")
-def create_stripe_account_link(db: Session = Depends(get_db), owner: Owner = Depends(get_current_owner)):
+def create_stripe_account_link(db: Session = Depends(get_db), current_owner: OwnerPrincipal = Depends(get_current_owner)):
+    owner = db.query(Owner).filter(Owner.id == current_owner.id).first()
+    if not owner:
+        raise HTTPException(404, "Owner not found")
     if not owner.stripe_account_id:
         account = stripe.Account.create(type="standard", email=owner.email)
         owner.stripe_account_id = account.id
         db.commit()
+        invalidate_hotels([hotel.id for hotel in owner.hotels])
 
     account_link = stripe.AccountLink.create(
         account=owner.stripe_account_id,
@@ -1,31 +1,23 @@
 import os
-import uuid
 
-import boto3
 from botocore.exceptions import ClientError
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 
-from crud.person_crud import verify_password, get_password_hash
+from crud.images import AVATAR_VARIANTS, presign_image_upload, check_uploaded_object, acquire_image_slot, \
+    process_and_upload_image, process_uploaded_avatar_in_background, ImageQueueFull
+from crud.s3_outbox import enqueue_s3_deletes
+from crud.person_crud import verify_password, get_password_hash, PasswordHasherBusy
 from dependencies import get_current_user
 from models import Client, Owner, FavoriteHotel
 from database import get_db
 from schemas import ProfileUpdateRequest, ChangeCredentialsRequest
 from schemas.profile import PersonBase, OwnerUpdateRequest, UpdateOwnerResponse
+from schemas.uploads import PresignUploadRequest, PresignedUpload, CompleteUploadRequest
 from utils import create_access_token
 
 router = APIRouter(prefix="/profile", tags=["profile"])
-S3_BUCKET = os.getenv('S3_BUCKET')
-S3_REGION = os.getenv('S3_REGION')
-AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
-AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
-
-s3_client = boto3.client(
-    's3',
-    region_name=S3_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-)
+AVATAR_IMAGE_TYPES = {"jpg", "jpeg", "png"}
 
 
 # ---------------- CHANGE AVATAR IMAGE ----------------
@@ -39,37 +31,69 @@ async def change_avatar(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if user.avatar_url:
-        try:
-            s3_key = user.avatar_url.split(f"{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")[-1]
-            s3_client.delete_object(Bucket=S3_BUCKET, Key=s3_key)
-        except ClientError as e:
-            raise HTTPException(status_code=500, detail=f"Error deleting old avatar: {str(e)}")
-
     file_extension = file.filename.split(".")[-1].lower()
-    if file_extension not in ["jpg", "jpeg", "png"]:
+    if file_extension not in AVATAR_IMAGE_TYPES:
         raise HTTPException(status_code=400, detail="Invalid file format. Only jpg, jpeg, png are allowed.")
 
-    filename = f"{uuid.uuid4()}.{file_extension}"
-    s3_key = f"avatars/{user.id}/{filename}"
-
     try:
-        s3_client.upload_fileobj(
-            file.file,
-            S3_BUCKET,
-            s3_key,
-            ExtraArgs={'ContentType': file.content_type}
-        )
-        image_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{s3_key}"
-
-        user.avatar_url = image_url
-        db.commit()
-        db.refresh(user)
-
-        return {"image_url": image_url}
+        image_url, _ = await process_and_upload_image(file, f"avatars/{user.id}", AVATAR_VARIANTS)
+    except ImageQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
     except ClientError as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+    enqueue_s3_deletes(db, [user.avatar_url])
+    user.avatar_url = image_url
+    db.commit()
+
+    return {"image_url": image_url}
+
+
+# ---------------- PRESIGN AVATAR UPLOAD ----------------
+@router.post("/avatar/presign", response_model=PresignedUpload)
+def presign_avatar_upload(
+    data: PresignUploadRequest,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    user = db.query(Client).filter(Client.id == current_user["id"]).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    try:
+        return presign_image_upload(f"uploads/avatars/{user.id}", data.filename, AVATAR_IMAGE_TYPES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+# ---------------- COMPLETE AVATAR UPLOAD ----------------
+@router.post("/avatar/complete", response_model=dict, status_code=202)
+def complete_avatar_upload(
+    data: CompleteUploadRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    user = db.query(Client).filter(Client.id == current_user["id"]).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    try:
+        check_uploaded_object(data.key, f"uploads/avatars/{user.id}")
+        acquire_image_slot()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImageQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    # avatar_url switches to the rendered image once it is decoded and validated
+    background_tasks.add_task(process_uploaded_avatar_in_background, user.id, data.key)
+    return {"image_url": user.avatar_url, "status": "processing"}
+
     # ---------------- UPDATE OWNER ----------------
 @router.put("/update/owner", response_model=UpdateOwnerResponse)
 def update_owner(
@@ -81,8 +105,11 @@ def update_owner(
     if not owner:
         raise HTTPException(status_code=404, detail="Owner not found")
 
-    if not verify_password(owner_data.current_password, owner.password):
-        raise HTTPException(status_code=400, detail="Incorrect current password")
+    try:
+        if not verify_password(owner_data.current_password, owner.password):
+            raise HTTPException(status_code=400, detail="Incorrect current password")
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if owner_data.first_name:
         owner.first_name = owner_data.first_name
@@ -93,21 +120,15 @@ def update_owner(
     if owner_data.phone:
         owner.phone = owner_data.phone
     if owner_data.new_password:
-        owner.password = get_password_hash(owner_data.new_password)
+        try:
+            owner.password = get_password_hash(owner_data.new_password)
+        except PasswordHasherBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
 
     db.commit()
     db.refresh(owner)
 
-    token_data = {
-        "id": owner.id,
-        "first_name": owner.first_name,
-        "last_name": owner.last_name,
-        "email": owner.email,
-        "phone": owner.phone,
-        "is_owner": True,
-        "owner_id": owner.id
-    }
-    new_token = create_access_token(token_data)
+    new_token = create_access_token({"id": owner.id, "is_owner": True})
 
     return {"owner": owner, "new_token": new_token}
     # ---------------- UPDATE CLIENT ----------------
@@ -121,8 +142,11 @@ def update_credentials(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not verify_password(credentials.current_password, user.password):
-        raise HTTPException(status_code=400, detail="Incorrect current password")
+    try:
+        if not verify_password(credentials.current_password, user.password):
+            raise HTTPException(status_code=400, detail="Incorrect current password")
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if credentials.first_name:
         user.first_name = credentials.first_name
@@ -139,7 +163,10 @@ def update_credentials(
     if credentials.new_password:
         if credentials.new_password != credentials.confirm_password:
             raise HTTPException(status_code=400, detail="Passwords do not match")
-        user.password = get_password_hash(credentials.new_password)
+        try:
+            user.password = get_password_hash(credentials.new_password)
+        except PasswordHasherBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
 
     db.commit()
     db.refresh(user)
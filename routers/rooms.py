@@ -1,25 +1,26 @@
-import os
-
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
-from typing import List, Optional
-import uuid, boto3
-
-from crud.images import process_and_upload_image
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Response, BackgroundTasks
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import List
+
+from cache import invalidate_hotels
+from crud.hotel_analytics import mark_rollups_dirty
+from crud.hotel_stats import refresh_room_stats
+from crud.images import process_and_upload_image, image_urls, process_image_in_background, validate_image_name, \
+    acquire_image_slot, release_image_slot, spool_upload, discard_upload, presign_image_upload, check_uploaded_object, \
+    process_uploaded_image_in_background, ImageQueueFull, ImageTooLarge
+from crud.ownership import owns_hotel
+from crud.s3_outbox import enqueue_s3_deletes
+from database import get_db, get_read_db, get_async_read_db
 from dependencies import get_current_owner
-from models import Room, Hotel, RoomImg, AmenityRoom, Booking
-from schemas import RoomBase, RoomCreate, RoomDetails, RoomImgBase
+from models import Room, RoomImg, AmenityRoom, Booking
+from schemas import RoomDetails, RoomImgBase
 from schemas.amenities import AmenityRoomBase
 from schemas.room import RoomCreateRequest, BookedDate
+from schemas.uploads import PresignUploadRequest, PresignedUpload, CompleteUploadRequest
 
 router = APIRouter(prefix="/rooms", tags=["rooms"])
-S3_BUCKET = os.getenv('S3_BUCKET')
-S3_REGION = os.getenv('S3_REGION')
-AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
-AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
-s3_client = boto3.client("s3")
 ALLOWED_IMAGE_TYPES = ["jpg", "jpeg", "png", "webp"]
 
 # ---------------- CREATE ROOM ----------------
@@ -36,13 +37,14 @@ def create_room(
     if existing_room:
         raise HTTPException(status_code=400, detail="Room number already exists in this hotel")
 
-    hotel = db.query(Hotel).filter(Hotel.id == room_data.hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    if not owns_hotel(db, room_data.hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized to add room to this hotel")
 
     db_room = Room(**room_data.dict(exclude={"amenity_ids"}))
     db.add(db_room)
+    refresh_room_stats(db, db_room.hotel_id)
     db.commit()
+    invalidate_hotels([db_room.hotel_id])
     db.refresh(db_room)
 
     if room_data.amenity_ids:
@@ -54,18 +56,18 @@ def create_room(
     return db_room
 # ---------------- GET ALL ROOMS ----------------
 @router.get("/", response_model=List[RoomDetails])
-def get_rooms(
+async def get_rooms(
     hotel_id: int = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    query = db.query(Room)
+    query = select(Room).options(selectinload(Room.images), selectinload(Room.amenities))
     if hotel_id:
-        query = query.filter(Room.hotel_id == hotel_id)
-    return query.all()
+        query = query.where(Room.hotel_id == hotel_id)
+    return (await db.execute(query)).scalars().all()
 
 # ---------------- GET ROOM BY ID ----------------
 @router.get("/{room_id}", response_model=RoomDetails)
-def get_room(room_id: int, db: Session = Depends(get_db)):
+def get_room(room_id: int, db: Session = Depends(get_read_db)):
     room = db.query(Room).filter(Room.id == room_id).first()
     if not room:
         raise HTTPException(404, "Room not found")
@@ -82,8 +84,7 @@ def delete_room(
     if not room:
         raise HTTPException(404, "Room not found")
 
-    hotel = db.query(Hotel).filter(Hotel.id == room.hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    if not owns_hotel(db, room.hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized")
 
     bookings = db.query(Booking).filter(Booking.room_id == room.id).all()
@@ -91,17 +92,17 @@ def delete_room(
         booking.room_number_snapshot = room.room_number
 
     room_images = db.query(RoomImg).filter(RoomImg.room_id == room_id).all()
-    for image in room_images:
-        s3_key = image.image_url.split(f"{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")[-1]
-        try:
-            s3_client.delete_object(Bucket=S3_BUCKET, Key=s3_key)
-        except Exception:
-            pass
+    enqueue_s3_deletes(db, [url for image in room_images for url in image_urls(image)])
 
     db.query(RoomImg).filter(RoomImg.room_id == room_id).delete()
     db.query(AmenityRoom).filter(AmenityRoom.room_id == room_id).delete()
+    hotel_id = room.hotel_id
+    # the bookings stay but no longer count towards this hotel's rollups
+    mark_rollups_dirty(db, [booking.id for booking in bookings])
     db.delete(room)
+    refresh_room_stats(db, hotel_id)
     db.commit()
+    invalidate_hotels([hotel_id])
 
     return {"message": "Room deleted successfully"}
 
@@ -117,10 +118,12 @@ def update_room(
     if not room:
         raise HTTPException(404, "Room not found")
 
-    hotel = db.query(Hotel).filter(Hotel.id == room.hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    if not owns_hotel(db, room.hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized to update this room")
+    if room_data.hotel_id != room.hotel_id and not owns_hotel(db, room_data.hotel_id, current_owner.id):
+        raise HTTPException(403, "Not authorized to move room to this hotel")
 
+    old_hotel_id = room.hotel_id
     for key, value in room_data.dict(exclude={"amenity_ids"}).items():
         setattr(room, key, value)
 
@@ -129,14 +132,21 @@ def update_room(
         for amenity_id in room_data.amenity_ids:
             db.add(AmenityRoom(room_id=room_id, amenity_id=amenity_id))
 
+    refresh_room_stats(db, room.hotel_id)
+    if old_hotel_id != room.hotel_id:
+        refresh_room_stats(db, old_hotel_id)
     db.commit()
+    invalidate_hotels([old_hotel_id, room.hotel_id])
     db.refresh(room)
     return room
 # ---------------- ADD ROOM IMAGES ----------------
 @router.post("/{room_id}/images", response_model=RoomImgBase)
 async def upload_room_image(
     room_id: int,
+    response: Response,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    async_mode: bool = Query(False),
     db: Session = Depends(get_db),
     current_owner = Depends(get_current_owner)
 ):
@@ -144,26 +154,121 @@ async def upload_room_image(
     if not room:
         raise HTTPException(404, "Room not found")
 
-    hotel = db.query(Hotel).filter(Hotel.id == room.hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    if not owns_hotel(db, room.hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized")
 
+    if async_mode:
+        try:
+            validate_image_name(file.filename)
+            acquire_image_slot()
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        except ImageQueueFull as e:
+            raise HTTPException(503, str(e))
+
+        source = None
+        try:
+            source = await spool_upload(file)
+            image = RoomImg(room_id=room_id, image_url=None)
+            db.add(image)
+            db.commit()
+            db.refresh(image)
+        except ImageTooLarge as e:
+            release_image_slot()
+            raise HTTPException(413, str(e))
+        except Exception:
+            release_image_slot()
+            discard_upload(source)
+            raise
+
+        background_tasks.add_task(
+            process_image_in_background, RoomImg, image.id, source, f"rooms/{room_id}"
+        )
+        response.status_code = 202
+        return image
+
     try:
-        url = process_and_upload_image(file, s3_client, S3_BUCKET, S3_REGION, f"rooms/{room_id}")
-        image = RoomImg(room_id=room_id, image_url=url)
+        url, variants = await process_and_upload_image(file, f"rooms/{room_id}")
+        image = RoomImg(room_id=room_id, image_url=url, variants=variants)
         db.add(image)
         db.commit()
         db.refresh(image)
         return image
+    except ImageTooLarge as e:
+        raise HTTPException(413, str(e))
     except ValueError as e:
         raise HTTPException(400, str(e))
+    except ImageQueueFull as e:
+        raise HTTPException(503, str(e))
     except Exception as e:
         raise HTTPException(500, f"Upload failed: {str(e)}")
 
 
+# ---------------- PRESIGN ROOM IMAGE UPLOAD ----------------
+@router.post("/{room_id}/images/presign", response_model=PresignedUpload)
+def presign_room_image_upload(
+    room_id: int,
+    data: PresignUploadRequest,
+    db: Session = Depends(get_db),
+    current_owner = Depends(get_current_owner)
+):
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room:
+        raise HTTPException(404, "Room not found")
+
+    if not owns_hotel(db, room.hotel_id, current_owner.id):
+        raise HTTPException(403, "Not authorized")
+
+    try:
+        return presign_image_upload(f"uploads/rooms/{room_id}", data.filename)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except NotImplementedError as e:
+        raise HTTPException(501, str(e))
+
+
+# ---------------- COMPLETE ROOM IMAGE UPLOAD ----------------
+@router.post("/{room_id}/images/complete", response_model=RoomImgBase, status_code=202)
+def complete_room_image_upload(
+    room_id: int,
+    data: CompleteUploadRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_owner = Depends(get_current_owner)
+):
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room:
+        raise HTTPException(404, "Room not found")
+
+    if not owns_hotel(db, room.hotel_id, current_owner.id):
+        raise HTTPException(403, "Not authorized")
+
+    try:
+        check_uploaded_object(data.key, f"uploads/rooms/{room_id}")
+        acquire_image_slot()
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except ImageQueueFull as e:
+        raise HTTPException(503, str(e))
+
+    try:
+        image = RoomImg(room_id=room_id, image_url=None)
+        db.add(image)
+        db.commit()
+        db.refresh(image)
+    except Exception:
+        release_image_slot()
+        raise
+
+    background_tasks.add_task(
+        process_uploaded_image_in_background, RoomImg, image.id, data.key, f"rooms/{room_id}"
+    )
+    return image
+
+
 # ---------------- GET ROOM IMAGES ----------------
 @router.get("/{room_id}/images", response_model=List[RoomImgBase])
-def get_room_images(room_id: int, db: Session = Depends(get_db)):
+def get_room_images(room_id: int, db: Session = Depends(get_read_db)):
     return db.query(RoomImg).filter(RoomImg.room_id == room_id).all()
 
 
@@ -174,14 +279,11 @@ def delete_room_image(image_id: int, db: Session = Depends(get_db), current_owne
     if not image:
         raise HTTPException(404, "Image not found")
 
-    room = db.query(Room).filter(Room.id == image.room_id).first()
-    hotel = db.query(Hotel).filter(Hotel.id == room.hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    hotel_id = db.query(Room.hotel_id).filter(Room.id == image.room_id).scalar()
+    if not owns_hotel(db, hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized")
 
-    s3_key = image.image_url.split(f"{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")[-1]
-    s3_client.delete_object(Bucket=S3_BUCKET, Key=s3_key)
-
+    enqueue_s3_deletes(db, image_urls(image))
     db.delete(image)
     db.commit()
     return {"message": "Image deleted"}
@@ -198,8 +300,7 @@ def add_room_amenities(
     if not room:
         raise HTTPException(404, "Room not found")
 
-    hotel = db.query(Hotel).filter(Hotel.id == room.hotel_id).first()
-    if not hotel or hotel.owner_id != current_owner.id:
+    if not owns_hotel(db, room.hotel_id, current_owner.id):
         raise HTTPException(403, "Not authorized")
 
     db.query(AmenityRoom).filter(AmenityRoom.room_id == room_id).delete()
@@ -212,7 +313,7 @@ def add_room_amenities(
 
 # ---------------- GET AMENITIES  ----------------
 @router.get("/{room_id}/amenities", response_model=List[AmenityRoomBase])
-def get_room_amenities(room_id: int, db: Session = Depends(get_db)):
+def get_room_amenities(room_id: int, db: Session = Depends(get_read_db)):
     room = db.query(Room).filter(Room.id == room_id).first()
     if not room:
         raise HTTPException(404, "Room not found")
@@ -220,16 +321,17 @@ def get_room_amenities(room_id: int, db: Session = Depends(get_db)):
     return db.query(AmenityRoom).filter(AmenityRoom.room_id == room_id).all()
 
 @router.get("/{room_id}/booked-dates", response_model=List[BookedDate])
-def get_booked_dates(room_id: int, db: Session = Depends(get_db)):
+async def get_booked_dates(room_id: int, db: AsyncSession = Depends(get_async_read_db)):
     bookings = (
-        db.query(Booking)
-        .filter(
-            Booking.room_id == room_id,
-            or_(
-                Booking.status == "confirmed",
-                Booking.status == "awaiting_confirmation"
+        await db.execute(
+            select(Booking.date_start, Booking.date_end)
+            .where(
+                Booking.room_id == room_id,
+                or_(
+                    Booking.status == "confirmed",
+                    Booking.status == "awaiting_confirmation"
+                )
             )
         )
-        .all()
-    )
+    ).all()
     return [{"start_date": booking.date_start.date(), "end_date": booking.date_end.date()} for booking in bookings]
\ No newline at end of file
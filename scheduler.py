@@ -0,0 +1,215 @@
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import text
+
+import tasks
+from database import SessionLocal, engine
+from models import JobRun
+
+RUN_SCHEDULER = os.getenv("RUN_SCHEDULER", "true").lower() in ("1", "true", "yes")
+SCHEDULER_LOCK_ID = int(os.getenv("SCHEDULER_LOCK_ID", "7243110"))
+SCHEDULER_LEADER_POLL_SECONDS = int(os.getenv("SCHEDULER_LEADER_POLL_SECONDS", "30"))
+SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "300"))
+JOB_RUN_RETENTION_DAYS = int(os.getenv("JOB_RUN_RETENTION_DAYS", "30"))
+HOSTNAME = f"{socket.gethostname()}:{os.getpid()}"
+
+# name -> (function, interval, shared, run_on_start)
+# shared jobs run on the elected leader only; the rest work on per-process state and run in every worker
+JOBS = {
+    "auto_complete_bookings": (tasks.auto_complete_bookings, {"hours": 12}, True, True),
+    "refresh_hotel_rollups": (
+        tasks.refresh_hotel_rollups, {"minutes": int(os.getenv("ROLLUP_INTERVAL_MINUTES", "60"))}, True, True
+    ),
+    "cancel_stale_card_bookings": (tasks.cancel_stale_card_bookings, {"minutes": 10}, True, True),
+    "drain_s3_outbox": (
+        tasks.drain_s3_outbox, {"seconds": int(os.getenv("S3_OUTBOX_INTERVAL_SECONDS", "60"))}, True, False
+    ),
+    "flush_hotel_views": (
+        tasks.flush_hotel_views, {"seconds": int(os.getenv("VIEW_FLUSH_INTERVAL_SECONDS", "30"))}, False, False
+    ),
+}
+
+
+class LeaderLock:
+    """Session-level Postgres advisory lock held on a dedicated connection.
+    Leadership lasts as long as that connection does, so a crashed leader is replaced on the next poll."""
+
+    def __init__(self, lock_id: int):
+        self.lock_id = lock_id
+        self.is_leader = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        with self._lock:
+            if engine.dialect.name != "postgresql":
+                # nothing to coordinate with, e.g. the sqlite test database
+                self.is_leader = True
+                return True
+
+            try:
+                if self._conn is not None:
+                    self._conn.execute(text("SELECT 1"))
+                    self._conn.commit()
+                else:
+                    conn = engine.connect()
+                    acquired = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": self.lock_id}).scalar()
+                    conn.commit()
+                    if acquired:
+                        self._conn = conn
+                        print(f"[scheduler] {HOSTNAME} is now the leader")
+                    else:
+                        conn.close()
+            except Exception as e:
+                print(f"[scheduler] Leader check failed: {e}")
+                self._drop()
+
+            self.is_leader = self._conn is not None
+            return self.is_leader
+
+    def release(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": self.lock_id})
+                    self._conn.commit()
+                    self._conn.close()
+                except Exception:
+                    self._drop()
+            self._conn = None
+            self.is_leader = False
+
+    def _drop(self):
+        # invalidating closes the DBAPI connection, which is what releases the lock server-side
+        if self._conn is not None:
+            try:
+                self._conn.invalidate()
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+
+leader = LeaderLock(SCHEDULER_LOCK_ID)
+_scheduler = None
+
+
+def _record_run(name: str, started_at: datetime, duration: float, error: str = None):
+    db = SessionLocal()
+    try:
+        db.add(JobRun(
+            job_name=name,
+            host=HOSTNAME,
+            started_at=started_at,
+            finished_at=datetime.utcnow(),
+            duration_ms=int(duration * 1000),
+            succeeded=error is None,
+            error=error
+        ))
+        db.query(JobRun).filter(
+            JobRun.job_name == name,
+            JobRun.started_at < started_at - timedelta(days=JOB_RUN_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        print(f"[scheduler] Could not record run of {name}: {e}")
+    finally:
+        db.close()
+
+
+def run_job(name: str, force: bool = False) -> bool:
+    func, _, shared, _ = JOBS[name]
+    if shared and not force and not leader.is_leader:
+        return True
+
+    started_at = datetime.utcnow()
+    started = time.monotonic()
+    error = None
+    try:
+        func()
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        print(f"[scheduler] {name} failed: {error}")
+
+    # per-worker jobs run every few seconds in every process, so only shared runs are kept as history
+    if shared or force:
+        _record_run(name, started_at, time.monotonic() - started, error)
+    return error is None
+
+
+def start_scheduler(shared_jobs: bool = RUN_SCHEDULER, worker_jobs: bool = True) -> BackgroundScheduler:
+    global _scheduler
+    scheduler = BackgroundScheduler(job_defaults={
+        "coalesce": True,
+        "max_instances": 1,
+        "misfire_grace_time": SCHEDULER_MISFIRE_GRACE_SECONDS
+    })
+
+    for name, (_, interval, shared, run_on_start) in JOBS.items():
+        if (shared and not shared_jobs) or (not shared and not worker_jobs):
+            continue
+        options = {"next_run_time": datetime.now()} if run_on_start else {}
+        scheduler.add_job(run_job, trigger="interval", args=[name], id=name, **interval, **options)
+
+    if shared_jobs:
+        leader.refresh()
+        scheduler.add_job(
+            leader.refresh, trigger="interval", seconds=SCHEDULER_LEADER_POLL_SECONDS, id="leader_election"
+        )
+
+    scheduler.start()
+    _scheduler = scheduler
+    return scheduler
+
+
+def stop_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+    leader.release()
+
+
+def scheduler_status() -> dict:
+    return {
+        "host": HOSTNAME,
+        "running": _scheduler is not None,
+        "leader": leader.is_leader,
+        "jobs": {
+            job.id: job.next_run_time.isoformat() if job.next_run_time else None
+            for job in (_scheduler.get_jobs() if _scheduler else [])
+        }
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run background jobs outside the web workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run a single job once and exit")
+    run.add_argument("job", choices=sorted(JOBS))
+    commands.add_parser("serve", help="run the shared jobs on their schedules, leader-elected")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        return 0 if run_job(args.job, force=True) else 1
+
+    start_scheduler(shared_jobs=True, worker_jobs=False)
+    try:
+        while True:
+            time.sleep(60)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        stop_scheduler()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
-from typing import Optional, List
+from typing import Annotated, Optional, List
 
-from pydantic import BaseModel
+from pydantic import AfterValidator, BaseModel
 from datetime import datetime, date
 
 from schemas import HotelImgBase
+from schemas.hotel import processed_images
 
 
 class BookingCheckoutRequest(BaseModel):
@@ -24,7 +25,7 @@ class BookingHistoryItem(BaseModel):
     hotel_name: str
     total_price: float
     status: str
-    hotel_images: List[HotelImgBase]
+    hotel_images: Annotated[List[HotelImgBase], AfterValidator(processed_images)]
     created_at: datetime
     class Config:
         from_attributes = True
@@ -1,7 +1,7 @@
 # schemas/hotel.py
 
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import AfterValidator, BaseModel, Field
+from typing import Annotated, Dict, List, Optional
 from datetime import datetime, date
 
 from models import RoomType
@@ -47,12 +47,19 @@ class HotelBase(BaseModel):
 class HotelImgBase(BaseModel):
     id: int
     hotel_id: int
-    image_url: str
+    image_url: Optional[str] = None
+    variants: Optional[Dict[str, Dict[str, str]]] = None
     class Config:
         from_attributes = True
 
+
+def processed_images(images: list) -> list:
+    # uploads finished through /images/complete have no url until the background render stores it
+    return [image for image in images if image.image_url]
+
+
 class HotelWithImagesAndAddress(HotelBase):
-    images: list[HotelImgBase] = []
+    images: Annotated[List[HotelImgBase], AfterValidator(processed_images)] = []
     address: AddressBase
     is_card_available: bool = False
     amenities: List[AmenityHotelBase] = []
@@ -69,7 +76,7 @@ class HotelWithAmenities(HotelBase):
 
 
 class HotelWithAll(HotelBase):
-    images: List[HotelImgBase] = []
+    images: Annotated[List[HotelImgBase], AfterValidator(processed_images)] = []
     amenities: List[AmenityHotelBase] = []
 from pydantic import BaseModel, Field
 from typing import Optional, List
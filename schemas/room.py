@@ -1,8 +1,9 @@
 from datetime import date
 
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import AfterValidator, BaseModel
+from typing import Annotated, Dict, Optional, List
 from models import RoomType
+from schemas.hotel import processed_images
 
 
 class RoomCreate(BaseModel):
@@ -24,7 +25,8 @@ class RoomBase(RoomCreate):
 class RoomImgBase(BaseModel):
     id: int
     room_id: int
-    image_url: str
+    image_url: Optional[str] = None
+    variants: Optional[Dict[str, Dict[str, str]]] = None
 
     class Config:
         from_attributes = True
@@ -39,7 +41,7 @@ class AmenityRoomBase(BaseModel):
     class Config:
         from_attributes = True
 class RoomDetails(RoomBase):
-    images: List[RoomImgBase] = []
+    images: Annotated[List[RoomImgBase], AfterValidator(processed_images)] = []
     amenities: List[AmenityRoomBase] = []
 class RoomCreateRequest(BaseModel):
     room_number: str
@@ -0,0 +1,18 @@
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class PresignUploadRequest(BaseModel):
+    filename: str
+
+
+class PresignedUpload(BaseModel):
+    url: str
+    fields: Dict[str, str]
+    key: str
+    expires_in: int
+
+
+class CompleteUploadRequest(BaseModel):
+    key: str
@@ -0,0 +1,138 @@
+import os
+import shutil
+import threading
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3").lower()
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_REGION = os.getenv("S3_REGION")
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "5"))
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:8000/storage").rstrip("/")
+PRESIGNED_UPLOAD_EXPIRES = int(os.getenv("PRESIGNED_UPLOAD_EXPIRES", "600"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class LocalStorageClient:
+    """Filesystem stand-in for the subset of the boto3 S3 client the app uses."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError("Invalid storage key")
+        return path
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out)
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, Config=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(filename, path)
+
+    def download_file(self, Bucket, Key, Filename):
+        shutil.copyfile(self._path(Key), Filename)
+
+    def head_object(self, Bucket, Key):
+        try:
+            return {"ContentLength": os.path.getsize(self._path(Key))}
+        except FileNotFoundError:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+
+    def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=3600):
+        raise NotImplementedError("Direct uploads require the S3 storage backend")
+
+    def delete_object(self, Bucket, Key):
+        try:
+            os.remove(self._path(Key))
+        except FileNotFoundError:
+            pass
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        deleted = []
+        for obj in Delete["Objects"]:
+            self.delete_object(Bucket=Bucket, Key=obj["Key"])
+            deleted.append({"Key": obj["Key"]})
+        return {"Deleted": deleted, "Errors": []}
+
+
+def _create_client():
+    if STORAGE_BACKEND == "local":
+        return LocalStorageClient(LOCAL_STORAGE_DIR)
+
+    config = Config(
+        region_name=S3_REGION,
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "adaptive"},
+        tcp_keepalive=True,
+        connect_timeout=5,
+        read_timeout=60
+    )
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+        config=config
+    )
+
+
+def get_s3_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def _url_prefix() -> str:
+    if STORAGE_BACKEND == "local":
+        return f"{LOCAL_STORAGE_URL}/"
+    return f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/"
+
+
+def public_url(key: str) -> str:
+    return f"{_url_prefix()}{key}"
+
+
+def key_from_url(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    return url.split(_url_prefix())[-1]
+
+
+def presigned_upload(key: str, content_type: str, max_bytes: int) -> dict:
+    return get_s3_client().generate_presigned_post(
+        Bucket=S3_BUCKET,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, max_bytes]
+        ],
+        ExpiresIn=PRESIGNED_UPLOAD_EXPIRES
+    )
+
+
+def object_size(key: str) -> Optional[int]:
+    try:
+        return get_s3_client().head_object(Bucket=S3_BUCKET, Key=key)["ContentLength"]
+    except ClientError:
+        return None
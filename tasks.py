@@ -1,53 +1,112 @@
+import os
 from datetime import datetime, timedelta
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from models import Booking, BookingStatus, PaymentStatus
+from crud.availability import release_nights
+from crud.hotel_analytics import refresh_daily_rollups
+from crud.hotel_views import flush_views
+from crud.s3_outbox import drain_outbox
+from models import Booking, BookingStatus, Payment, PaymentStatus
 from database import SessionLocal
 
-def auto_complete_bookings():
-    db: Session = SessionLocal()
-    now = datetime.utcnow()
+TASK_BATCH_SIZE = int(os.getenv("TASK_BATCH_SIZE", "500"))
 
-    completed = db.query(Booking).filter(
-        Booking.status == BookingStatus.confirmed,
-        Booking.date_end < now
-    ).all()
 
-    for booking in completed:
-        booking.status = BookingStatus.completed
+def _transition_bookings(db: Session, conditions, status: BookingStatus, failed_payments=None) -> int:
+    """Moves matching bookings to `status` in chunks of TASK_BATCH_SIZE, committing each chunk.
+    When `failed_payments` is given, their payments matching it are failed and their nights released."""
+    total = 0
+    while True:
+        batch = (
+            select(Booking.id)
+            .where(*conditions)
+            .order_by(Booking.id)
+            .limit(TASK_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        booking_ids = db.execute(
+            update(Booking)
+            .where(Booking.id.in_(batch))
+            .values(status=status)
+            .returning(Booking.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
 
-    expired_cash = db.query(Booking).filter(
-        Booking.status == BookingStatus.awaiting_confirmation,
-        Booking.date_start < now.date()
-    ).all()
+        if booking_ids and failed_payments is not None:
+            db.execute(
+                update(Payment)
+                .where(Payment.booking_id.in_(booking_ids), failed_payments)
+                .values(status=PaymentStatus.failed)
+                .execution_options(synchronize_session=False)
+            )
+            release_nights(db, booking_ids)
+        db.commit()
 
-    for booking in expired_cash:
-        booking.status = BookingStatus.cancelled
-        for p in booking.payments:
-            if not p.is_card:
-                p.status = PaymentStatus.failed
+        total += len(booking_ids)
+        # rows locked by a concurrent writer are skipped and picked up on the next run
+        if len(booking_ids) < TASK_BATCH_SIZE:
+            return total
 
-    if completed or expired_cash:
-        print(f"[tasks] Completed: {len(completed)}, Cancelled cash: {len(expired_cash)}")
 
-    db.commit()
-    db.close()
-def cancel_stale_card_bookings():
+def auto_complete_bookings():
     db: Session = SessionLocal()
     now = datetime.utcnow()
+    try:
+        completed = _transition_bookings(
+            db,
+            (Booking.status == BookingStatus.confirmed, Booking.date_end < now),
+            BookingStatus.completed
+        )
+        expired_cash = _transition_bookings(
+            db,
+            (Booking.status == BookingStatus.awaiting_confirmation, Booking.date_start < now.date()),
+            BookingStatus.cancelled,
+            failed_payments=Payment.is_card.isnot(True)
+        )
+        if completed or expired_cash:
+            print(f"[tasks] Completed: {completed}, Cancelled cash: {expired_cash}")
+    finally:
+        db.close()
 
-    expired = db.query(Booking).filter(
-        Booking.status == BookingStatus.pending_payment,
-        Booking.created_at < now - timedelta(minutes=10)
-    ).all()
+def cancel_stale_card_bookings():
+    db: Session = SessionLocal()
+    now = datetime.utcnow()
+    try:
+        expired = _transition_bookings(
+            db,
+            (Booking.status == BookingStatus.pending_payment, Booking.created_at < now - timedelta(minutes=10)),
+            BookingStatus.cancelled,
+            failed_payments=Payment.is_card.is_(True)
+        )
+        if expired:
+            print(f"[tasks] Cancelled stale card bookings: {expired}")
+    finally:
+        db.close()
 
-    for b in expired:
-        b.status = BookingStatus.cancelled
-        for p in b.payments:
-            if p.is_card:
-                p.status = PaymentStatus.failed
+def flush_hotel_views():
+    db: Session = SessionLocal()
+    try:
+        flushed = flush_views(db)
+        if flushed:
+            print(f"[tasks] Flushed hotel views: {flushed}")
+    finally:
+        db.close()
 
-    if expired:
-        print(f"[tasks] Cancelled stale card bookings: {len(expired)}")
+def refresh_hotel_rollups():
+    db: Session = SessionLocal()
+    try:
+        refreshed = refresh_daily_rollups(db)
+        if refreshed:
+            print(f"[tasks] Refreshed hotel daily rollups: {refreshed}")
+    finally:
+        db.close()
 
-    db.commit()
-    db.close()
+def drain_s3_outbox():
+    db: Session = SessionLocal()
+    try:
+        deleted = drain_outbox(db)
+        if deleted:
+            print(f"[tasks] Deleted S3 objects: {deleted}")
+    finally:
+        db.close()
@@ -1,15 +1,24 @@
+import os
+import uuid
+
 import pytest
-from httpx import AsyncClient
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy_utils import create_database, database_exists, drop_database
-from main import app
-from database import Base, get_db
 
 TEST_DB_URL = "sqlite:///./test.db"
+os.environ.setdefault("DATABASE_URL", TEST_DB_URL)
+os.environ.setdefault("RUN_SCHEDULER", "false")
+
+from main import app
+from database import Base, get_db, get_read_db, get_async_db, get_async_read_db
 
 engine = create_engine(TEST_DB_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_db():
@@ -29,8 +38,92 @@ def db_override():
         finally:
             db.close()
     app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_read_db] = override
+
+    async def async_override():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+    app.dependency_overrides[get_async_db] = async_override
+    app.dependency_overrides[get_async_read_db] = async_override
 
 @pytest.fixture()
 async def client(db_override):
-    async with AsyncClient(app=app, base_url="http://test") as c:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
         yield c
+
+@pytest.fixture()
+def db():
+    session = TestingSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture()
+def make_hotel(db):
+    from models import Address, Hotel, HotelStats, Owner
+
+    def factory(owner=None, city="Kyiv", country="Ukraine", **stats):
+        if owner is None:
+            suffix = uuid.uuid4().hex[:10]
+            owner = Owner(
+                first_name="Test", last_name="Owner", email=f"owner-{suffix}@example.com",
+                phone=f"+{suffix}", password="x"
+            )
+            db.add(owner)
+            db.flush()
+        address = Address(street="Main st", city=city, country=country, postal_code="01001")
+        db.add(address)
+        db.flush()
+        hotel = Hotel(name=f"Hotel {uuid.uuid4().hex[:6]}", address_id=address.id, owner_id=owner.id)
+        db.add(hotel)
+        db.flush()
+        db.add(HotelStats(hotel_id=hotel.id, **stats))
+        db.commit()
+        return hotel
+
+    return factory
+
+@pytest.fixture()
+def make_client(db):
+    from datetime import datetime
+
+    from models import Client
+
+    def factory():
+        suffix = uuid.uuid4().hex[:10]
+        user = Client(
+            first_name="Test", last_name="Client", email=f"client-{suffix}@example.com",
+            phone=f"+{suffix}", password="x", birth_date=datetime(2000, 1, 1)
+        )
+        db.add(user)
+        db.commit()
+        return user
+
+    return factory
+
+@pytest.fixture()
+def make_room(db, make_hotel):
+    from models import Room
+
+    def factory(hotel=None, room_type="standard", price_per_night=50.0):
+        room = Room(
+            room_number=uuid.uuid4().hex[:6], room_type=room_type, places=2, price_per_night=price_per_night,
+            hotel_id=(hotel or make_hotel()).id
+        )
+        db.add(room)
+        db.commit()
+        return room
+
+    return factory
+
+@pytest.fixture()
+def local_storage(tmp_path, monkeypatch):
+    """Stores objects under tmp_path and points background image jobs at the test database."""
+    import storage
+    from crud import images
+
+    client = storage.LocalStorageClient(str(tmp_path))
+    monkeypatch.setattr(storage, "_client", client)
+    monkeypatch.setattr(images, "SessionLocal", TestingSessionLocal)
+    return client
@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from crud import amenity_catalog
+from models import Amenity
+
+
+def test_unknown_amenity_ids_reload_the_catalog_at_most_once_per_interval(db, monkeypatch):
+    loads = []
+    load = amenity_catalog.load_amenity_catalog
+    monkeypatch.setattr(amenity_catalog, "load_amenity_catalog", lambda *a: loads.append(1) or load(*a))
+    monkeypatch.setattr(amenity_catalog, "AMENITY_MISS_RELOAD_SECONDS", 60)
+    monkeypatch.setattr(amenity_catalog, "_miss_reload_at", 0.0)
+    monkeypatch.setattr(amenity_catalog, "SessionLocal", lambda: Session(bind=db.get_bind()))
+    load(db)
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            amenity_catalog.validate_amenity_ids([10 ** 9], "hotel")
+    assert loads == []
+
+    # once the interval has passed, a miss picks up amenities created by other workers
+    amenity = Amenity(name="Rooftop pool", description="Open in summer", is_hotel=True)
+    db.add(amenity)
+    db.commit()
+    monkeypatch.setattr(amenity_catalog, "AMENITY_MISS_RELOAD_SECONDS", 0)
+    amenity_catalog.validate_amenity_ids([amenity.id], "hotel")
+    assert loads == [1]
@@ -23,3 +23,151 @@ async def test_register_and_login(client):
     r2 = await client.post("/auth/login", json=login_data)
     assert r2.status_code == 200
     assert "access_token" in r2.json()
+
+
+def _client_payload(email, phone):
+    return {
+        "first_name": "Test",
+        "last_name": "User",
+        "email": email,
+        "phone": phone,
+        "password": "password123",
+        "birth_date": "2000-01-01T00:00:00"
+    }
+
+
+async def test_login_rehashes_outdated_bcrypt_cost(client, db):
+    from passlib.hash import bcrypt
+
+    from crud.passwords import BCRYPT_ROUNDS
+    from models import Client
+
+    r = await client.post("/auth/register/client", json=_client_payload("rehash@example.com", "+380000000101"))
+    assert r.status_code == 201
+    user = db.query(Client).filter(Client.email == "rehash@example.com").one()
+    user.password = bcrypt.using(rounds=4).hash("password123")
+    db.commit()
+
+    r = await client.post("/auth/login", json={"email": "rehash@example.com", "password": "password123"})
+    assert r.status_code == 200
+    db.expire_all()
+    assert db.query(Client.password).filter(Client.id == user.id).scalar().split("$")[2] == f"{BCRYPT_ROUNDS:02d}"
+
+
+async def test_login_fails_fast_when_hasher_is_saturated(client, monkeypatch):
+    import threading
+
+    from crud import passwords
+
+    r = await client.post("/auth/register/client", json=_client_payload("busy@example.com", "+380000000102"))
+    assert r.status_code == 201
+
+    full = threading.BoundedSemaphore(1)
+    full.acquire()
+    monkeypatch.setattr(passwords, "_slots", full)
+
+    r = await client.post("/auth/login", json={"email": "busy@example.com", "password": "password123"})
+    assert r.status_code == 503
+
+
+def test_slot_is_held_until_the_hash_finishes(monkeypatch):
+    import threading
+    from concurrent.futures import Future
+
+    from crud import passwords
+
+    slots = threading.BoundedSemaphore(1)
+    pending = Future()
+
+    class Pool:
+        def submit(self, fn, *args):
+            return pending
+
+    monkeypatch.setattr(passwords, "_slots", slots)
+    monkeypatch.setattr(passwords, "_get_pool", lambda: Pool())
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_TIMEOUT", 0.01)
+
+    with pytest.raises(passwords.PasswordHasherBusy):
+        passwords.get_password_hash("secret")
+    # the caller gave up but the job is still queued, so the bound must still be enforced
+    with pytest.raises(passwords.PasswordHasherBusy):
+        passwords.get_password_hash("secret")
+
+    pending.set_result("hash")
+    assert slots.acquire(blocking=False)
+
+
+def test_raising_the_minimum_token_version_revokes_cached_tokens(monkeypatch):
+    from jose import jwt
+
+    import utils
+
+    token = utils.create_access_token({"id": 7, "is_owner": True})
+    legacy = jwt.encode({"id": 8, "is_owner": False}, utils.SECRET_KEY, algorithm=utils.ALGORITHM)
+    assert utils.verify_access_token(token)["owner_id"] == 7
+    assert utils.verify_access_token(legacy)["id"] == 8
+
+    monkeypatch.setattr(utils, "MIN_TOKEN_VERSION", 2)
+    assert utils.verify_access_token(legacy) is None
+    assert utils.verify_access_token(token)["id"] == 7
+
+    monkeypatch.setattr(utils, "MIN_TOKEN_VERSION", utils.TOKEN_VERSION + 1)
+    assert utils.verify_access_token(token) is None
+
+
+async def test_duplicate_signup_is_rejected_before_hashing(client, monkeypatch):
+    from crud import person_crud
+
+    payload = _client_payload("twice@example.com", "+380000000103")
+    assert (await client.post("/auth/register/client", json=payload)).status_code == 201
+
+    def no_hashing(password):
+        raise AssertionError("duplicate signups must not reach the hasher")
+
+    monkeypatch.setattr(person_crud, "get_password_hash", no_hashing)
+    r = await client.post("/auth/register/client", json={**payload, "email": "other@example.com"})
+    assert r.status_code == 400
+
+
+def test_only_unique_violations_are_reported_as_conflicts(db):
+    from datetime import datetime
+
+    from sqlalchemy.exc import IntegrityError
+
+    from crud.person_crud import _insert_person
+    from models import Client
+
+    def person(email, phone, birth_date=datetime(2000, 1, 1)):
+        return Client(
+            first_name="Test", last_name="User", email=email, phone=phone, password="x", birth_date=birth_date
+        )
+
+    _insert_person(db, person("race@example.com", "+380000000104"), "exists")
+    # a signup that slipped past the lookup still hits the constraint
+    with pytest.raises(ValueError):
+        _insert_person(db, person("race@example.com", "+380000000105"), "exists")
+    with pytest.raises(IntegrityError):
+        _insert_person(db, person("nodate@example.com", "+380000000106", birth_date=None), "exists")
+
+
+async def test_deleted_owner_token_is_rejected(client, db):
+    import uuid
+
+    from models import Owner
+    from utils import create_access_token
+
+    suffix = uuid.uuid4().hex[:10]
+    owner = Owner(
+        first_name="Gone", last_name="Owner", email=f"gone-{suffix}@example.com",
+        phone=f"+{suffix}", password="x"
+    )
+    db.add(owner)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'id': owner.id, 'is_owner': True})}"}
+
+    assert (await client.get("/employees/", headers=headers)).status_code == 200
+
+    db.delete(owner)
+    db.commit()
+    assert (await client.get("/employees/", headers=headers)).status_code == 404
+
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+
+from models import Booking, BookingStatus
+from utils import create_access_token
+
+
+def _auth(user):
+    return {"Authorization": f"Bearer {create_access_token({'id': user.id, 'is_owner': False})}"}
+
+
+def _checkout(room, days_ahead=10, nights=2, payment_method="cash"):
+    start = datetime.utcnow().replace(hour=14, minute=0, second=0, microsecond=0) + timedelta(days=days_ahead)
+    return {
+        "room_id": room.id,
+        "payment_method": payment_method,
+        "date_start": start.isoformat(),
+        "date_end": (start + timedelta(days=nights)).isoformat()
+    }
+
+
+async def test_checkout_replays_the_same_idempotency_key(client, db, make_room, make_client):
+    room, user = make_room(), make_client()
+    headers = {**_auth(user), "Idempotency-Key": "checkout-1"}
+
+    first = await client.post("/bookings/checkout", json=_checkout(room), headers=headers)
+    again = await client.post("/bookings/checkout", json=_checkout(room), headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert first.json() == again.json()
+    assert db.query(Booking).filter(Booking.client_id == user.id).count() == 1
+
+
+async def test_checkout_rejects_a_reused_key_with_another_payload(client, db, make_room, make_client):
+    room, user = make_room(), make_client()
+    headers = {**_auth(user), "Idempotency-Key": "checkout-2"}
+
+    assert (await client.post("/bookings/checkout", json=_checkout(room), headers=headers)).status_code == 200
+    r = await client.post("/bookings/checkout", json=_checkout(room, days_ahead=20), headers=headers)
+    assert r.status_code == 422
+    assert db.query(Booking).filter(
+        Booking.client_id == user.id, Booking.status == BookingStatus.awaiting_confirmation
+    ).count() == 1
+
+
+async def test_overlapping_checkouts_cannot_take_the_same_nights(client, db, make_room, make_client):
+    from models import Hotel, RoomNight
+
+    room = make_room()
+    first, second = make_client(), make_client()
+
+    r = await client.post("/bookings/checkout", json=_checkout(room, days_ahead=30, nights=3), headers=_auth(first))
+    assert r.status_code == 200
+    r = await client.post("/bookings/checkout", json=_checkout(room, days_ahead=32, nights=2), headers=_auth(second))
+    assert r.status_code == 400
+    # checking out on the morning someone else checks in is fine
+    r = await client.post("/bookings/checkout", json=_checkout(room, days_ahead=33, nights=1), headers=_auth(second))
+    assert r.status_code == 200
+    assert db.query(RoomNight).filter(RoomNight.room_id == room.id).count() == 4
+
+    booking = db.query(Booking).filter(Booking.client_id == first.id).one()
+    owner_id = db.get(Hotel, room.hotel_id).owner_id
+    owner = {"Authorization": f"Bearer {create_access_token({'id': owner_id, 'is_owner': True})}"}
+    assert (await client.post(f"/bookings/{booking.id}/cancel-cash", headers=owner)).status_code == 200
+
+    # cancelling releases the nights for the next guest
+    r = await client.post("/bookings/checkout", json=_checkout(room, days_ahead=32, nights=1), headers=_auth(second))
+    assert r.status_code == 200
+
+
+def test_stale_card_bookings_are_cancelled_in_chunks(db, make_room, make_client, monkeypatch):
+    import tasks
+    from crud.availability import reserve_nights
+    from models import Payment, PaymentStatus, RoomNight
+
+    monkeypatch.setattr(tasks, "TASK_BATCH_SIZE", 2)
+    room, user = make_room(), make_client()
+    start = datetime.utcnow() + timedelta(days=40)
+
+    bookings = []
+    for i in range(5):
+        booking = Booking(
+            client_id=user.id, room_id=room.id, date_start=start + timedelta(days=i),
+            date_end=start + timedelta(days=i + 1), status=BookingStatus.pending_payment
+        )
+        db.add(booking)
+        db.flush()
+        reserve_nights(db, booking)
+        db.add(Payment(booking_id=booking.id, amount=50, status=PaymentStatus.pending, is_card=True))
+        bookings.append(booking)
+    db.commit()
+
+    commits = []
+    commit = db.commit
+    monkeypatch.setattr(db, "commit", lambda: commits.append(1) or commit())
+
+    cancelled = tasks._transition_bookings(
+        db,
+        (Booking.room_id == room.id, Booking.status == BookingStatus.pending_payment),
+        BookingStatus.cancelled,
+        failed_payments=Payment.is_card.is_(True)
+    )
+    assert cancelled == 5
+    assert len(commits) == 3
+
+    db.expire_all()
+    assert {b.status for b in bookings} == {BookingStatus.cancelled}
+    assert {p.status for b in bookings for p in b.payments} == {PaymentStatus.failed}
+    assert db.query(RoomNight).filter(RoomNight.room_id == room.id).count() == 0
+
+
+async def test_checkout_checks_the_caller_before_storing_the_key(client, db, make_room):
+    from models import Hotel, IdempotencyKey
+
+    room = make_room()
+    owner_id = db.get(Hotel, room.hotel_id).owner_id
+    owner = {"Authorization": f"Bearer {create_access_token({'id': owner_id, 'is_owner': True})}"}
+    missing = {"Authorization": f"Bearer {create_access_token({'id': 10 ** 9, 'is_owner': False})}"}
+
+    r = await client.post("/bookings/checkout", json=_checkout(room), headers={**owner, "Idempotency-Key": "k-owner"})
+    assert r.status_code == 403
+    r = await client.post("/bookings/checkout", json=_checkout(room), headers={**missing, "Idempotency-Key": "k-gone"})
+    assert r.status_code == 404
+    assert db.query(IdempotencyKey).filter(IdempotencyKey.key.in_(["k-owner", "k-gone"])).count() == 0
+
+
+def _history(db, user, room, count):
+    start = datetime(2025, 3, 1, 14)
+    for i in range(count):
+        db.add(Booking(
+            client_id=user.id, room_id=room.id, status=BookingStatus.confirmed,
+            date_start=start + timedelta(days=10 * i), date_end=start + timedelta(days=10 * i + 3),
+            created_at=start + timedelta(minutes=i)
+        ))
+    db.commit()
+
+
+async def test_my_bookings_default_to_the_full_history(client, db, make_room, make_client):
+    room, user = make_room(price_per_night=40.0), make_client()
+    _history(db, user, room, 120)
+
+    r = await client.get("/bookings/my", headers=_auth(user))
+    assert r.status_code == 200
+    assert "X-Total-Count" not in r.headers
+    assert len(r.json()) == 120
+    assert {item["total_price"] for item in r.json()} == {120.0}
+
+
+async def test_my_bookings_page_reports_the_total(client, db, make_room, make_client):
+    room, user = make_room(), make_client()
+    _history(db, user, room, 7)
+
+    full = await client.get("/bookings/my", headers=_auth(user))
+    page = await client.get("/bookings/my", params={"skip": 2, "limit": 3}, headers=_auth(user))
+    assert page.status_code == 200
+    assert page.headers["X-Total-Count"] == "7"
+    assert page.json() == full.json()[2:5]
+
+
+async def test_my_bookings_for_hotels_without_images(client, db, make_room, make_client):
+    from models import HotelImg
+
+    pictured, bare, user = make_room(), make_room(), make_client()
+    db.add(HotelImg(hotel_id=pictured.hotel_id, image_url="https://cdn.example.com/h.jpg"))
+    db.commit()
+    _history(db, user, pictured, 1)
+    _history(db, user, bare, 1)
+
+    r = await client.get("/bookings/my", headers=_auth(user))
+    assert r.status_code == 200
+    images = {item["room_id"]: [image["image_url"] for image in item["hotel_images"]] for item in r.json()}
+    assert images == {pictured.id: ["https://cdn.example.com/h.jpg"], bare.id: []}
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+import cache
+
+
+@pytest.fixture(autouse=True)
+def local_backend(monkeypatch):
+    monkeypatch.setattr(cache, "_backend", cache.LocalCache(100))
+
+
+def _loader(*values):
+    calls = []
+
+    async def load():
+        calls.append(len(calls))
+        return values[min(len(calls), len(values)) - 1]
+
+    return load, calls
+
+
+async def test_fresh_entries_are_served_from_the_cache():
+    load, calls = _loader({"page": 1})
+    hits = cache._hits["listing-hit"]
+
+    assert await cache.cache_get_or_load("listing-hit:a", load, ttl=60, stale_ttl=60) == {"page": 1}
+    assert await cache.cache_get_or_load("listing-hit:a", load, ttl=60, stale_ttl=60) == {"page": 1}
+    assert len(calls) == 1
+    assert cache._hits["listing-hit"] == hits + 1
+
+
+async def test_stale_entries_are_served_while_one_refresh_runs():
+    refreshed = asyncio.Event()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        if len(calls) > 1:
+            await refreshed.wait()
+        return "new" if len(calls) > 1 else "old"
+
+    stale = cache._stale["listing-stale"]
+    # ttl=0 makes the entry stale as soon as it is written, while stale_ttl keeps it around
+    assert await cache.cache_get_or_load("listing-stale:a", load, ttl=0, stale_ttl=60) == "old"
+    served = await asyncio.gather(*(cache.cache_get_or_load("listing-stale:a", load, ttl=0, stale_ttl=60) for _ in range(3)))
+    assert served == ["old"] * 3
+    assert cache._stale["listing-stale"] == stale + 3
+
+    refresh = cache._inflight["listing-stale:a"]
+    refreshed.set()
+    await refresh
+    assert len(calls) == 2
+    assert cache.cache_get("listing-stale:a")["value"] == "new"
+
+
+async def test_failed_refresh_keeps_the_stale_value():
+    state = {"fail": False}
+
+    async def load():
+        if state["fail"]:
+            raise RuntimeError("database unavailable")
+        return "old"
+
+    assert await cache.cache_get_or_load("listing-fail:a", load, ttl=0, stale_ttl=60) == "old"
+    state["fail"] = True
+    assert await cache.cache_get_or_load("listing-fail:a", load, ttl=0, stale_ttl=60) == "old"
+    await asyncio.gather(cache._inflight["listing-fail:a"], return_exceptions=True)
+    assert await cache.cache_get_or_load("listing-fail:a", load, ttl=0, stale_ttl=60) == "old"
+
+
+async def test_concurrent_misses_share_one_load():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "page"
+
+    pages = await asyncio.gather(*(cache.cache_get_or_load("listing-miss:a", load, ttl=60, stale_ttl=60) for _ in range(5)))
+    assert pages == ["page"] * 5
+    assert len(calls) == 1
+
+
+async def test_deleted_entries_are_loaded_again():
+    load, calls = _loader("before", "after")
+
+    assert await cache.cache_get_or_load("listing-del:a", load, ttl=60, stale_ttl=60) == "before"
+    cache.cache_delete("listing-del:a")
+    assert await cache.cache_get_or_load("listing-del:a", load, ttl=60, stale_ttl=60) == "after"
+    assert len(calls) == 2
+
+
+async def test_trending_page_is_cached_until_invalidated(client, make_hotel):
+    first = make_hotel(views_total=10 ** 6, room_count=1, min_price=10)
+
+    async def top_two():
+        r = await client.get("/hotels/trending", params={"limit": 2})
+        assert r.status_code == 200
+        return [item["hotel"]["id"] for item in r.json()]
+
+    assert (await top_two())[0] == first.id
+    second = make_hotel(views_total=10 ** 7, room_count=1, min_price=10)
+    assert (await top_two())[0] == first.id
+
+    cache.get_cache().delete(*[key for key in cache.get_cache()._data if key.startswith("listing:")])
+    assert await top_two() == [second.id, first.id]
@@ -0,0 +1,444 @@
+import pytest
+
+from cache import get_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    get_cache().delete(*list(getattr(get_cache(), "_data", {})))
+
+
+async def _collect_pages(client, path, limit, **params):
+    seen, cursor = [], None
+    while True:
+        query = {"limit": limit, **params}
+        if cursor:
+            query["cursor"] = cursor
+        r = await client.get(path, params=query)
+        assert r.status_code == 200
+        seen.extend(item["hotel"]["id"] for item in r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return seen
+
+
+@pytest.mark.parametrize("path", ["/hotels/trending", "/hotels/popular", "/hotels/best-deals"])
+async def test_listing_rejects_out_of_range_limit(client, path):
+    assert (await client.get(path, params={"limit": 0})).status_code == 422
+    assert (await client.get(path, params={"limit": 101})).status_code == 422
+
+
+async def test_trending_cursor_pages_match_single_page(client, make_hotel):
+    for views in (50, 50, 30, 10, 10, 10, 0):
+        make_hotel(views_total=views, room_count=1, min_price=100)
+
+    full = await client.get("/hotels/trending", params={"limit": 100})
+    expected = [item["hotel"]["id"] for item in full.json()]
+    views = [item["views"] for item in full.json()]
+    assert views == sorted(views, reverse=True)
+
+    assert await _collect_pages(client, "/hotels/trending", limit=3) == expected
+
+
+async def test_best_deals_cursor_with_locality_rank(client, make_hotel):
+    make_hotel(city="Lviv", min_price=300, room_count=1)
+    make_hotel(city="Lviv", min_price=100, room_count=1)
+    make_hotel(city="Odesa", min_price=50, room_count=1)
+    make_hotel(city="Odesa", min_price=40, room_count=0)
+
+    full = await client.get("/hotels/best-deals", params={"limit": 100, "city": "Lviv"})
+    expected = [item["hotel"]["id"] for item in full.json()]
+    cities = [item["hotel"]["address"]["city"] for item in full.json()]
+    lviv = cities.count("Lviv")
+    assert lviv >= 2 and set(cities[:lviv]) == {"Lviv"}
+
+    assert await _collect_pages(client, "/hotels/best-deals", limit=2, city="Lviv") == expected
+
+
+async def test_upload_limit_rejects_on_content_length_before_reading_body():
+    from httpx import ASGITransport, AsyncClient
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+
+    from middleware import UploadLimitMiddleware
+
+    reached = []
+
+    async def upload(request):
+        reached.append(True)
+        await request.form()
+        return PlainTextResponse("ok")
+
+    app = UploadLimitMiddleware(Starlette(routes=[Route("/upload", upload, methods=["POST"])]), max_body=1024)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        small = await c.post("/upload", files={"file": ("a.jpg", b"x" * 100, "image/jpeg")})
+        assert small.status_code == 200
+
+        big = await c.post("/upload", files={"file": ("a.jpg", b"x" * 4096, "image/jpeg")})
+        assert big.status_code == 413
+        assert len(reached) == 1
+
+
+
+async def test_upload_limit_caps_streamed_bodies_without_content_length():
+    from httpx import ASGITransport, AsyncClient
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+
+    from middleware import UploadLimitMiddleware
+
+    read = []
+
+    async def upload(request):
+        async for chunk in request.stream():
+            read.append(len(chunk))
+        return PlainTextResponse("ok")
+
+    def chunks(count, size=512):
+        async def body():
+            for _ in range(count):
+                yield b"x" * size
+        return body()
+
+    multipart = {"Content-Type": "multipart/form-data; boundary=b"}
+    app = UploadLimitMiddleware(Starlette(routes=[Route("/upload", upload, methods=["POST"])]), max_body=1024)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        assert (await c.post("/upload", content=chunks(2), headers=multipart)).status_code == 200
+
+        read.clear()
+        r = await c.post("/upload", content=chunks(8), headers=multipart)
+        assert r.status_code == 413
+        # reading stops at the chunk that crosses the limit
+        assert sum(read) <= 1024
+
+        # only multipart bodies are capped
+        r = await c.post("/upload", content=chunks(8), headers={"Content-Type": "application/octet-stream"})
+        assert r.status_code == 200
+
+async def test_spool_upload_shares_starlette_file_without_copying():
+    import os
+    from tempfile import SpooledTemporaryFile
+
+    from starlette.datastructures import UploadFile
+
+    from crud.images import discard_upload, spool_upload
+
+    spooled = SpooledTemporaryFile(max_size=1024)
+    spooled.write(b"y" * 4096)
+    upload = UploadFile(spooled, size=4096, filename="a.jpg")
+
+    path = await spool_upload(upload)
+    await upload.close()
+    # still readable after Starlette closes its handle
+    with open(path, "rb") as f:
+        assert f.read() == b"y" * 4096
+
+    fd = int(path.rsplit("/", 1)[1])
+    discard_upload(path)
+    with pytest.raises(OSError):
+        os.fstat(fd)
+
+
+async def test_shared_cache_backend_is_called_off_the_event_loop(monkeypatch):
+    import threading
+
+    import cache
+
+    calls = []
+
+    class Backend:
+        def get(self, key):
+            calls.append(threading.get_ident())
+            return None
+
+        def set(self, key, value, ttl):
+            calls.append(threading.get_ident())
+
+        def delete(self, *keys):
+            pass
+
+    monkeypatch.setattr(cache, "_backend", Backend())
+
+    async def load():
+        return {"ok": True}
+
+    assert await cache.cache_get_or_load("test:offloop", load, ttl=10, stale_ttl=10) == {"ok": True}
+    assert len(calls) == 2
+    assert threading.get_ident() not in calls
+
+
+def test_flushing_repeat_views_keeps_hotel_detail_cached(db, make_hotel, make_client):
+    from cache import cache_get, cache_set, hotel_detail_key
+    from crud.hotel_views import flush_views, record_view
+    from models import Rating
+
+    hotel, user = make_hotel(), make_client()
+    db.add(Rating(hotel_id=hotel.id, user_id=user.id, rating=4.0, views=1))
+    db.commit()
+
+    cache_set(hotel_detail_key(hotel.id), {"cached": True}, 60)
+    record_view(hotel.id, user.id)
+    assert flush_views(db) == 1
+    assert cache_get(hotel_detail_key(hotel.id)) == {"cached": True}
+
+    # a first view creates a rating row, which changes rating_count, so the entry must go
+    newcomer = make_client()
+    record_view(hotel.id, newcomer.id)
+    assert flush_views(db) == 1
+    assert cache_get(hotel_detail_key(hotel.id)) is None
+
+
+def test_concurrent_view_flushes_do_not_duplicate_ratings(db, make_hotel, make_client):
+    from sqlalchemy.orm import Session
+
+    from crud.hotel_views import flush_views, insert_missing_ratings, record_view
+    from models import HotelStats, Rating
+
+    hotel, user = make_hotel(), make_client()
+
+    # another worker inserted the pair after this flush drained its buffer
+    other = Session(bind=db.get_bind())
+    assert insert_missing_ratings(other, [{"hotel_id": hotel.id, "user_id": user.id, "rating": 0.0, "views": 2}])
+    other.commit()
+    other.close()
+
+    record_view(hotel.id, user.id)
+    flush_views(db)
+
+    rows = db.query(Rating).filter(Rating.hotel_id == hotel.id, Rating.user_id == user.id).all()
+    assert len(rows) == 1 and rows[0].views == 3
+    db.expire_all()
+    assert db.get(HotelStats, hotel.id).rating_count == 0
+
+
+async def test_rating_after_a_view_updates_the_same_row(client, db, make_hotel, make_client):
+    from crud.hotel_views import flush_views, record_view
+    from models import HotelStats, Rating
+    from utils import create_access_token
+
+    hotel, user = make_hotel(), make_client()
+    record_view(hotel.id, user.id)
+    flush_views(db)
+
+    token = create_access_token({"id": user.id, "is_owner": False})
+    r = await client.put(f"/hotels/{hotel.id}/rate", json=4.0, headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200
+
+    db.expire_all()
+    rows = db.query(Rating).filter(Rating.hotel_id == hotel.id, Rating.user_id == user.id).all()
+    assert [(r.rating, r.views) for r in rows] == [(4.0, 1)]
+    stats = db.get(HotelStats, hotel.id)
+    assert (stats.rating_count, stats.rating_avg) == (1, 4.0)
+
+
+async def test_rollups_pick_up_deleted_bookings(client, db, make_hotel, make_client):
+    import warnings
+    from datetime import datetime, time, timedelta
+
+    from sqlalchemy.exc import SAWarning
+
+    from crud.hotel_analytics import owner_summary, refresh_daily_rollups
+    from models import Booking, BookingStatus, HotelDailyClientStats, HotelDailyStats, Payment, PaymentStatus, Room
+    from utils import create_access_token
+
+    hotel = make_hotel()
+    room = Room(room_number="101", room_type="standard", places=1, price_per_night=50, hotel_id=hotel.id)
+    db.add(room)
+    db.commit()
+
+    day = datetime.utcnow().date() - timedelta(days=3)
+    at = datetime.combine(day, time(12))
+    regular, one_off = make_client(), make_client()
+
+    def book(user, status):
+        booking = Booking(
+            client_id=user.id, room_id=room.id, date_start=at, date_end=at + timedelta(days=1),
+            status=status, created_at=at, updated_at=at
+        )
+        db.add(booking)
+        db.flush()
+        return booking
+
+    for _ in range(2):
+        paid = book(regular, BookingStatus.completed)
+        db.add(Payment(
+            booking_id=paid.id, amount=100, status=PaymentStatus.paid, paid_at=at, created_at=at, updated_at=at
+        ))
+    cancelled = book(one_off, BookingStatus.cancelled)
+    db.commit()
+
+    def rolled():
+        db.expire_all()
+        stats = db.get(HotelDailyStats, (hotel.id, day))
+        clients = db.query(HotelDailyClientStats).filter(HotelDailyClientStats.hotel_id == hotel.id).all()
+        return stats, {(c.client_id, c.bookings, c.spent) for c in clients}
+
+    refresh_daily_rollups(db)
+    stats, clients = rolled()
+    assert (stats.bookings_total, stats.bookings_cancelled, stats.income_total) == (3, 1, 200)
+    assert clients == {(regular.id, 2, 200), (one_off.id, 1, 0)}
+
+    token = create_access_token({"id": one_off.id, "is_owner": False})
+    r = await client.delete(f"/bookings/{cancelled.id}", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200
+
+    # the remaining rows were not touched since the last refresh, only the queued day brings it back;
+    # the old rollup rows are still in this session, which must not clash with their replacements
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", SAWarning)
+        refresh_daily_rollups(db)
+    stats, clients = rolled()
+    assert (stats.bookings_total, stats.bookings_cancelled, stats.income_total) == (2, 0, 200)
+    assert clients == {(regular.id, 2, 200)}
+    assert owner_summary(db, hotel.owner_id) == {"total_bookings": 2, "total_income": 200}
+
+
+async def test_hotel_detail_misses_load_from_the_primary(client, make_hotel, make_client):
+    from database import get_async_read_db
+    from main import app
+    from utils import create_access_token
+
+    async def lagging_replica():
+        raise AssertionError("cache misses must not read the replica")
+        yield
+
+    hotel = make_hotel()
+    app.dependency_overrides[get_async_read_db] = lagging_replica
+    token = create_access_token({"id": make_client().id, "is_owner": False})
+    r = await client.get(f"/hotels/{hotel.id}", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200
+    assert r.json()["hotel"]["id"] == hotel.id
+
+
+
+async def test_hotel_detail_hides_images_still_processing(client, db, make_hotel, make_client):
+    from models import HotelImg
+    from utils import create_access_token
+
+    hotel = make_hotel()
+    done = HotelImg(hotel_id=hotel.id, image_url="https://cdn.example.com/done.jpg")
+    db.add_all([done, HotelImg(hotel_id=hotel.id, image_url=None)])
+    db.commit()
+
+    token = create_access_token({"id": make_client().id, "is_owner": False})
+    r = await client.get(f"/hotels/{hotel.id}", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200
+    assert [image["id"] for image in r.json()["hotel"]["images"]] == [done.id]
+
+
+def test_storing_a_render_for_a_deleted_image_skips_invalidation(local_storage, monkeypatch):
+    from crud import images
+    from models import HotelImg
+
+    invalidated = []
+    monkeypatch.setattr(images, "invalidate_hotels", invalidated.append)
+    images._store_image_url(HotelImg, 10 ** 9, "https://cdn.example.com/x.jpg",
+                            {"full": {"jpeg": "https://cdn.example.com/x.jpg"}})
+    assert invalidated == []
+
+def _per_metric_stats(db, hotel_id):
+    """The dashboard as the old endpoint computed it, one query per metric straight from bookings and payments."""
+    from sqlalchemy import case, extract, func
+
+    from crud.hotel_analytics import _day
+    from models import Booking, Client, Payment, Room
+
+    paid = db.query(Payment).join(Payment.booking).join(Booking.room).filter(
+        Room.hotel_id == hotel_id, Payment.status == "paid"
+    )
+    hotel_bookings = db.query(Booking).join(Room).filter(Room.hotel_id == hotel_id)
+    total, confirmed, completed, cancelled = hotel_bookings.with_entities(
+        func.count(Booking.id),
+        func.count(case((Booking.status == "confirmed", 1))),
+        func.count(case((Booking.status == "completed", 1))),
+        func.count(case((Booking.status == "cancelled", 1)))
+    ).one()
+    income, card, cash, avg_price, max_price, min_price = paid.with_entities(
+        func.sum(Payment.amount),
+        func.sum(case((Payment.is_card == True, Payment.amount))),
+        func.sum(case((Payment.is_card == False, Payment.amount))),
+        func.avg(Payment.amount),
+        func.max(Payment.amount),
+        func.min(Payment.amount)
+    ).one()
+    paid_day = _day(db, Payment.paid_at)
+    week = extract("week", Booking.created_at)
+    return {
+        "general": {"total_bookings": total, "active_bookings": confirmed,
+                    "completed_bookings": completed, "cancelled_bookings": cancelled},
+        "financials": {"income_total": income, "income_card": card, "income_cash": cash,
+                       "avg_booking_price": round(avg_price, 2), "max_booking_price": max_price,
+                       "min_booking_price": min_price},
+        "daily_income": [
+            {"date": d.isoformat(), "total": float(t)}
+            for d, t in paid.with_entities(paid_day, func.sum(Payment.amount)).group_by(paid_day).order_by(paid_day)
+        ],
+        "weekly_bookings": [
+            {"week": int(w), "count": c}
+            for w, c in hotel_bookings.with_entities(week, func.count()).group_by(week).order_by(week)
+        ],
+        "payment_distribution": {
+            "card": paid.filter(Payment.is_card == True).count(),
+            "cash": paid.filter(Payment.is_card == False).count()
+        },
+        "unique_clients": hotel_bookings.with_entities(func.count(func.distinct(Booking.client_id))).scalar(),
+        "top": [
+            {"id": cid, "name": f"{first} {last}", "total_spent": float(spent)}
+            for cid, first, last, spent in paid.join(Client, Client.id == Booking.client_id)
+            .with_entities(Client.id, Client.first_name, Client.last_name, func.sum(Payment.amount))
+            .group_by(Client.id).order_by(func.sum(Payment.amount).desc())
+        ]
+    }
+
+
+def test_dashboard_matches_per_metric_stats(db, make_hotel, make_room, make_client):
+    from datetime import datetime, timedelta
+
+    from crud.hotel_analytics import hotel_dashboard, refresh_daily_rollups
+    from models import Booking, BookingStatus, Payment, PaymentStatus
+
+    hotel = make_hotel()
+    rooms = [make_room(hotel), make_room(hotel), make_room(hotel, room_type="suite")]
+    first, second, third = make_client(), make_client(), make_client()
+    now = datetime.utcnow()
+
+    def book(user, room, status, days_ago, amount=None, is_card=True, payment_status=PaymentStatus.paid):
+        at = now - timedelta(days=days_ago)
+        booking = Booking(
+            client_id=user.id, room_id=room.id, date_start=at, date_end=at + timedelta(days=1),
+            status=status, created_at=at
+        )
+        db.add(booking)
+        db.flush()
+        if amount is not None:
+            db.add(Payment(
+                booking_id=booking.id, amount=amount, is_card=is_card, status=payment_status,
+                paid_at=at if payment_status != PaymentStatus.pending else None
+            ))
+
+    # ten and three days back end up in rollups, today's rows stay in the live tail
+    book(first, rooms[0], BookingStatus.completed, 10, 300)
+    book(first, rooms[1], BookingStatus.completed, 3, 120, is_card=False)
+    book(second, rooms[2], BookingStatus.cancelled, 3, 200, payment_status=PaymentStatus.refunded)
+    book(second, rooms[0], BookingStatus.confirmed, 0, 250)
+    book(third, rooms[1], BookingStatus.awaiting_confirmation, 0, 80, is_card=False,
+         payment_status=PaymentStatus.pending)
+    db.commit()
+    refresh_daily_rollups(db)
+
+    dashboard = hotel_dashboard(db, hotel.id)
+    expected = _per_metric_stats(db, hotel.id)
+
+    assert {k: dashboard["general"][k] for k in expected["general"]} == expected["general"]
+    assert dashboard["general"]["total_rooms"] == 3
+    assert {k: dashboard["financials"][k] for k in expected["financials"]} == expected["financials"]
+    assert dashboard["financials"]["refunds"] == 200
+    assert dashboard["dynamics"]["daily_income"] == expected["daily_income"]
+    assert dashboard["dynamics"]["weekly_bookings"] == expected["weekly_bookings"]
+    assert dashboard["dynamics"]["payment_distribution"] == expected["payment_distribution"]
+    assert sorted(dashboard["dynamics"]["room_type_popularity"], key=lambda r: r["type"]) == [
+        {"type": "standard", "count": 2}, {"type": "suite", "count": 1}
+    ]
+    assert dashboard["clients"] == {"unique": expected["unique_clients"], "top": expected["top"]}
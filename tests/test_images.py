@@ -0,0 +1,62 @@
+import os
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture()
+def photo(tmp_path):
+    path = tmp_path / "photo.png"
+    Image.new("RGB", (2400, 1200), "teal").save(path)
+    return str(path)
+
+
+def test_render_image_writes_every_variant_in_every_format(photo):
+    from crud.images import IMAGE_FORMATS, IMAGE_VARIANTS, discard_upload, render_image
+
+    rendered = render_image(photo)
+    try:
+        assert set(rendered) == {(variant, fmt) for variant, _ in IMAGE_VARIANTS for fmt in IMAGE_FORMATS}
+        for (variant, fmt), path in rendered.items():
+            bound = dict(IMAGE_VARIANTS)[variant]
+            with Image.open(path) as image:
+                assert image.format == IMAGE_FORMATS[fmt][0]
+                assert image.width <= bound[0] and image.height <= bound[1]
+                # thumbnails keep the 2:1 aspect ratio of the original
+                assert abs(image.width / image.height - 2) < 0.05
+    finally:
+        discard_upload(*rendered.values())
+    assert not any(os.path.exists(path) for path in rendered.values())
+
+
+def test_render_image_refuses_oversized_pixel_counts(photo, monkeypatch):
+    from crud import images
+
+    monkeypatch.setattr(images, "IMAGE_MAX_PIXELS", 1000)
+    with pytest.raises(ValueError):
+        images.render_image(photo)
+
+
+def test_uploaded_variants_map_sizes_to_format_urls(photo, local_storage):
+    from crud.images import IMAGE_FORMATS, IMAGE_VARIANTS, discard_upload, image_urls, render_image, upload_rendered
+    from models import HotelImg
+    from storage import key_from_url
+
+    rendered = render_image(photo)
+    try:
+        url, variants = upload_rendered(rendered, "hotels/1")
+    finally:
+        discard_upload(*rendered.values())
+
+    assert url == variants["full"]["jpeg"]
+    assert set(variants) == {variant for variant, _ in IMAGE_VARIANTS}
+    for variant, formats in variants.items():
+        assert set(formats) == set(IMAGE_FORMATS)
+        for fmt, format_url in formats.items():
+            key = key_from_url(format_url)
+            assert key.startswith("hotels/1/") and key.endswith(f"_{variant}.{IMAGE_FORMATS[fmt][1]}")
+            assert os.path.exists(os.path.join(local_storage.root, key))
+
+    # deleting the image row has to clean up each rendition exactly once
+    urls = image_urls(HotelImg(image_url=url, variants=variants))
+    assert sorted(urls) == sorted(u for formats in variants.values() for u in formats.values())
@@ -0,0 +1,15 @@
+import dependencies
+
+
+async def test_metrics_are_hidden_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", None)
+    for path in ("/metrics/db-pool", "/metrics/cache", "/metrics/scheduler"):
+        assert (await client.get(path, headers={"X-Metrics-Token": "anything"})).status_code == 404
+
+
+async def test_metrics_require_the_configured_token(client, monkeypatch):
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", "s3cret")
+    assert (await client.get("/metrics/scheduler")).status_code == 403
+    assert (await client.get("/metrics/scheduler", headers={"X-Metrics-Token": "wrong"})).status_code == 403
+    r = await client.get("/metrics/scheduler", headers={"X-Metrics-Token": "s3cret"})
+    assert r.status_code == 200 and "leader" in r.json()
@@ -0,0 +1,60 @@
+from io import BytesIO
+
+from PIL import Image
+
+from models import Client, S3DeleteOutbox
+from utils import create_access_token
+
+
+def _auth(user_id, is_owner=False):
+    return {"Authorization": f"Bearer {create_access_token({'id': user_id, 'is_owner': is_owner})}"}
+
+
+def _store(storage, key, data):
+    storage.upload_fileobj(BytesIO(data), None, key)
+
+
+def _png(size=(1200, 900)):
+    out = BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(out, format="PNG")
+    return out.getvalue()
+
+
+async def test_avatar_uploads_are_for_clients_only(client, make_hotel):
+    owner_id = make_hotel().owner_id
+    r = await client.post("/profile/avatar/presign", json={"filename": "me.png"}, headers=_auth(owner_id, True))
+    assert r.status_code == 404
+    r = await client.post(
+        "/profile/avatar/complete", json={"key": f"uploads/avatars/{owner_id}/me.png"}, headers=_auth(owner_id, True)
+    )
+    assert r.status_code == 404
+
+
+async def test_completed_avatar_is_rendered_before_it_is_used(client, db, make_client, local_storage):
+    user = make_client()
+    key = f"uploads/avatars/{user.id}/me.png"
+    _store(local_storage, key, _png())
+
+    r = await client.post("/profile/avatar/complete", json={"key": key}, headers=_auth(user.id))
+    assert r.status_code == 202
+
+    db.expire_all()
+    avatar = db.get(Client, user.id).avatar_url
+    assert avatar.endswith("_full.jpg") and f"/avatars/{user.id}/" in avatar
+    with Image.open(local_storage._path(avatar.split("amazonaws.com/")[-1])) as rendered:
+        assert max(rendered.size) <= 512
+    # the raw upload is only an intermediate
+    assert db.query(S3DeleteOutbox).filter(S3DeleteOutbox.s3_key == key).count() == 1
+
+
+async def test_avatar_that_is_not_an_image_is_dropped(client, db, make_client, local_storage):
+    user = make_client()
+    key = f"uploads/avatars/{user.id}/fake.png"
+    _store(local_storage, key, b"<?php echo 'not an image'; ?>")
+
+    r = await client.post("/profile/avatar/complete", json={"key": key}, headers=_auth(user.id))
+    assert r.status_code == 202
+
+    db.expire_all()
+    assert db.get(Client, user.id).avatar_url is None
+    assert db.query(S3DeleteOutbox).filter(S3DeleteOutbox.s3_key == key).count() == 1
@@ -0,0 +1,32 @@
+from models import HotelStats, Room
+
+
+def test_room_stats_follow_room_changes(db, make_hotel, make_room):
+    from crud.hotel_stats import refresh_room_stats
+
+    hotel = make_hotel()
+    make_room(hotel, price_per_night=80)
+    cheap = make_room(hotel, price_per_night=50)
+    refresh_room_stats(db, hotel.id)
+    db.commit()
+    stats = db.get(HotelStats, hotel.id)
+    assert (stats.min_price, stats.room_count) == (50, 2)
+
+    db.delete(cheap)
+    refresh_room_stats(db, hotel.id)
+    db.commit()
+    db.expire_all()
+    stats = db.get(HotelStats, hotel.id)
+    assert (stats.min_price, stats.room_count) == (80, 1)
+
+
+def test_room_stats_are_created_when_missing(db, make_hotel):
+    from crud.hotel_stats import refresh_room_stats
+
+    hotel = make_hotel()
+    db.query(HotelStats).filter(HotelStats.hotel_id == hotel.id).delete()
+    db.add(Room(room_number="1", room_type="suite", places=2, price_per_night=120, hotel_id=hotel.id))
+    refresh_room_stats(db, hotel.id)
+    db.commit()
+    stats = db.get(HotelStats, hotel.id)
+    assert (stats.min_price, stats.room_count) == (120, 1)
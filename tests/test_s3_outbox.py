@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from crud import s3_outbox
+from models import S3DeleteOutbox
+from storage import public_url
+
+
+class FakeS3:
+    def __init__(self, failing=(), broken=False):
+        self.batches = []
+        self.failing = set(failing)
+        self.broken = broken
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj["Key"] for obj in Delete["Objects"]]
+        self.batches.append(keys)
+        if self.broken:
+            raise ConnectionError("endpoint unreachable")
+        return {"Errors": [{"Key": key, "Code": "AccessDenied", "Message": "denied"} for key in keys if key in self.failing]}
+
+
+@pytest.fixture()
+def outbox(db, monkeypatch):
+    db.query(S3DeleteOutbox).delete()
+    db.commit()
+
+    def install(fake, *keys):
+        monkeypatch.setattr(s3_outbox, "get_s3_client", lambda: fake)
+        s3_outbox.enqueue_s3_deletes(db, [public_url(key) for key in keys])
+        db.commit()
+        return fake
+
+    return install
+
+
+def test_drain_deletes_in_batches(db, outbox, monkeypatch):
+    monkeypatch.setattr(s3_outbox, "S3_DELETE_BATCH", 2)
+    fake = outbox(FakeS3(), *(f"hotels/1/{i}.jpg" for i in range(5)))
+
+    assert s3_outbox.drain_outbox(db) == 5
+    assert [len(batch) for batch in fake.batches] == [2, 2, 1]
+    assert db.query(S3DeleteOutbox).count() == 0
+
+
+def test_enqueue_collapses_duplicate_urls(db, outbox):
+    outbox(FakeS3(), "hotels/1/a.jpg", "hotels/1/a.jpg", "hotels/1/b.jpg")
+    assert sorted(row.s3_key for row in db.query(S3DeleteOutbox)) == ["hotels/1/a.jpg", "hotels/1/b.jpg"]
+
+
+def test_failed_keys_back_off_and_the_rest_are_removed(db, outbox):
+    fake = outbox(FakeS3(failing={"hotels/1/bad.jpg"}), "hotels/1/bad.jpg", "hotels/1/good.jpg")
+
+    before = datetime.utcnow()
+    assert s3_outbox.drain_outbox(db) == 1
+    row = db.query(S3DeleteOutbox).one()
+    assert (row.s3_key, row.attempts, row.last_error) == ("hotels/1/bad.jpg", 1, "AccessDenied: denied")
+    assert row.next_attempt_at >= before + timedelta(minutes=2)
+
+    # not due yet, so the next run leaves it alone
+    assert s3_outbox.drain_outbox(db) == 0
+    assert len(fake.batches) == 1
+
+
+def test_unreachable_endpoint_retries_every_key_later(db, outbox):
+    outbox(FakeS3(broken=True), "hotels/1/a.jpg", "hotels/1/b.jpg")
+
+    assert s3_outbox.drain_outbox(db) == 0
+    rows = db.query(S3DeleteOutbox).all()
+    assert {row.attempts for row in rows} == {1}
+    assert all("endpoint unreachable" in row.last_error for row in rows)
+
+
+def test_backoff_doubles_up_to_an_hour_and_gives_up(db, outbox, monkeypatch):
+    assert [s3_outbox._backoff(n) for n in (1, 2, 3)] == [timedelta(minutes=m) for m in (2, 4, 8)]
+    assert s3_outbox._backoff(10) == timedelta(minutes=60)
+
+    fake = outbox(FakeS3(), "hotels/1/dead.jpg")
+    db.query(S3DeleteOutbox).update({"attempts": s3_outbox.S3_DELETE_MAX_ATTEMPTS})
+    db.commit()
+    assert s3_outbox.drain_outbox(db) == 0
+    assert fake.batches == []
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+from sqlalchemy.orm import Session
+
+import scheduler
+from models import JobRun
+
+
+class FakeAdvisoryLocks:
+    """Stands in for the Postgres engine: one session-level advisory lock shared by every connection."""
+
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self):
+        self.holder = None
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.broken = False
+
+    def execute(self, statement, params=None):
+        if self.broken:
+            raise ConnectionError("server closed the connection")
+        sql = str(statement)
+        if "pg_try_advisory_lock" in sql:
+            if self.server.holder is None:
+                self.server.holder = self
+            return SimpleNamespace(scalar=lambda: self.server.holder is self)
+        if "pg_advisory_unlock" in sql:
+            self.server.holder = None
+        return SimpleNamespace(scalar=lambda: 1)
+
+    def commit(self):
+        pass
+
+    def invalidate(self):
+        self.close()
+
+    def close(self):
+        # the lock lives as long as the session that took it
+        if self.server.holder is self:
+            self.server.holder = None
+
+
+def test_one_worker_leads_and_another_takes_over(monkeypatch):
+    server = FakeAdvisoryLocks()
+    monkeypatch.setattr(scheduler, "engine", server)
+    first, second = scheduler.LeaderLock(1), scheduler.LeaderLock(1)
+
+    assert first.refresh() is True
+    assert second.refresh() is False
+    assert first.refresh() is True
+
+    # the leader's connection dies; it steps down and the other worker wins the next poll
+    first._conn.broken = True
+    assert first.refresh() is False
+    assert second.refresh() is True
+
+    second.release()
+    assert server.holder is None and not second.is_leader
+
+
+def test_shared_jobs_only_run_on_the_leader(db, monkeypatch):
+    calls = []
+
+    def job():
+        calls.append(1)
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(scheduler.JOBS, "test_job", (job, {"minutes": 1}, True, False))
+    monkeypatch.setattr(scheduler.leader, "is_leader", False)
+    monkeypatch.setattr(scheduler, "SessionLocal", lambda: Session(bind=db.get_bind()))
+
+    assert scheduler.run_job("test_job") is True
+    assert calls == []
+    assert db.query(JobRun).filter(JobRun.job_name == "test_job").count() == 0
+
+    # forced runs from the CLI skip the election and are recorded like scheduled ones
+    assert scheduler.run_job("test_job", force=True) is False
+    run = db.query(JobRun).filter(JobRun.job_name == "test_job").one()
+    assert calls == [1]
+    assert (run.succeeded, run.error) == (False, "boom")
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+import storage
+
+
+def test_s3_client_is_built_once_and_shared(monkeypatch):
+    built = []
+
+    def create():
+        built.append(object())
+        return built[-1]
+
+    monkeypatch.setattr(storage, "_client", None)
+    monkeypatch.setattr(storage, "_create_client", create)
+
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(storage.get_s3_client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert all(client is built[0] for client in clients)
+
+
+def test_s3_client_uses_the_pool_and_retry_settings(monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "s3")
+    monkeypatch.setattr(storage, "S3_REGION", "eu-central-1")
+    config = storage._create_client().meta.config
+
+    assert config.max_pool_connections == storage.S3_MAX_POOL_CONNECTIONS
+    assert config.retries["mode"] == "adaptive"
+    assert config.tcp_keepalive is True
+
+
+@pytest.mark.parametrize("backend", ["s3", "local"])
+def test_public_urls_map_back_to_their_keys(monkeypatch, backend):
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", backend)
+    url = storage.public_url("hotels/1/abc_full.jpg")
+
+    assert storage.key_from_url(url) == "hotels/1/abc_full.jpg"
+    assert storage.key_from_url(None) is None
+
+
+def test_local_client_stays_inside_its_root(tmp_path):
+    client = storage.LocalStorageClient(str(tmp_path))
+    (tmp_path / "note.txt").write_bytes(b"hi")
+
+    client.upload_file(str(tmp_path / "note.txt"), None, "hotels/1/note.txt")
+    assert client.head_object(Bucket=None, Key="hotels/1/note.txt") == {"ContentLength": 2}
+    with pytest.raises(ValueError):
+        client.upload_file(str(tmp_path / "note.txt"), None, "../escape.txt")
+
+    result = client.delete_objects(Bucket=None, Delete={"Objects": [{"Key": "hotels/1/note.txt"}, {"Key": "missing"}]})
+    assert result["Errors"] == []
+    assert not (tmp_path / "hotels" / "1" / "note.txt").exists()
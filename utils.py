@@ -1,35 +1,92 @@
-from datetime import datetime, timedelta, date
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
 from jose import JWTError, jwt
 
 SECRET_KEY = "BARAKABAMA"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30
+TOKEN_VERSION = 2
+# raising this revokes every token issued with an older version; pre-ver tokens count as version 1
+MIN_TOKEN_VERSION = int(os.getenv("MIN_TOKEN_VERSION", "1"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+
 
 def create_access_token(data: dict):
-    to_encode = data.copy()
+    """Tokens only carry identity; profile fields are read from the database on demand."""
     expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
-
-    birth_date = data.get("birth_date")
-    if birth_date and isinstance(birth_date, (datetime, date)):
-        to_encode["birth_date"] = birth_date.isoformat()
-
-    to_encode.update({
-        "id": data["id"],
-        "first_name": data.get("first_name", ""),
-        "last_name": data.get("last_name", ""),
-        "email": data.get("email", ""),
-        "phone": data.get("phone", ""),
-        "is_owner": data.get("is_owner", False),
-        "owner_id": data.get("owner_id", None)
-    })
-
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def verify_access_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        return None
+    to_encode = {
+        "sub": str(data["id"]),
+        "role": "owner" if data.get("is_owner") else "client",
+        "ver": TOKEN_VERSION,
+        "exp": expire
+    }
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _token_version(payload: dict) -> int:
+    return int(payload.get("ver", 1))
+
+
+def _version_accepted(version: int) -> bool:
+    return MIN_TOKEN_VERSION <= version <= TOKEN_VERSION
+
+
+def _principal(payload: dict) -> dict:
+    if not _version_accepted(_token_version(payload)):
+        raise ValueError("Token version is no longer accepted")
+
+    if "sub" in payload:
+        user_id = int(payload["sub"])
+        role = payload.get("role")
+    else:
+        # tokens issued before TOKEN_VERSION 2 carried the whole profile
+        user_id = payload.get("id")
+        role = ("owner" if payload["is_owner"] else "client") if "is_owner" in payload else None
+
+    principal = {"id": user_id}
+    if role in ("owner", "client"):
+        principal["is_owner"] = role == "owner"
+        principal["owner_id"] = user_id if role == "owner" else None
+    return principal
+
+
+def _cached(token: str) -> Optional[dict]:
+    with _verified_lock:
+        entry = _verified.get(token)
+        if entry is None:
+            return None
+        expires_at, version, principal = entry
+        if expires_at <= time.time() or not _version_accepted(version):
+            del _verified[token]
+            return None
+        _verified.move_to_end(token)
+        return principal
+
+
+def _remember(token: str, expires_at: float, version: int, principal: dict):
+    with _verified_lock:
+        _verified[token] = (expires_at, version, principal)
+        _verified.move_to_end(token)
+        while len(_verified) > TOKEN_CACHE_SIZE:
+            _verified.popitem(last=False)
+
+
+def verify_access_token(token: str) -> Optional[dict]:
+    # keyed on the whole token, so a cache hit implies the same signed header and claims
+    principal = _cached(token)
+    if principal is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            principal = _principal(payload)
+        except (JWTError, ValueError, TypeError):
+            return None
+        _remember(token, payload.get("exp", time.time() + 60), _token_version(payload), principal)
+    return dict(principal)